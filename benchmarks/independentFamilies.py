@@ -0,0 +1,55 @@
+"""
+Compares how long the solver takes to record a batch of independent inference
+families, solving them serially and in worker processes. Every family is its
+own relation component, so they can all be solved at the same time:
+
+```raw
+a0^2 + a0*b0 = 12;  b0^2 - b0 = 2
+a1^2 + a1*b1 = 13;  b1^2 - b1 = 5
+...
+```
+
+Run from the repository root with `python -m benchmarks.independentFamilies`.
+"""
+
+import os
+import sys
+import time
+
+import sympy
+
+from src.algebrasolver.solver import AlgebraSolver, Relation
+
+
+def makeFamilies(numFamilies: int):
+    relations: list[Relation] = list()
+    for familyIdx in range(numFamilies):
+        (a, b) = sympy.symbols(f"a{familyIdx}, b{familyIdx}")
+        relations.append(Relation(a**2 + a*b, sympy.Integer(12 + familyIdx)))
+        relations.append(Relation(b**2 - b, sympy.Integer(3*familyIdx + 2)))
+    return relations
+
+
+def timeFamilies(relations: list[Relation], maxWorkers: int):
+    solver = AlgebraSolver(maxWorkers = maxWorkers)
+    try:
+        startTime = time.perf_counter()
+        solver.recordRelations(relations)
+        return time.perf_counter() - startTime
+    finally:
+        solver.shutdown()
+
+
+def main():
+    maxWorkers = os.cpu_count() or 1
+    print(f"{'families':<12}{'serial':>12}{f'{maxWorkers} workers':>14}{'speedup':>10}")
+    for numFamilies in (2, 4, 6):
+        relations = makeFamilies(numFamilies)
+        serialTime = timeFamilies(relations, maxWorkers = 0)
+        parallelTime = timeFamilies(relations, maxWorkers = maxWorkers)
+        print(f"{numFamilies:<12}{serialTime:>11.3f}s{parallelTime:>13.3f}s{serialTime / parallelTime:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
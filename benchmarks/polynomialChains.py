@@ -0,0 +1,60 @@
+"""
+Compares how long the solver takes to record chains of polynomial relations,
+with and without the polynomial root finding fast path. Each relation in a
+chain is a polynomial in one new symbol once the previous symbol is known:
+
+```raw
+x0 = 2
+(x1 - 1)*(x1 - x0 - 1) = 0                  (quadratic chain)
+(x1 - 1)*(x1 - 2)*(x1 - x0 - 1) = 0         (cubic chain)
+...
+```
+
+Run from the repository root with `python -m benchmarks.polynomialChains`.
+"""
+
+import sys
+import time
+
+import sympy
+
+from src.algebrasolver.solver import AlgebraSolver, Relation
+from src.algebrasolver.solveSetCache import SolveSetCache
+
+
+def makeChain(degree: int, length: int):
+    symbols = sympy.symbols(f"x0:{length + 1}")
+    relations = [Relation(symbols[0], sympy.Integer(2))]
+    for (prevSymbol, symbol) in zip(symbols, symbols[1:]):
+        polynomial = symbol - prevSymbol - 1
+        for root in range(1, degree):
+            polynomial *= symbol - root
+        relations.append(Relation(sympy.expand(polynomial), sympy.Integer(0)))
+    return relations
+
+
+def timeChain(relations: list[Relation], usePolynomialRoots: bool):
+    solver = AlgebraSolver()
+    solver._solveSetCache = SolveSetCache(usePolynomialRoots = usePolynomialRoots)
+    startTime = time.perf_counter()
+    for relation in relations:
+        solver.recordRelation(relation)
+    return time.perf_counter() - startTime
+
+
+def main():
+    chains = [
+        ("quadratic", 2, 6),
+        ("cubic", 3, 4),
+    ]
+    print(f"{'chain':<12}{'length':>8}{'solveset':>12}{'fast path':>12}{'speedup':>10}")
+    for (name, degree, length) in chains:
+        relations = makeChain(degree, length)
+        slowTime = timeChain(relations, usePolynomialRoots = False)
+        fastTime = timeChain(relations, usePolynomialRoots = True)
+        print(f"{name:<12}{length:>8}{slowTime:>11.3f}s{fastTime:>11.3f}s{slowTime / fastTime:>9.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
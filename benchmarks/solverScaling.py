@@ -0,0 +1,252 @@
+"""
+Measures how the solver's running time grows with the size of the system it
+is given. Every workload is generated at increasing sizes (from 10 up to
+10,000), and each operation is timed at every size:
+
+```raw
+linearChain         x0 = 1;  x1 = x0 + 1;  x2 = x1 + 2;  ...
+denseLinearBlock    n relations, each a random integer combination of all n symbols
+polynomialFamily    x^2 = 4;  y1^2 + y1*x = 4;  y2^2 + y2*x = 12;  ...
+exprListFanOut      x = {1, 2, ..., n};  y = x^2 + 1;  (then x + y)
+churn               n independent relations, each popped and recorded again
+driverChain         the linear chain, typed into an `AppDriver` as commands
+```
+
+A workload stops growing once one size takes longer than the time budget,
+so the slow ones don't hold up the rest. The results are written as JSON,
+along with a scaling exponent fitted to each operation (where `time ~ n^k`,
+so 1 means linear, 2 means quadratic, and so on), which makes regressions in
+how things scale easy to spot by comparing two runs.
+
+Run from the repository root with `python -m benchmarks.solverScaling`
+(`--help` lists the options). With `--trace`, every phase of the solver is
+traced as well, and the spans are written as Chrome trace events (tracing
+slows things down a little, so timings from traced runs shouldn't be compared
+with untraced ones).
+"""
+
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+from typing import Callable
+
+import sympy
+
+from src.algebrasolver.solver import AlgebraSolver, Relation
+from src.app.appDriver import AppDriver
+from src.common.tracer import tracer
+from src.parsing.lexer import CommandLexer
+from src.parsing.parser import CommandParser
+
+
+defaultSizes = (10, 30, 100, 300, 1000, 3000, 10000)
+
+
+class Timings:
+    """The time each operation took (in seconds) for one workload at one size"""
+
+    def __init__(self):
+        self.seconds: dict[str, float] = dict()
+
+    def time(self, operation: str, fn: Callable[[], object]):
+        startTime = time.perf_counter()
+        result = fn()
+        self.seconds[operation] = self.seconds.get(operation, 0) + time.perf_counter() - startTime
+        return result
+
+
+def recordAll(timings: Timings, solver: AlgebraSolver, relations: list[Relation]):
+    for relation in relations:
+        timings.time("recordRelation", lambda: solver.recordRelation(relation))
+
+
+def linearChain(size: int, timings: Timings):
+    symbols = sympy.symbols(f"x0:{size}")
+    relations = [Relation(symbols[0], sympy.Integer(1))] + [
+        Relation(symbol, prevSymbol + idx)
+        for (idx, (prevSymbol, symbol)) in enumerate(zip(symbols, symbols[1:]), 1)
+    ]
+    solver = AlgebraSolver()
+    recordAll(timings, solver, relations)
+    timings.time("substituteKnownsFor", lambda: solver.substituteKnownsFor(symbols[-1]))
+    timings.time("popRelation", lambda: solver.popRelation(relations[0]))
+
+
+def denseLinearBlock(size: int, timings: Timings):
+    generator = random.Random(size)
+    symbols = sympy.symbols(f"x0:{size}")
+    solution = [generator.randint(-9, 9) for _ in symbols]
+    relations: list[Relation] = list()
+    for _ in symbols:
+        coefficients = [generator.randint(-5, 5) for _ in symbols]
+        leftExpr = sympy.Add(*(coefficient * symbol for (coefficient, symbol) in zip(coefficients, symbols)))
+        rightExpr = sum(coefficient * value for (coefficient, value) in zip(coefficients, solution))
+        relations.append(Relation(leftExpr, sympy.Integer(rightExpr)))
+    solver = AlgebraSolver()
+    recordAll(timings, solver, relations)
+    timings.time("substituteKnownsFor", lambda: solver.substituteKnownsFor(sympy.Add(*symbols)))
+    timings.time("popRelation", lambda: solver.popRelation(relations[-1]))
+
+
+def polynomialFamily(size: int, timings: Timings):
+    x = sympy.Symbol("x")
+    ys = sympy.symbols(f"y1:{size}")
+    # (each y has the roots {2*idx, -2*idx - 2} when x = 2)
+    relations = [Relation(x**2, sympy.Integer(4))] + [
+        Relation(y**2 + y*x, sympy.Integer(4*idx*idx + 4*idx))
+        for (idx, y) in enumerate(ys, 1)
+    ]
+    solver = AlgebraSolver()
+    recordAll(timings, solver, relations)
+    timings.time("substituteKnownsFor", lambda: solver.substituteKnownsFor(ys[-1]))
+    timings.time("popRelation", lambda: solver.popRelation(relations[0]))
+
+
+def exprListFanOut(size: int, timings: Timings):
+    (x, y) = sympy.symbols("x, y")
+    # (expression lists are parsed the same way as when they're typed in)
+    command = next(CommandParser.parseCommand(tuple(CommandLexer.findTokens(
+        f"x = {{{', '.join(str(idx) for idx in range(1, size + 1))}}}"
+    ))))
+    (leftExpr, rightExpr) = command.data
+    relations = [Relation(leftExpr, rightExpr), Relation(y, x**2 + 1)]
+    solver = AlgebraSolver()
+    recordAll(timings, solver, relations)
+    timings.time("substituteKnownsFor", lambda: solver.substituteKnownsFor(x + y))
+    timings.time("popRelation", lambda: solver.popRelation(relations[0]))
+
+
+def churn(size: int, timings: Timings):
+    symbols = sympy.symbols(f"x0:{size}")
+    relations = [
+        Relation(symbol, sympy.Integer(idx))
+        for (idx, symbol) in enumerate(symbols)
+    ]
+    solver = AlgebraSolver()
+    recordAll(timings, solver, relations)
+    for relation in relations:
+        timings.time("popRelation", lambda: solver.popRelation(relation))
+        timings.time("recordRelation", lambda: solver.recordRelation(relation))
+    timings.time("substituteKnownsFor", lambda: solver.substituteKnownsFor(sympy.Add(*symbols)))
+
+
+def driverChain(size: int, timings: Timings):
+    driver = AppDriver()
+    commands = ["x0 = 1"] + [
+        f"x{idx} = x{idx - 1} + {idx}"
+        for idx in range(1, size)
+    ]
+    for command in commands:
+        timings.time("processCommandLines", lambda: tuple(driver.processCommandLines(command)))
+    timings.time("processCommandLines (evaluate)", lambda: tuple(driver.processCommandLines(f"x{size - 1}")))
+
+
+workloads: dict[str, Callable[[int, Timings], None]] = {
+    "linearChain": linearChain,
+    "denseLinearBlock": denseLinearBlock,
+    "polynomialFamily": polynomialFamily,
+    "exprListFanOut": exprListFanOut,
+    "churn": churn,
+    "driverChain": driverChain,
+}
+
+
+def fitScalingExponent(sizes: list[int], seconds: list[float]) -> float | None:
+    """Fits `seconds ~ c * sizes^k` by least squares (on a log-log scale), giving `k`"""
+
+    points = [
+        (math.log(size), math.log(duration))
+        for (size, duration) in zip(sizes, seconds)
+        if duration > 0
+    ]
+    if len(points) < 2:
+        return None
+    meanX = sum(x for (x, y) in points) / len(points)
+    meanY = sum(y for (x, y) in points) / len(points)
+    varianceX = sum((x - meanX)**2 for (x, y) in points)
+    if varianceX == 0:
+        return None
+    covariance = sum((x - meanX) * (y - meanY) for (x, y) in points)
+    return covariance / varianceX
+
+
+def runWorkload(name: str, sizes: list[int], budgetSeconds: float, repeats: int):
+    results: dict[str, dict[str, list]] = dict()
+    totalSeconds: list[float] = list()
+    for (sizeIdx, size) in enumerate(sizes):
+        if sizeIdx > 0 and _projectSeconds(sizes[:sizeIdx], totalSeconds, size) > 10 * budgetSeconds:
+            # (sizes that would take far longer than the budget aren't even started)
+            break
+        # (the fastest of the repeats is the least noisy)
+        bestSeconds: dict[str, float] = dict()
+        for _ in range(repeats):
+            timings = Timings()
+            workloads[name](size, timings)
+            for (operation, duration) in timings.seconds.items():
+                bestSeconds[operation] = min(duration, bestSeconds.get(operation, math.inf))
+        for (operation, duration) in bestSeconds.items():
+            operationResults = results.setdefault(operation, {"sizes": [], "seconds": []})
+            operationResults["sizes"].append(size)
+            operationResults["seconds"].append(duration)
+        print(f"{name:<20}{size:>8}" + "".join(f"  {operation} {duration:.4f}s" for (operation, duration) in bestSeconds.items()), file = sys.stderr)
+        totalSeconds.append(sum(bestSeconds.values()))
+        if totalSeconds[-1] > budgetSeconds:
+            break
+
+    for operationResults in results.values():
+        operationResults["exponent"] = fitScalingExponent(operationResults["sizes"], operationResults["seconds"])
+    return results
+
+
+def _projectSeconds(sizes: list[int], seconds: list[float], nextSize: int):
+    # (assumes things get at least linearly slower)
+    exponent = max(1.0, fitScalingExponent(sizes[-3:], seconds[-3:]) or 1.0)
+    return seconds[-1] * (nextSize / sizes[len(seconds) - 1])**exponent
+
+
+def main(args: list[str]):
+    argParser = argparse.ArgumentParser(description = "Measures how solver running times scale with system size.")
+    argParser.add_argument("--workloads", nargs = "+", choices = tuple(workloads), default = tuple(workloads))
+    argParser.add_argument("--sizes", nargs = "+", type = int, default = defaultSizes)
+    argParser.add_argument("--budget", type = float, default = 10, help = "seconds one size may take before a workload stops growing")
+    argParser.add_argument("--repeats", type = int, default = 1)
+    argParser.add_argument("--output", default = "-", help = "file to write JSON results to ('-' for stdout)")
+    argParser.add_argument("--trace", default = None, help = "file to write a Chrome trace of the solver's phases to")
+    options = argParser.parse_args(args)
+
+    if options.trace is not None:
+        tracer.enable()
+
+    report = {
+        "python": platform.python_version(),
+        "sympy": sympy.__version__,
+        "budgetSeconds": options.budget,
+        "workloads": {
+            name: runWorkload(name, sorted(options.sizes), options.budget, options.repeats)
+            for name in options.workloads
+        },
+    }
+    reportStr = json.dumps(report, indent = 2)
+    if options.output == "-":
+        print(reportStr)
+    else:
+        with open(options.output, "w") as outputFile:
+            outputFile.write(reportStr + "\n")
+    if options.trace is not None:
+        tracer.writeChromeTrace(options.trace)
+
+    print(f"\n{'workload':<20}{'operation':<34}{'max size':>10}{'exponent':>10}", file = sys.stderr)
+    for (name, results) in report["workloads"].items():
+        for (operation, operationResults) in results.items():
+            exponent = operationResults["exponent"]
+            exponentStr = f"{exponent:.2f}" if exponent is not None else "-"
+            print(f"{name:<20}{operation:<34}{max(operationResults['sizes']):>10}{exponentStr:>10}", file = sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,28 @@
+from src.algebrasolver.types import *
+
+
+class CancellationToken:
+    """
+    A flag for asking the solver to stop whatever it's doing. Solving happens
+    in one long (uninterruptible) call, so instead of being stopped from the
+    outside, the solver checks this token every so often (at "checkpoints" in
+    its longest loops) and raises a `CancelledException` once it has been
+    cancelled. Since every change to the solver is made in a transaction,
+    that exception rolls everything back just like any other error.
+
+    The token is meant to be cancelled from a different thread than the one
+    solving. It stays cancelled until it is `reset()`.
+    """
+
+    def __init__(self):
+        self.isCancelled = False
+
+    def cancel(self):
+        self.isCancelled = True
+
+    def reset(self):
+        self.isCancelled = False
+
+    def checkpoint(self):
+        if self.isCancelled:
+            raise CancelledException()
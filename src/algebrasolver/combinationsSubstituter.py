@@ -1,13 +1,29 @@
+import math
+from fractions import Fraction
 from typing import Generator, Any
 
 import sympy
+from sympy.printing.pycode import PythonCodePrinter
+try:
+    import numpy
+except ImportError:
+    # (only needed for vectorized substitution, which is skipped without it)
+    numpy = None
 
 from src.parsing.parser import freeSymbolsOf, isExpressionListSymbol
-from src.common.sympyLinterFixes import subsExpr
+from src.common.tracer import tracer
 from src.algebrasolver.symbolsDatabase import SymbolsDatabase
+from src.algebrasolver.cancellation import CancellationToken
 from src.algebrasolver.types import *
 
 
+class _FractionCodePrinter(PythonCodePrinter):
+    """Prints rational numbers as `Fraction`s, so `lambdify()`ed functions of `Fraction`s stay exact"""
+
+    def _print_Rational(self, expr):
+        return f"Fraction({expr.p}, {expr.q})"
+
+
 class CombinationsSubstituter:
     """
     This class creates a single-use substituter object which is tasked with
@@ -68,33 +84,56 @@ class CombinationsSubstituter:
     Once these objects are considered and respected, the substitution of `a + b`
     yields only `-6` and `6`. This process is described in more detail in the
     documentation for `_generateCombinations()`.
+
+    There can be a *lot* of combinations, so if a `cancellationToken` is given,
+    it is checked for every combination generated.
+
+    When there are a lot of combinations of plain numbers (like from expression
+    lists with hundreds of values), substituting each one with `sympy` is slow.
+    If `vectorize` is given (and NumPy is installed), each expression is
+    instead compiled once into a NumPy function and evaluated for every
+    combination in a single call, and the exact value of each result is only
+    worked out for rows the floats can't tell apart. (Every combination has to
+    be generated up front for this, so it can't stop early the way the solver
+    sometimes needs to, which is why it isn't done by default.) See
+    `_substituteVectorized()` for the details.
     """
 
-    def __init__(self, expressions: set[sympy.Expr], database: SymbolsDatabase, *, restrictRedefSymbol: sympy.Symbol | None = None):
+    # (compiling a function costs about as much as substituting this many
+    # combinations with `sympy`)
+    _minVectorizedCombinations = 64
+
+    def __init__(self, expressions: set[sympy.Expr], database: SymbolsDatabase, *, restrictRedefSymbol: sympy.Symbol | None = None, cancellationToken: CancellationToken | None = None, vectorize: bool = False):
         self._expressions = expressions
         self._symbolValuesDatabase = database
         self._currCombination: dict[sympy.Symbol, sympy.Expr] = dict()
-        self._resolutionOrder = tuple(database)
+        self._resolutionOrder = self._findResolutionOrder()
         self._exprListSymbols = tuple(
             exprListSymbol
             for expression in expressions
             for exprListSymbol in freeSymbolsOf(expression)
             if isExpressionListSymbol(exprListSymbol)
         )
+        # (where each symbol is put in combinations; expression lists first)
+        self._positionOfSymbol = {
+            symbol: position
+            for (position, symbol) in enumerate(self._exprListSymbols + self._resolutionOrder)
+        }
+        # how many times a value was put in each position, which is how values
+        # worked out for one combination are known to still be good for the
+        # next one (see `_resolvedValueOf()`)
+        self._assignmentNums = [0] * len(self._positionOfSymbol)
+        self._resolvedValues: dict[sympy.Symbol, tuple[sympy.Expr, int, int]] = dict()
         self._restrictRedefSymbol = restrictRedefSymbol
+        self._cancellationToken = cancellationToken
+        self._vectorize = vectorize and numpy is not None
 
     def substitute(self) -> Generator[ConditionalValue[sympy.Expr], Any, None]:
         """Initiates the substitution and yields the resulting expressions"""
 
-        for symbolValueCombination in self._generateCombinations(0, 0):
-            for expression in self._expressions:
-                conditions = {
-                    symbol: conditionalValue
-                    for (symbol, conditionalValue) in symbolValueCombination.items()
-                    if symbol in freeSymbolsOf(expression)
-                }
-                subExpr = self._subsUntilFixed(expression, symbolValueCombination)
-                yield ConditionalValue(subExpr, conditions)
+        with tracer.span("substitute", expressions = len(self._expressions)) as span:
+            for (expression, conditionalValue) in self._substituteCombinations(span):
+                yield conditionalValue
     
     def substituteForMapping(self) -> dict[sympy.Expr, set[ConditionalValue[sympy.Expr]]]:
         """
@@ -110,50 +149,305 @@ class CombinationsSubstituter:
         return result
 
     def _substituteForMapPairs(self) -> Generator[tuple[sympy.Expr, ConditionalValue[sympy.Expr]], Any, None]:
-        for symbolValueCombination in self._generateCombinations(0, 0):
-            for expression in self._expressions:
-                conditions = {
-                    symbol: conditionalValue
-                    for (symbol, conditionalValue) in symbolValueCombination.items()
-                    if symbol in freeSymbolsOf(expression)
-                }
-                subExpr = self._subsUntilFixed(expression, symbolValueCombination)
-                yield (expression, ConditionalValue(subExpr, conditions))
-
-    def _subsUntilFixed(self, expression: sympy.Expr, combination: dict[sympy.Symbol, sympy.Expr]):
-        """
-        `sympy` expressions do not recursively perform substitutions when
-        given a dictionary. It seems the intention behind `Expr.subs()` was
-        that each substitution could either be performed one at a time, or all
-        would be performed once simultaneously.
+        with tracer.span("substituteForMapping", expressions = len(self._expressions)) as span:
+            yield from self._substituteCombinations(span)
+
+    def _substituteCombinations(self, span) -> Generator[tuple[sympy.Expr, ConditionalValue[sympy.Expr]], Any, None]:
+        if self._vectorize:
+            yield from self._substituteVectorized(span)
+            return
+
+        symbolsOfExpressions = {
+            expression: freeSymbolsOf(expression)
+            for expression in self._expressions
+        }
+        numCombinations = 0
+        try:
+            for (numCombinations, symbolValueCombination) in enumerate(self._generateCombinations(0, 0), 1):
+                for expression in self._expressions:
+                    conditions = {
+                        symbol: conditionalValue
+                        for (symbol, conditionalValue) in symbolValueCombination.items()
+                        if symbol in symbolsOfExpressions[expression]
+                    }
+                    # (the current combination is still the one just generated,
+                    # so values worked out for the last one can be reused)
+                    subExpr = self._substituteCombination(expression, self._currCombination, self._resolvedValues)
+                    yield (expression, ConditionalValue(subExpr, conditions))
+        finally:
+            # (the substitution may have been stopped early)
+            if tracer.isEnabled:
+                span.set(combinations = numCombinations)
+
+    def _substituteVectorized(self, span) -> Generator[tuple[sympy.Expr, ConditionalValue[sympy.Expr]], Any, None]:
+        """
+        Substitutes the same combinations as `_substituteCombinations()`, but
+        evaluates each expression for all of them at once with NumPy. Only the
+        values of an expression's own symbols matter to its result (and its
+        conditions), so combinations are first narrowed down to the distinct
+        "rows" of those values, which are then laid out as one array per symbol
+        ("columns"). For `x + y` with `x = {1, 2, 3}` and `y = {10, 20}`:
 
         ```raw
-        (a + b).subs({
-            a: 4,
-            b: a - 1,
-        }) == ((4) + (a - 1))
+        x: [ 1,  1,  2,  2,  3,  3]
+        y: [10, 20, 10, 20, 10, 20]
+        --> [11, 21, 12, 22, 13, 23]
         ```
-        
-        This is not the behavior we want. The desired result is
+
+        The floats are only used to sort rows into "buckets" of equal results,
+        since two different exact results can round to the same float (like
+        `x * y` for `x = {1, 1 + 10^-20}`). Inside a bucket, rows are told apart
+        by their exact results, and each distinct one is only made into a
+        `sympy` expression once. For rational expressions of rational values
+        (the usual case for expression lists), the exact results are worked out
+        with Python's `Fraction`s, which is much faster than `sympy`; anything
+        else is substituted with `sympy` row by row. Rows that can't be
+        evaluated with NumPy at all (because a value isn't a real number a
+        float can hold, or the result isn't finite) are substituted with
+        `sympy` on their own, as are expressions with too few rows to be worth
+        compiling.
+        """
+
+        combinations = list(self._generateCombinations(0, 0))
+        if tracer.isEnabled:
+            span.set(combinations = len(combinations))
+        if len(combinations) == 0:
+            return
+        floatOfValue: dict[sympy.Expr, float | None] = dict()
+        fractionOfValue: dict[sympy.Expr, Fraction | None] = dict()
+        numVectorizedRows = 0
+        for expression in self._expressions:
+            symbols = tuple(
+                symbol
+                for symbol in freeSymbolsOf(expression)
+                if symbol in combinations[0]
+            )
+            # (dictionaries are used as ordered sets here)
+            rows = list(dict.fromkeys(
+                tuple(combination[symbol] for symbol in symbols)
+                for combination in combinations
+            ))
+            floatRows = self._floatRowsOf(rows, floatOfValue)
+            if floatRows is None:
+                # (values that aren't numbers can have other symbols in them
+                # that still need substituting, so these go through every
+                # combination, just like without vectorizing)
+                for combination in combinations:
+                    mapping = {symbol: combination[symbol] for symbol in symbols}
+                    yield (expression, ConditionalValue(self._substituteCombination(expression, combination, dict()), mapping))
+                continue
+            results = self._evaluateRows(expression, symbols, floatRows)
+            if results is None:
+                for row in rows:
+                    mapping = dict(zip(symbols, row))
+                    yield (expression, ConditionalValue(self._substituteCombination(expression, mapping, dict()), mapping))
+                continue
+            if tracer.isEnabled:
+                numVectorizedRows += len(rows)
+                span.set(vectorizedRows = numVectorizedRows)
+
+            rationalFunction = self._compileRationalFunction(expression, symbols)
+            # (each bucket maps the exact results in it to their expressions)
+            buckets: dict[float, dict[Any, sympy.Expr]] = dict()
+            for (row, result) in zip(rows, results):
+                if self._cancellationToken is not None:
+                    self._cancellationToken.checkpoint()
+                mapping = dict(zip(symbols, row))
+                if type(result) is not float or not math.isfinite(result):
+                    # (complex or undefined results don't say anything about
+                    # the exact result, so these rows are done the slow way)
+                    yield (expression, ConditionalValue(self._substituteCombination(expression, mapping, dict()), mapping))
+                    continue
+                bucket = buckets.setdefault(result, dict())
+                exactKey = self._rationalResultOf(rationalFunction, row, fractionOfValue)
+                if exactKey is None:
+                    exactKey = self._substituteCombination(expression, mapping, dict())
+                exactResult = bucket.get(exactKey)
+                if exactResult is None:
+                    exactResult = exactKey if isinstance(exactKey, sympy.Basic) else sympy.Rational(exactKey.numerator, exactKey.denominator)
+                    bucket[exactKey] = exactResult
+                yield (expression, ConditionalValue(exactResult, mapping))
+
+    def _evaluateRows(self, expression: sympy.Expr, symbols: tuple[sympy.Symbol, ...], floatRows: list[tuple[float, ...]]) -> list[Any] | None:
+        """Evaluates an expression for each row with NumPy, or gives `None` if it isn't worth it (or can't be done)"""
+
+        if len(floatRows) < self._minVectorizedCombinations:
+            return None
+        columns = [numpy.array(column, dtype = float) for column in zip(*floatRows)]
+        try:
+            function = sympy.lambdify(symbols, expression, "numpy")
+            with numpy.errstate(all = "ignore"):
+                results = numpy.broadcast_to(numpy.asarray(function(*columns)), (len(floatRows),))
+        except Exception:
+            # (not every function `sympy` knows about has a NumPy version)
+            return None
+        return results.tolist()
+
+    def _compileRationalFunction(self, expression: sympy.Expr, symbols: tuple[sympy.Symbol, ...]):
+        """
+        Compiles an expression into a function of `Fraction`s if it's a
+        rational expression (only adding, multiplying, and whole number powers
+        of its symbols and rational numbers), or gives `None` if it isn't
+        """
+
+        for subExpression in sympy.preorder_traversal(expression):
+            if subExpression.is_Symbol or subExpression.is_Rational or subExpression.is_Add or subExpression.is_Mul:
+                continue
+            if subExpression.is_Pow and subExpression.exp.is_Integer:
+                continue
+            return None
+        return sympy.lambdify(symbols, expression, modules = [{"Fraction": Fraction}], printer = _FractionCodePrinter)
+
+    def _rationalResultOf(self, rationalFunction, row: tuple[sympy.Expr, ...], fractionOfValue: dict[sympy.Expr, Fraction | None]) -> Fraction | int | None:
+        """Gives the exact result of a row with `rationalFunction` if it has one and every value is rational, or `None` otherwise"""
+
+        if rationalFunction is None:
+            return None
+        fractionRow: list[Fraction] = list()
+        for value in row:
+            if value not in fractionOfValue:
+                fractionOfValue[value] = Fraction(int(value.p), int(value.q)) if value.is_Rational else None
+            fraction = fractionOfValue[value]
+            if fraction is None:
+                return None
+            fractionRow.append(fraction)
+        try:
+            return rationalFunction(*fractionRow)
+        except ZeroDivisionError:
+            # (the float result can be finite even when the exact one isn't, so
+            # `sympy` gets to say what it is)
+            return None
+
+    def _floatRowsOf(self, rows: list[tuple[sympy.Expr, ...]], floatOfValue: dict[sympy.Expr, float | None]):
+        """Gives the rows with every value as a float, or `None` if a value can't be one"""
+
+        floatRows: list[tuple[float, ...]] = list()
+        for row in rows:
+            floatRow: list[float] = list()
+            for value in row:
+                if value not in floatOfValue:
+                    try:
+                        floatOfValue[value] = float(value) if value.is_number else None
+                    except (TypeError, OverflowError):
+                        floatOfValue[value] = None
+                floatValue = floatOfValue[value]
+                if floatValue is None:
+                    return None
+                floatRow.append(floatValue)
+            floatRows.append(tuple(floatRow))
+        return floatRows
+
+    def _findResolutionOrder(self):
+        """
+        Gives the symbols to include in combinations, in the order they should
+        be resolved in. Only the symbols the expressions actually depend on are
+        included; that is, their free symbols, the symbols those symbols'
+        values are conditioned on, the symbols in those values themselves
+        (like values forward solved in terms of symbols solved after them),
+        and so on. Consider evaluating `x + 1` when
+
+        ```raw
+        a = {-4, 4}
+        b = {-2, 2}     (when a = -4, a = 4)
+        x = {3}
+        ```
+
+        Including `a` and `b` would give four combinations, all of which
+        substitute to `4`; including only `x` gives just the one. (Leaving out
+        symbols like these never changes the results, since every symbol that
+        could put a condition on the included values is still included. This
+        also means values that were set lazily are only worked out if the
+        expressions depend on them.)
+        """
+
+        database = self._symbolValuesDatabase
+        relevantSymbols: set[sympy.Symbol] = set()
+        symbolsToCheck = [
+            symbol
+            for expression in self._expressions
+            for symbol in freeSymbolsOf(expression, includeExpressionLists = False)
+        ]
+        while len(symbolsToCheck) > 0:
+            symbol = symbolsToCheck.pop()
+            # (expression list symbols are resolved separately, first)
+            if symbol in relevantSymbols or symbol not in database or isExpressionListSymbol(symbol):
+                continue
+            relevantSymbols.add(symbol)
+            symbolsToCheck.extend(database.getConditionSymbols(symbol))
+            # (lazy values are only ever set for back substituted values, which
+            # never have symbols in them, so they don't need working out here)
+            if database.isResolved(symbol):
+                symbolsToCheck.extend(
+                    valueSymbol
+                    for conditionalValue in database[symbol]
+                    for valueSymbol in freeSymbolsOf(conditionalValue.value, includeExpressionLists = False)
+                )
+        return tuple(database.inResolutionOrder(relevantSymbols))
+
+    def _substituteCombination(self, expression: sympy.Expr, combination: dict[sympy.Symbol, sympy.Expr], resolvedValues: dict[sympy.Symbol, tuple[sympy.Expr, int, int]]):
+        """
+        Substitutes a combination of values into an expression. This isn't
+        as simple as a single `subs()`, since values can have other symbols of
+        the combination in them (like values forward solved in terms of
+        symbols that weren't solved yet), and `sympy` only substitutes once:
 
         ```raw
         (a + b).subs({
             a: 4,
             b: a - 1,
-        }) == ((4) + (a - 1)).subs({...})
-           == ( 4  + (4)- 1 )
-           == 7
+        }) == ((4) + (a - 1))
         ```
 
-        This function performs exactly this operation; that is, "keep
-        substituting until the expression doesn't change anymore."
+        The desired result is `(4) + ((4) - 1) == 7`. So instead, the values
+        of the expression's symbols are fully worked out first (see
+        `_resolvedValueOf()`), and are then put in with a single `xreplace()`.
         """
 
-        lastExpression = None
-        while lastExpression != expression:
-            lastExpression = expression
-            expression = subsExpr(expression, combination)
-        return expression
+        replacements = {
+            symbol: self._resolvedValueOf(symbol, combination, resolvedValues)[0]
+            for symbol in expression.free_symbols
+            if symbol in combination
+        }
+        subExpr = expression.xreplace(replacements)
+        # (results are only looked up, not interned; most of them are only
+        # needed for a moment)
+        expressionStore = self._symbolValuesDatabase.expressionStore
+        return expressionStore.lookup(subExpr) if expressionStore is not None \
+            else subExpr
+
+    def _resolvedValueOf(self, symbol: sympy.Symbol, combination: dict[sympy.Symbol, sympy.Expr], resolvedValues: dict[sympy.Symbol, tuple[sympy.Expr, int, int]]) -> tuple[sympy.Expr, int]:
+        """
+        Gives a symbol's value in a combination with every other symbol of the
+        combination in it replaced by its own (worked out) value, along with
+        the last position in the combination that value came from.
+
+        Worked out values are kept in `resolvedValues`, along with how many
+        times a value had been put in that last position. Combinations are
+        generated in order, so a value is only ever put in a position again
+        after every position before it changed (or didn't); if the count for
+        the last position it came from is the same, none of the values it came
+        from have changed, and it can be reused. For `a = {1, 2}`,
+        `b = {a + 1}`, and `x = {5, 6, 7}` (in that order), `b` is only worked
+        out twice rather than six times.
+        """
+
+        resolvedValue = resolvedValues.get(symbol)
+        if resolvedValue is not None:
+            (value, lastPosition, assignmentNum) = resolvedValue
+            if self._assignmentNums[lastPosition] == assignmentNum:
+                return (value, lastPosition)
+
+        value = combination[symbol]
+        lastPosition = self._positionOfSymbol.get(symbol, 0)
+        replacements: dict[sympy.Symbol, sympy.Expr] = dict()
+        for otherSymbol in value.free_symbols:
+            if otherSymbol in combination and otherSymbol != symbol:
+                (replacements[otherSymbol], otherLastPosition) = self._resolvedValueOf(otherSymbol, combination, resolvedValues)
+                lastPosition = max(lastPosition, otherLastPosition)
+        if len(replacements) > 0:
+            value = value.xreplace(replacements)
+        resolvedValues[symbol] = (value, lastPosition, self._assignmentNums[lastPosition])
+        return (value, lastPosition)
     
     def _generateCombinations(self, numExprListsResolved, resolutionIdx):
         """
@@ -180,10 +474,13 @@ class CombinationsSubstituter:
         the other symbols listed in the `_resolutionOrder`.
         """
 
+        position = numExprListsResolved + resolutionIdx
         noExprListsLeft = numExprListsResolved == len(self._exprListSymbols)
         if noExprListsLeft:
             noSymbolsLeftToInclude = resolutionIdx == len(self._resolutionOrder)
             if noSymbolsLeftToInclude:
+                if self._cancellationToken is not None:
+                    self._cancellationToken.checkpoint()
                 # copied to avoid the side-effects of changing currCombination across iterations
                 finishedCombination = dict(self._currCombination)
                 yield finishedCombination
@@ -199,6 +496,7 @@ class CombinationsSubstituter:
             if self._testConditionsMet(conditionalValue):
                 # overwritten to save on memory (instead of copying and creating a bunch of dicts)
                 self._currCombination[symbolToInclude] = conditionalValue.value
+                self._assignmentNums[position] += 1
                 yield from self._generateCombinations(numExprListsResolved, resolutionIdx)
 
     def _testConditionsMet(self, conditionalValue: ConditionalValue[Any]):
@@ -223,8 +521,11 @@ class CombinationsSubstituter:
             if symbol not in self._currCombination:
                 # we just pretend the conditions match; the contradiction checking will be done later
                 assert self._restrictRedefSymbol == symbol, "Symbol was expected to be in combination but was missing (and wasn't a redefinition case)"
-            elif self._currCombination[symbol] != value:
-                return False
+            else:
+                # (values are interned, so equal values are almost always the same object)
+                combinationValue = self._currCombination[symbol]
+                if combinationValue is not value and combinationValue != value:
+                    return False
         return True
 
 
@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from src.algebrasolver.timeLimitedPool import WorkerFailure, workerContext
+
+
+class FamilySolverPool:
+    """
+    A pool of worker processes for solving independent inference families at
+    the same time. Inference families from different relation components never
+    share any symbols, so solving one can never change how another is solved.
+    Consider the relations
+
+    ```raw
+    a^2 + a*b = 12      (component 1)
+    b^3 = 8             (component 1)
+    x^5 - x*y = 1       (component 2)
+    y^2 = 3             (component 2)
+    ```
+
+    Both families can be solved on their own, which (since solving is almost
+    entirely `solveset()` grinding away on one core) is exactly the kind of work
+    that benefits from more cores.
+
+    The pool itself doesn't know anything about solving; it just runs a
+    (picklable, module-level) function for every job it is given, and gives
+    back the results in the same order the jobs were given in (no matter what
+    order they actually finish in). Worker processes are only started the
+    first time they are needed (from the same fork server, or by spawning, as
+    a `TimeLimitedPool`'s workers). If there are fewer than `minJobs` jobs,
+    every result is `None`, which means those jobs should be done serially
+    instead. Errors raised by a job are raised again here (without waiting for
+    the other jobs), and if the pool breaks (like when a worker dies),
+    `WorkerFailure` is raised; either way, nothing is done again serially,
+    which could take just as long all over again.
+    """
+
+    def __init__(self, maxWorkers: int, *, minJobs: int = 2):
+        assert maxWorkers > 0, "Pool must have at least one worker"
+        assert minJobs > 0, "Pool must need at least one job to run"
+        self.maxWorkers = maxWorkers
+        self.minJobs = minJobs
+        self._executor: ProcessPoolExecutor | None = None
+
+    def runAll(self, jobFn: Callable[..., Any], jobs: list[tuple]) -> list[Any]:
+        if len(jobs) < self.minJobs:
+            return [None] * len(jobs)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers = self.maxWorkers, mp_context = workerContext)
+        futures = [self._executor.submit(jobFn, *job) for job in jobs]
+        try:
+            return [future.result() for future in futures]
+        except BrokenProcessPool as exception:
+            # (a new pool is started next time)
+            self.shutdown()
+            raise WorkerFailure(f"Worker could not run {getattr(jobFn, '__name__', jobFn)}()") from exception
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures = True)
+            self._executor = None
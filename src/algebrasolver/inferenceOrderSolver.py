@@ -1,3 +1,5 @@
+from typing import Callable, Iterable
+
 import sympy
 
 from src.parsing.parser import freeSymbolsOf
@@ -6,6 +8,27 @@ from src.algebrasolver.relationSymbolTable import RelationSymbolTable
 from src.algebrasolver.types import *
 
 
+class _InferenceFamily:
+    # (a node in the union-find of inference families; only the root of each
+    # family has its relations, its (not yet planned) symbols, and the last
+    # group of already planned families it builds on)
+    __slots__ = ("parent", "relations", "symbols", "plannedGroup", "isPlanned")
+
+    def __init__(self, relation: Relation, symbols: list[sympy.Symbol], plannedGroup: int):
+        self.parent: _InferenceFamily | None = None
+        self.relations: list[Relation] = [relation]
+        # (a dictionary is used as an ordered set)
+        self.symbols: dict[sympy.Symbol, None] = dict.fromkeys(symbols)
+        self.plannedGroup = plannedGroup
+        self.isPlanned = False
+
+    @property
+    def isSolid(self):
+        # (every relation is paired with exactly one of the symbols, so there
+        # are no holes exactly when the counts match)
+        return len(self.relations) == len(self.symbols)
+
+
 class InferenceOrderSolver:
     """
     In order for the solver to "solve for variables", it needs to know a list of
@@ -55,19 +78,38 @@ class InferenceOrderSolver:
     `z = 25`.)
     """
     
-    def __init__(self, relations: list[Relation], knownSymbols: SymbolsDatabase):
+    def __init__(self, relations: list[Relation], knownSymbols: SymbolsDatabase, *, symbolsOf: Callable[[Relation], Iterable[sympy.Symbol]] | None = None):
         self._relations = relations
         self._knownSymbols = knownSymbols
+        # (the solver passes its own index of each relation's symbols, if it
+        # has one; otherwise they are worked out here)
+        self._indexedSymbolsOf = symbolsOf
         self._potentialInferencesTable = RelationSymbolTable()
+        self._familyOfRelation: dict[Relation, _InferenceFamily] = dict()
+        self._familiesWaitingOn: dict[sympy.Symbol, list[_InferenceFamily]] = dict()
+        # (the group each planned symbol's family was put in)
+        self._groupOfPlannedSymbol: dict[sympy.Symbol, int] = dict()
+        self._familyGroups: list[list[list[tuple[sympy.Symbol, Relation]]]] = list()
+        self._symbolsOfRelation: dict[Relation, tuple[sympy.Symbol, ...]] = dict()
 
     def findSolveOrder(self):
+        """
+        Gives just the first family from `findSolveOrders()` (or `None` if
+        there aren't any).
+        """
+
+        for familyGroup in self.findSolveOrders():
+            return familyGroup[0]
+        return None
+
+    def findSolveOrders(self):
         """
         This is the main algorithm for this "solver". Simply put, it iterates
         through each relation it is given, pairs it with "the right symbol",
-        and, if "the right symbol" was the last unknown one in the
-        relation *and* the current list of symbol-relation pairs forms a
-        "solid inference family", it returns the symbol-relation pairs in that
-        "inference family".
+        and keeps track of which "inference family" each relation ends up in.
+        Every time a family becomes "solid", its symbol-relation pairs are set
+        aside, and once all the relations have been gone through, every solid
+        family is given back at once.
 
         Now, first let's describe what it means to pair with "the right symbol".
         A symbol is determined to be "the right one" if it
@@ -118,19 +160,40 @@ class InferenceOrderSolver:
         detected).
 
         Lastly, this algorithm depends on detecting a "solid inference family".
-        This process is described fully in the documentation for
-        `_testSolidInferenceFamily()` (in terms of musical chairs, which is
-        fun). But in short, an "inference family" is a collection of all
-        relations that share any of their variables with each other (just one
-        relation in the family needs to share just one symbol with a second
-        relation for the second relation to be a part of the family). A "solid"
-        inference family is one that has the same number of relations as there
-        are symbols that describe them (aka it could follow the
-        one-symbol-per-relation principle for back substitution), "solid"
-        referring to the family not having any "holes", where a "hole" is any
-        extra symbol that cannot possibly be inferred by back substitution
-        (because there aren't enough relations to satisfy the
+        An "inference family" is a collection of paired relations that can only
+        be solved together, because each one needs a symbol paired with another
+        (`a + b = 6` paired with `a` needs `b`, and `a = 2*b` paired with `b`
+        needs `a`). A relation that only needs the symbols of a family (without
+        the family needing it back) is left in a family of its own, to be solved
+        after. A "solid" inference family is one that has the same number of
+        relations as there are (not yet planned) symbols that describe them (aka
+        it could follow the one-symbol-per-relation principle for back
+        substitution), "solid" referring to the family not having any "holes",
+        where a "hole" is any extra symbol that cannot possibly be inferred by
+        back substitution (because there aren't enough relations to satisfy the
         one-symbol-per-relation principle).
+
+        Families are kept track of with a union-find, where each family also
+        keeps its relations and its symbols. Since every relation in a family is
+        paired with exactly one symbol, checking if a family is solid is just
+        comparing those two counts (no need to walk through the whole family to
+        look for holes).
+
+        Once a family is solid, its symbols are treated as if they were already
+        known for the rest of the relations (they will be, once the family is
+        solved), so a later family can build on the symbols of an earlier one:
+
+        ```raw
+        a + b = 6       (family 1)
+        a = 2*b         (family 1)
+        c = a - b       (family 2, which needs `a` and `b` first)
+        ```
+
+        This is why the families are given back in "groups". Families in the
+        same group don't need anything from each other (so they can all be
+        solved at the same time), and each group only needs the symbols from
+        the groups before it. If there are no solid families at all, an empty
+        list is given back.
         """
         
         symbolCounts = self._countSymbols()
@@ -144,91 +207,159 @@ class InferenceOrderSolver:
         # last relation, which actually provides its value
         assert self._testRelationsSorted(), "Relations for inference solver must be sorted!"
         for relation in self._relations:
-            unknownSymbolsInRelation: list[tuple[sympy.Symbol, int]] = [
+            plannedGroups = [
+                self._groupOfPlannedSymbol[symbol]
+                for symbol in self._symbolsOf(relation)
+                if symbol in self._groupOfPlannedSymbol
+            ]
+            unknownSymbols = [
+                symbol
+                for symbol in self._symbolsOf(relation)
+                if symbol not in self._knownSymbols and symbol not in self._groupOfPlannedSymbol
+            ]
+            unpairedSymbolsInRelation: list[tuple[sympy.Symbol, int]] = [
                 (symbol, symbolCounts[symbol])
-                for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False)
-                if symbol not in self._knownSymbols and symbol not in self._potentialInferencesTable
+                for symbol in unknownSymbols
+                if symbol not in self._potentialInferencesTable
             ]
 
             (symbolToSolve, symbolCount) = min(
-                unknownSymbolsInRelation,
+                unpairedSymbolsInRelation,
                 key = lambda symbolAndCount: symbolAndCount[1],
                 default = (None, None)
             )
-            if symbolToSolve is not None:
-                self._potentialInferencesTable[symbolToSolve] = relation
-
-                # optimization: inference family cannot be solid unless this relation
-                # has potential inferences for all of its symbols
-                wasLastUnknownSymbol = len(unknownSymbolsInRelation) == 1
-                if wasLastUnknownSymbol:
-                    (canBackSubstitute, symbolsInFamily) = self._testSolidInferenceFamily(relation)
-                    if canBackSubstitute:
-                        return sorted(
-                            [
-                                (symbolToInfer, relationToInferFrom)
-                                for symbolToInfer in symbolsInFamily
-                                for relationToInferFrom in [self._potentialInferencesTable[symbolToInfer]]
-                            ],
-                            key = lambda data: len(freeSymbolsOf(data[1].asExprEqToZero, includeExpressionLists = False))
-                        )
-        return None
-    
-    def _testSolidInferenceFamily(self, baseRelation: Relation, relationsChecked: set[Relation] | None = None, symbolsInFamily: set[sympy.Symbol] | None = None):
+            if symbolToSolve is None:
+                # (every symbol is known or already paired; this relation
+                # can't give any new information, only contradictions)
+                continue
+
+            self._potentialInferencesTable[symbolToSolve] = relation
+            family = self._addToFamilies(relation, symbolToSolve, unknownSymbols, max(plannedGroups, default = -1))
+            if family.isSolid:
+                self._planFamily(family)
+        return self._familyGroups
+
+    def _addToFamilies(self, relation: Relation, pairedSymbol: sympy.Symbol, unknownSymbols: list[sympy.Symbol], plannedGroup: int):
+        """
+        Gives the (just paired) `relation` a family of its own, which waits on
+        the rest of its unknown symbols to be planned. If the relation closes a
+        loop (some family it waits on is, in turn, waiting on `pairedSymbol`),
+        every family in the loop is merged into one, since they can only be
+        solved together.
+        """
+
+        family = _InferenceFamily(relation, unknownSymbols, plannedGroup)
+        self._familyOfRelation[relation] = family
+        for symbol in unknownSymbols:
+            if symbol is not pairedSymbol:
+                self._familiesWaitingOn.setdefault(symbol, list()).append(family)
+
+        # families are found by a depth-first search over what each one waits
+        # on (without loops, since loops were merged as they were made)
+        reachesFamily: dict[_InferenceFamily, bool] = {family: True}
+        searchStack = [(family, iter(self._familiesWaitedOnBy(family)))]
+        while len(searchStack) > 0:
+            (currFamily, waitedOnFamilies) = searchStack[-1]
+            waitedOnFamily = next(waitedOnFamilies, None)
+            if waitedOnFamily is None:
+                searchStack.pop()
+                if currFamily is not family:
+                    reachesFamily[currFamily] = any(
+                        reachesFamily.get(otherFamily, False)
+                        for otherFamily in self._familiesWaitedOnBy(currFamily)
+                    )
+            elif waitedOnFamily not in reachesFamily:
+                # (marked before it's finished, but it can only be seen again
+                # by going through `family`)
+                reachesFamily[waitedOnFamily] = False
+                searchStack.append((waitedOnFamily, iter(self._familiesWaitedOnBy(waitedOnFamily))))
+
+        for (otherFamily, isInLoop) in reachesFamily.items():
+            if isInLoop:
+                family = self._mergeFamilies(family, otherFamily)
+        return family
+
+    def _familiesWaitedOnBy(self, family: _InferenceFamily):
+        for symbol in family.symbols:
+            pairedRelation = self._potentialInferencesTable.get(symbol)
+            if pairedRelation is not None:
+                waitedOnFamily = self._findFamily(self._familyOfRelation[pairedRelation])
+                if waitedOnFamily is not family:
+                    yield waitedOnFamily
+
+    def _planFamily(self, family: _InferenceFamily):
         """
-        This function has but one task: Is the inference family given by
-        `baseRelation` "solid"?
-
-        Asking this question is not quite trivial, however, and can loosely be
-        equated to the problem of managing children playing musical chairs.
-        Except the number of chairs is completely variable, the goal is actually
-        to have the same number of chairs as there are children (in one game),
-        each child is highly selective and will only sit on certain chairs,
-        and you are managing multiple games of musical chairs that could or
-        could not actually just be a part of the same game.
-
-        The solution is to first turn the annoying music off -- it makes it hard
-        to think. Then, simply assume all the chairs are filled. Starting with a
-        given "current chair", check if there's a child in each chair, moving to
-        the next chair after checking. If there ever is an empty chair, you know
-        the chairs in that game aren't filled! Otherwise, after traversing all
-        the chairs, you can decide they are all filled.
-
-        This is pretty much the algorithm used below, which recursively checks
-        if every unknown symbol (aka the chair) is paired with a relation
-        (aka the child). If it finds an unpaired, unknown symbol, it returns
-        `False`. Otherwise, after checking all the symbols (in just one family,
-        not all the families), it can confidently return `True`. Notice that it
-        is possible for other relations in `_relations` to be present that
-        aren't a part of the same inference family is the given `baseRelation`.
-        This is why multiple inference families (aka the games) must somehow be
-        tracked at the same time.
+        Sets a solid family aside, in the group after the last one it builds
+        on. Its symbols then count as known, which fills the holes of the
+        families waiting on them (and possibly makes them solid too).
         """
 
-        if relationsChecked is None:
-            relationsChecked = {baseRelation}
-        if symbolsInFamily is None:
-            symbolsInFamily = set()
-
-        # TODO: (optimization?) not every symbol needs to be checked;
-        #       just count symbols/relations to check pairity
-        #       (could also build and keep track of inference families and then
-        #       return a list of "instructions" instead of just one)
-        for symbol in freeSymbolsOf(baseRelation.asExprEqToZero, includeExpressionLists = False):
-            symbolIsPaired = symbol in self._potentialInferencesTable
-            symbolNotKnown = symbol not in self._knownSymbols
-            if symbolIsPaired:
-                symbolsInFamily.add(symbol)
-                relation = self._potentialInferencesTable[symbol]
-                if relation not in relationsChecked:
-                    relationsChecked.add(relation)
-                    (isSolid, symbolsInFamily_extraRef) = self._testSolidInferenceFamily(relation, relationsChecked, symbolsInFamily)
-                    holeExists = not isSolid
-                    if holeExists:
-                        return (False, symbolsInFamily)
-            elif symbolNotKnown:
-                return (False, symbolsInFamily)
-        return (True, symbolsInFamily)
+        familiesToPlan = [family]
+        while len(familiesToPlan) > 0:
+            family = familiesToPlan.pop()
+            if family.isPlanned:
+                continue
+            family.isPlanned = True
+            groupIdx = family.plannedGroup + 1
+            if groupIdx == len(self._familyGroups):
+                self._familyGroups.append(list())
+            self._familyGroups[groupIdx].append(sorted(
+                [
+                    (symbolToInfer, relationToInferFrom)
+                    for symbolToInfer in family.symbols
+                    for relationToInferFrom in [self._potentialInferencesTable[symbolToInfer]]
+                ],
+                key = lambda data: len(self._symbolsOf(data[1]))
+            ))
+            for symbol in family.symbols:
+                self._groupOfPlannedSymbol[symbol] = groupIdx
+                # (families that were merged can each have waited on the
+                # same symbol, so their root only needs to hear about it once)
+                waitingFamilies = {
+                    id(rootFamily): rootFamily
+                    for waitingFamily in self._familiesWaitingOn.pop(symbol, ())
+                    for rootFamily in [self._findFamily(waitingFamily)]
+                }
+                for waitingFamily in waitingFamilies.values():
+                    if waitingFamily.isPlanned:
+                        continue
+                    del waitingFamily.symbols[symbol]
+                    waitingFamily.plannedGroup = max(waitingFamily.plannedGroup, groupIdx)
+                    if waitingFamily.isSolid:
+                        familiesToPlan.append(waitingFamily)
+
+    def _findFamily(self, family: _InferenceFamily):
+        root = family
+        while root.parent is not None:
+            root = root.parent
+        # (path compression, so later lookups go straight to the root)
+        while family.parent is not None:
+            nextFamily = family.parent
+            family.parent = root
+            family = nextFamily
+        return root
+
+    def _mergeFamilies(self, family: _InferenceFamily, otherFamily: _InferenceFamily):
+        if family is otherFamily:
+            return family
+        # (the smaller family is merged into the bigger one)
+        if len(family.relations) < len(otherFamily.relations):
+            (family, otherFamily) = (otherFamily, family)
+        otherFamily.parent = family
+        family.relations.extend(otherFamily.relations)
+        family.symbols.update(otherFamily.symbols)
+        family.plannedGroup = max(family.plannedGroup, otherFamily.plannedGroup)
+        return family
+
+    def _symbolsOf(self, relation: Relation):
+        if self._indexedSymbolsOf is not None:
+            return self._indexedSymbolsOf(relation)
+        # (free symbols are worked out once per relation, not once per use)
+        symbols = self._symbolsOfRelation.get(relation)
+        if symbols is None:
+            symbols = tuple(freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
+            self._symbolsOfRelation[relation] = symbols
+        return symbols
 
     def _countSymbols(self):
         """
@@ -238,7 +369,7 @@ class InferenceOrderSolver:
         
         unknownSymbolCounts: dict[sympy.Symbol, int] = dict()
         for relation in self._relations:
-            for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False):
+            for symbol in self._symbolsOf(relation):
                 if symbol in unknownSymbolCounts:
                     unknownSymbolCounts[symbol] += 1
                 elif symbol not in self._knownSymbols:
@@ -248,7 +379,7 @@ class InferenceOrderSolver:
     def _testRelationsSorted(self):
         lastNumUnknowns = -1
         for relation in self._relations:
-            numUnknowns = len(freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
+            numUnknowns = len(self._symbolsOf(relation))
             if numUnknowns < lastNumUnknowns:
                 return False
             lastNumUnknowns = numUnknowns
@@ -0,0 +1,233 @@
+from fractions import Fraction
+from math import gcd
+
+import sympy
+
+from src.parsing.parser import freeSymbolsOf, isExpressionListSymbol
+from src.algebrasolver.symbolsDatabase import SymbolsDatabase
+from src.algebrasolver.types import *
+
+
+class LinearFamilySolver:
+    """
+    Forward-solving and back-substituting an inference family works for any
+    kind of relation, but it solves one symbol at a time, and every step goes
+    through `solveset()` and a round of combination substitutions. For the very
+    common case of an inference family made entirely of linear relations, like
+
+    ```raw
+    a + b + c = 6
+    a - b = 1
+    2*a + c = 7
+    ```
+
+    all of that work is unnecessary. These are just a system of linear
+    equations, which can be solved all at once by elimination. This class is a
+    disposable, single-use object that does exactly that (for the inference
+    family given by `InferenceOrderSolver.findSolveOrders()`).
+
+    Elimination is done exactly and "fraction-free"; every row is kept as a
+    (sparse) list of integer coefficients, rows are combined by cross
+    multiplying, and rows are divided by their greatest common divisor to keep
+    the numbers small. Fractions only show up at the very end, when solving for
+    each symbol during back substitution.
+
+    This only applies when there is just one possible value for each symbol,
+    which means every relation has to be linear in the family's symbols with
+    rational coefficients, and every known symbol in the relations has to have
+    exactly one (rational) value. If that isn't the case (or the relations turn
+    out to not have exactly one solution), `solve()` gives back `None`, and the
+    family should be solved the usual way instead.
+    """
+
+    def __init__(self, symbolsToSolve: list[tuple[sympy.Symbol, Relation]], knownSymbols: SymbolsDatabase):
+        self._symbolsToSolve = symbolsToSolve
+        self._knownSymbols = knownSymbols
+        self._columnOfSymbol = {
+            symbol: column
+            for (column, (symbol, relation)) in enumerate(symbolsToSolve)
+        }
+
+    def solve(self) -> list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]] | None:
+        """
+        Solves the family, giving the symbols, their values, and their paired
+        relations (in the same format as forward solving); gives `None` if the
+        family can't be solved this way
+        """
+
+        knownConditionsOfRows: list[dict[sympy.Symbol, sympy.Expr]] = list()
+        rows: list[dict[int, int]] = list()
+        constants: list[int] = list()
+        for (symbol, relation) in self._symbolsToSolve:
+            rowData = self._buildRow(relation)
+            if rowData is None:
+                return None
+            (row, constant, knownConditions) = rowData
+            rows.append(row)
+            constants.append(constant)
+            knownConditionsOfRows.append(knownConditions)
+
+        solutions = self._eliminate(rows, constants)
+        if solutions is None:
+            return None
+
+        symbolsLeftOfColumns = self._findSymbolsLeftAfterForwardSolve()
+        solvedSymbols: list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]] = list()
+        for (column, (symbol, relation)) in enumerate(self._symbolsToSolve):
+            conditions = dict(knownConditionsOfRows[column])
+            for laterSymbol in symbolsLeftOfColumns[column]:
+                conditions[laterSymbol] = solutions[self._columnOfSymbol[laterSymbol]]
+            solvedSymbols.append((symbol, {ConditionalValue(solutions[column], conditions)}, relation))
+        return solvedSymbols
+
+    def _buildRow(self, relation: Relation):
+        """
+        Turns a relation into a row of integer coefficients (and the constant
+        on the other side of the equals sign), after substituting all of its
+        known symbols
+        """
+
+        knownConditions: dict[sympy.Symbol, sympy.Expr] = dict()
+        familySymbols: list[sympy.Symbol] = list()
+        for symbol in freeSymbolsOf(relation.asExprEqToZero):
+            if isExpressionListSymbol(symbol):
+                return None
+            elif symbol in self._columnOfSymbol:
+                familySymbols.append(symbol)
+            else:
+                knownValues = self._knownSymbols.get(symbol)
+                if knownValues is None or len(knownValues) != 1:
+                    return None
+                knownValue = next(iter(knownValues)).value
+                if not isinstance(knownValue, sympy.Rational):
+                    return None
+                knownConditions[symbol] = knownValue
+
+        expression = relation.asExprEqToZero.xreplace(knownConditions)
+        try:
+            polynomial = sympy.Poly(expression, *familySymbols)
+        except sympy.PolynomialError:
+            return None
+        if polynomial.total_degree() > 1 or not (polynomial.domain.is_ZZ or polynomial.domain.is_QQ):
+            return None
+
+        fractionalRow: dict[int, Fraction] = dict()
+        fractionalConstant = Fraction(0)
+        for (monomial, coefficient) in polynomial.terms():
+            coefficient = Fraction(int(coefficient.p), int(coefficient.q))
+            if not any(monomial):
+                fractionalConstant = -coefficient
+            else:
+                fractionalRow[self._columnOfSymbol[familySymbols[monomial.index(1)]]] = coefficient
+
+        # (multiplying by the common denominator keeps everything as integers)
+        denominator = 1
+        for coefficient in (*fractionalRow.values(), fractionalConstant):
+            denominator = denominator * coefficient.denominator // gcd(denominator, coefficient.denominator)
+        row = {
+            column: int(coefficient * denominator)
+            for (column, coefficient) in fractionalRow.items()
+        }
+        constant = int(fractionalConstant * denominator)
+        return (row, constant, knownConditions)
+
+    def _eliminate(self, rows: list[dict[int, int]], constants: list[int]) -> list[sympy.Rational] | None:
+        # rows that still have a coefficient in each column (kept up to date as
+        # elimination fills rows in)
+        rowsWithColumn: dict[int, set[int]] = dict()
+        for (rowIdx, row) in enumerate(rows):
+            for column in row:
+                rowsWithColumn.setdefault(column, set()).add(rowIdx)
+
+        pivotRowOfColumn: dict[int, int] = dict()
+        remainingRows = set(range(len(rows)))
+        for column in range(len(self._symbolsToSolve)):
+            candidateRows = sorted(rowsWithColumn.get(column, set()) & remainingRows)
+            if len(candidateRows) == 0:
+                # (no single solution for this system)
+                return None
+            # (the shortest row is used so elimination fills in as little as possible)
+            pivotRowIdx = min(candidateRows, key = lambda rowIdx: len(rows[rowIdx]))
+            pivotRow = rows[pivotRowIdx]
+            pivot = pivotRow[column]
+            remainingRows.remove(pivotRowIdx)
+            pivotRowOfColumn[column] = pivotRowIdx
+
+            for rowIdx in candidateRows:
+                if rowIdx == pivotRowIdx:
+                    continue
+                row = rows[rowIdx]
+                factor = row[column]
+                newRow = {
+                    otherColumn: pivot * coefficient
+                    for (otherColumn, coefficient) in row.items()
+                }
+                for (otherColumn, coefficient) in pivotRow.items():
+                    newCoefficient = newRow.get(otherColumn, 0) - factor * coefficient
+                    if newCoefficient == 0:
+                        newRow.pop(otherColumn, None)
+                    else:
+                        newRow[otherColumn] = newCoefficient
+                newConstant = pivot * constants[rowIdx] - factor * constants[pivotRowIdx]
+
+                divisor = gcd(newConstant, *newRow.values())
+                if divisor > 1:
+                    newRow = {
+                        otherColumn: coefficient // divisor
+                        for (otherColumn, coefficient) in newRow.items()
+                    }
+                    newConstant //= divisor
+                for otherColumn in row.keys() - newRow.keys():
+                    rowsWithColumn[otherColumn].discard(rowIdx)
+                for otherColumn in newRow.keys() - row.keys():
+                    rowsWithColumn.setdefault(otherColumn, set()).add(rowIdx)
+                rows[rowIdx] = newRow
+                constants[rowIdx] = newConstant
+
+        # every pivot row only has columns that were eliminated after it, so
+        # solving backwards only ever needs values that are already known
+        solutions: dict[int, Fraction] = dict()
+        for column in reversed(range(len(self._symbolsToSolve))):
+            pivotRowIdx = pivotRowOfColumn[column]
+            row = rows[pivotRowIdx]
+            remainder = Fraction(constants[pivotRowIdx]) - sum(
+                (coefficient * solutions[otherColumn]
+                for (otherColumn, coefficient) in row.items()
+                if otherColumn != column),
+                Fraction(0)
+            )
+            solutions[column] = remainder / row[column]
+        return [
+            sympy.Rational(solutions[column].numerator, solutions[column].denominator)
+            for column in range(len(self._symbolsToSolve))
+        ]
+
+    def _findSymbolsLeftAfterForwardSolve(self):
+        """
+        Finds the symbols that would have been left in each symbol's
+        forward-solved expression (which become the conditions on its values
+        during back substitution), so results match what forward solving
+        would've given
+        """
+
+        symbolsLeftOfColumns: list[set[sympy.Symbol]] = list()
+        for (column, (symbol, relation)) in enumerate(self._symbolsToSolve):
+            symbolsLeft: set[sympy.Symbol] = set()
+            symbolsToCheck = [
+                familySymbol
+                for familySymbol in freeSymbolsOf(relation.asExprEqToZero)
+                if familySymbol in self._columnOfSymbol
+            ]
+            earlierSymbolsChecked: set[sympy.Symbol] = set()
+            while len(symbolsToCheck) > 0:
+                familySymbol = symbolsToCheck.pop()
+                familySymbolColumn = self._columnOfSymbol[familySymbol]
+                if familySymbolColumn > column:
+                    symbolsLeft.add(familySymbol)
+                elif familySymbolColumn < column and familySymbol not in earlierSymbolsChecked:
+                    # (earlier symbols were substituted with their own
+                    # forward-solved expressions)
+                    earlierSymbolsChecked.add(familySymbol)
+                    symbolsToCheck.extend(symbolsLeftOfColumns[familySymbolColumn])
+            symbolsLeftOfColumns.append(symbolsLeft)
+        return symbolsLeftOfColumns
@@ -0,0 +1,336 @@
+from array import array
+from typing import Callable, Iterable
+
+import sympy
+
+from src.parsing.parser import freeSymbolsOf
+from src.algebrasolver.symbolsDatabase import SymbolsDatabase
+from src.algebrasolver.types import *
+
+
+class MatchingOrderSolver:
+    """
+    Does the same job as the `InferenceOrderSolver` (finding which symbols can
+    be solved with which relations, grouped into families, without actually
+    solving anything), but it goes about it in a different way. Instead of
+    greedily pairing each relation with its "least likely to appear again"
+    symbol, it finds a *maximum matching* between relations and symbols, and
+    then breaks the matched pairs up into the smallest blocks that have to be
+    solved together.
+
+    The greedy pairing relies on the relations being sorted (so it doesn't
+    "trap" a symbol in the wrong relation), and even then, it can miss things
+    a different pairing would have found. Consider
+
+    ```raw
+    c + d = 1       (pairs with d)
+    b + c = 2       (pairs with b, since b and c are just as likely to appear)
+    b + d = 3       (nothing left to pair with! b and d are taken)
+    ```
+
+    which leaves `c` without a relation, even though the three relations are
+    plenty to solve all three symbols. A matching doesn't care what order
+    things come in, or how ties are broken; if there is *any* way to pair every
+    symbol with its own relation, it finds it:
+
+    ```raw
+    c + d = 1       (pairs with d)
+    b + c = 2       (pairs with c)
+    b + d = 3       (pairs with b)
+    ```
+
+    The matching is found with the Hopcroft-Karp algorithm, after a first
+    greedy pass (like the `InferenceOrderSolver`'s, so the usual, simpler
+    pairings are preferred when there is a choice). With a maximum matching in
+    hand, any symbol that can be reached from an unpaired symbol by swapping
+    pairs around (relation to symbol to relation...) can't be solved for,
+    since there is always a way to leave it unpaired instead. Everything else
+    that is paired can be, and those pairs make up the families. (This is the
+    Dulmage-Mendelsohn decomposition, for those into that sort of thing.)
+
+    Families are then found by following what each paired relation needs: a
+    relation needs the relations that every *other* symbol in it is paired
+    with. Relations that need each other (in a loop) have to be solved
+    together, and relations that don't can be solved one after another. These
+    loops are found with Tarjan's algorithm, which also happens to give them
+    back in the order they need to be solved in. Families are grouped the same
+    way as the `InferenceOrderSolver` groups them, so each group only needs
+    the ones before it.
+
+    All of this is done on relations and symbols given integer ids, with
+    their connections stored in flat arrays (two arrays per direction; one
+    with every connection, and one with where each relation's/symbol's
+    connections start).
+    """
+
+    _unmatched = -1
+
+    def __init__(self, relations: list[Relation], knownSymbols: SymbolsDatabase, *, symbolsOf: Callable[[Relation], Iterable[sympy.Symbol]] | None = None):
+        self._relations = relations
+        self._knownSymbols = knownSymbols
+        # (the solver passes its own index of each relation's symbols, if it
+        # has one; otherwise they are worked out on each use)
+        self._indexedSymbolsOf = symbolsOf
+        self._symbols: list[sympy.Symbol] = list()
+        # (connections from relations to symbols, and from symbols to relations)
+        self._symbolIdStarts = array("l")
+        self._symbolIds = array("l")
+        self._relationIdStarts = array("l")
+        self._relationIds = array("l")
+        self._symbolOfRelation = array("l")
+        self._relationOfSymbol = array("l")
+
+    def findSolveOrder(self):
+        """
+        Gives just the first family from `findSolveOrders()` (or `None` if
+        there aren't any).
+        """
+
+        for familyGroup in self.findSolveOrders():
+            return familyGroup[0]
+        return None
+
+    def findSolveOrders(self):
+        """
+        Gives back every family that can be solved, in groups; families in the
+        same group don't need anything from each other, and each group only
+        needs the symbols from the groups before it. If there are no families
+        that can be solved, an empty list is given back.
+        """
+
+        self._buildAdjacency()
+        self._matchGreedily()
+        self._matchMaximally()
+        solvableRelationIds = self._findSolvableRelationIds()
+        blocks = self._findBlocks(solvableRelationIds)
+
+        familyGroups: list[list[list[tuple[sympy.Symbol, Relation]]]] = list()
+        groupOfBlock: list[int] = list()
+        blockOfRelationId: dict[int, int] = dict()
+        for (blockIdx, block) in enumerate(blocks):
+            groupIdx = 1 + max(
+                (
+                    groupOfBlock[blockOfRelationId[neededRelationId]]
+                    for relationId in block
+                    for neededRelationId in self._neededRelationIdsOf(relationId)
+                    if blockOfRelationId.get(neededRelationId, blockIdx) != blockIdx
+                ),
+                default = -1,
+            )
+            for relationId in block:
+                blockOfRelationId[relationId] = blockIdx
+            groupOfBlock.append(groupIdx)
+            if groupIdx == len(familyGroups):
+                familyGroups.append(list())
+            familyGroups[groupIdx].append(sorted(
+                [
+                    (self._symbols[self._symbolOfRelation[relationId]], self._relations[relationId])
+                    for relationId in sorted(block)
+                ],
+                key = lambda data: len(self._symbolsOf(data[1]))
+            ))
+        return familyGroups
+
+    def _buildAdjacency(self):
+        idOfSymbol: dict[sympy.Symbol, int] = dict()
+        symbolIdsOfRelations: list[list[int]] = list()
+        for relation in self._relations:
+            symbolIds: list[int] = list()
+            for symbol in self._symbolsOf(relation):
+                if symbol in self._knownSymbols:
+                    continue
+                symbolId = idOfSymbol.get(symbol)
+                if symbolId is None:
+                    symbolId = len(self._symbols)
+                    idOfSymbol[symbol] = symbolId
+                    self._symbols.append(symbol)
+                symbolIds.append(symbolId)
+            symbolIdsOfRelations.append(symbolIds)
+
+        relationIdsOfSymbols: list[list[int]] = [list() for _ in self._symbols]
+        for (relationId, symbolIds) in enumerate(symbolIdsOfRelations):
+            self._symbolIdStarts.append(len(self._symbolIds))
+            self._symbolIds.extend(symbolIds)
+            for symbolId in symbolIds:
+                relationIdsOfSymbols[symbolId].append(relationId)
+        self._symbolIdStarts.append(len(self._symbolIds))
+        for relationIds in relationIdsOfSymbols:
+            self._relationIdStarts.append(len(self._relationIds))
+            self._relationIds.extend(relationIds)
+        self._relationIdStarts.append(len(self._relationIds))
+
+        self._symbolOfRelation = array("l", [self._unmatched]) * len(self._relations)
+        self._relationOfSymbol = array("l", [self._unmatched]) * len(self._symbols)
+
+    def _symbolsOf(self, relation: Relation):
+        if self._indexedSymbolsOf is not None:
+            return self._indexedSymbolsOf(relation)
+        return tuple(freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
+
+    def _symbolIdsOf(self, relationId: int):
+        return self._symbolIds[self._symbolIdStarts[relationId]:self._symbolIdStarts[relationId + 1]]
+
+    def _relationIdsOf(self, symbolId: int):
+        return self._relationIds[self._relationIdStarts[symbolId]:self._relationIdStarts[symbolId + 1]]
+
+    def _neededRelationIdsOf(self, relationId: int):
+        pairedSymbolId = self._symbolOfRelation[relationId]
+        for symbolId in self._symbolIdsOf(relationId):
+            if symbolId != pairedSymbolId:
+                yield self._relationOfSymbol[symbolId]
+
+    def _matchGreedily(self):
+        # (the same "lowest count" choice the `InferenceOrderSolver` makes,
+        # which gives a good head start and prefers the same pairings it would)
+        for relationId in range(len(self._relations)):
+            unpairedSymbolIds = [
+                symbolId
+                for symbolId in self._symbolIdsOf(relationId)
+                if self._relationOfSymbol[symbolId] == self._unmatched
+            ]
+            if len(unpairedSymbolIds) > 0:
+                symbolId = min(
+                    unpairedSymbolIds,
+                    key = lambda symbolId: self._relationIdStarts[symbolId + 1] - self._relationIdStarts[symbolId]
+                )
+                self._symbolOfRelation[relationId] = symbolId
+                self._relationOfSymbol[symbolId] = relationId
+
+    def _matchMaximally(self):
+        """
+        Hopcroft-Karp: repeatedly finds a set of shortest "augmenting paths"
+        (paths that start at an unpaired relation, alternate between unpaired
+        and paired connections, and end at an unpaired symbol) and flips every
+        pair along them, which pairs one more relation per path. When there
+        are no augmenting paths left, the matching is as big as it can be.
+        """
+
+        numRelations = len(self._relations)
+        while True:
+            # breadth-first search, layering relations by their distance from
+            # an unpaired relation
+            distances = [-1] * numRelations
+            queue = [
+                relationId
+                for relationId in range(numRelations)
+                if self._symbolOfRelation[relationId] == self._unmatched
+            ]
+            for relationId in queue:
+                distances[relationId] = 0
+            foundAugmentingPath = False
+            for relationId in queue:
+                for symbolId in self._symbolIdsOf(relationId):
+                    pairedRelationId = self._relationOfSymbol[symbolId]
+                    if pairedRelationId == self._unmatched:
+                        foundAugmentingPath = True
+                    elif distances[pairedRelationId] == -1:
+                        distances[pairedRelationId] = distances[relationId] + 1
+                        queue.append(pairedRelationId)
+            if not foundAugmentingPath:
+                return
+
+            # depth-first search, only along the layers, flipping the pairs of
+            # each path found (relations that lead nowhere are taken out of
+            # the layers so they aren't searched again)
+            nextEdgeIdxs = list(self._symbolIdStarts[:numRelations])
+            for startRelationId in range(numRelations):
+                if self._symbolOfRelation[startRelationId] != self._unmatched:
+                    continue
+                relationPath = [startRelationId]
+                symbolPath: list[int] = list()
+                while len(relationPath) > 0:
+                    relationId = relationPath[-1]
+                    if nextEdgeIdxs[relationId] == self._symbolIdStarts[relationId + 1]:
+                        distances[relationId] = -1
+                        relationPath.pop()
+                        if len(symbolPath) > 0:
+                            symbolPath.pop()
+                        continue
+
+                    symbolId = self._symbolIds[nextEdgeIdxs[relationId]]
+                    nextEdgeIdxs[relationId] += 1
+                    pairedRelationId = self._relationOfSymbol[symbolId]
+                    if pairedRelationId == self._unmatched:
+                        symbolPath.append(symbolId)
+                        for (pathRelationId, pathSymbolId) in zip(relationPath, symbolPath):
+                            self._symbolOfRelation[pathRelationId] = pathSymbolId
+                            self._relationOfSymbol[pathSymbolId] = pathRelationId
+                        break
+                    elif distances[pairedRelationId] == distances[relationId] + 1:
+                        relationPath.append(pairedRelationId)
+                        symbolPath.append(symbolId)
+
+    def _findSolvableRelationIds(self):
+        """
+        Gives the ids of paired relations whose symbols can actually be solved
+        for; that is, every paired relation except the ones whose symbols can
+        be reached from an unpaired symbol by swapping pairs around.
+        """
+
+        unsolvableSymbolIds = [
+            symbolId
+            for symbolId in range(len(self._symbols))
+            if self._relationOfSymbol[symbolId] == self._unmatched
+        ]
+        isUnsolvable = [False] * len(self._symbols)
+        for symbolId in unsolvableSymbolIds:
+            isUnsolvable[symbolId] = True
+        for symbolId in unsolvableSymbolIds:
+            for relationId in self._relationIdsOf(symbolId):
+                pairedSymbolId = self._symbolOfRelation[relationId]
+                if pairedSymbolId != self._unmatched and not isUnsolvable[pairedSymbolId]:
+                    isUnsolvable[pairedSymbolId] = True
+                    unsolvableSymbolIds.append(pairedSymbolId)
+        return [
+            relationId
+            for relationId in range(len(self._relations))
+            for pairedSymbolId in [self._symbolOfRelation[relationId]]
+            if pairedSymbolId != self._unmatched and not isUnsolvable[pairedSymbolId]
+        ]
+
+    def _findBlocks(self, relationIds: list[int]):
+        """
+        Tarjan's strongly connected components, over "relation needs relation"
+        connections. Blocks (the components) come out with every block after
+        the blocks it needs.
+        """
+
+        blocks: list[list[int]] = list()
+        indexOfRelationId: dict[int, int] = dict()
+        lowLinkOfRelationId: dict[int, int] = dict()
+        relationIdStack: list[int] = list()
+        isOnStack: set[int] = set()
+        for startRelationId in relationIds:
+            if startRelationId in indexOfRelationId:
+                continue
+            searchStack = [(startRelationId, self._neededRelationIdsOf(startRelationId))]
+            indexOfRelationId[startRelationId] = lowLinkOfRelationId[startRelationId] = len(indexOfRelationId)
+            relationIdStack.append(startRelationId)
+            isOnStack.add(startRelationId)
+            while len(searchStack) > 0:
+                (relationId, neededRelationIds) = searchStack[-1]
+                neededRelationId = next(neededRelationIds, None)
+                if neededRelationId is not None:
+                    if neededRelationId not in indexOfRelationId:
+                        indexOfRelationId[neededRelationId] = lowLinkOfRelationId[neededRelationId] = len(indexOfRelationId)
+                        relationIdStack.append(neededRelationId)
+                        isOnStack.add(neededRelationId)
+                        searchStack.append((neededRelationId, self._neededRelationIdsOf(neededRelationId)))
+                    elif neededRelationId in isOnStack:
+                        lowLinkOfRelationId[relationId] = min(lowLinkOfRelationId[relationId], indexOfRelationId[neededRelationId])
+                    continue
+
+                searchStack.pop()
+                if len(searchStack) > 0:
+                    (parentRelationId, parentNeededRelationIds) = searchStack[-1]
+                    lowLinkOfRelationId[parentRelationId] = min(lowLinkOfRelationId[parentRelationId], lowLinkOfRelationId[relationId])
+                if lowLinkOfRelationId[relationId] == indexOfRelationId[relationId]:
+                    block: list[int] = list()
+                    while True:
+                        blockRelationId = relationIdStack.pop()
+                        isOnStack.remove(blockRelationId)
+                        block.append(blockRelationId)
+                        if blockRelationId == relationId:
+                            break
+                    blocks.append(block)
+        return blocks
@@ -0,0 +1,155 @@
+import mpmath
+import sympy
+
+
+class NumericRootFinder:
+    """
+    Some relations can't be solved exactly at all. For example
+
+    ```raw
+    x * e^x = 3
+    cos(x) = x
+    ```
+
+    have perfectly good (real) solutions, but `solveset()` can only describe
+    them as a `ConditionSet` ("the x where x*e^x - 3 = 0"), which isn't a value
+    that can be stored for a symbol. This class finds those solutions
+    numerically instead, as `Float`s with a given number of significant digits.
+
+    Like the other solver helpers, this is a disposable, single-use object.
+    Roots are found by scanning for sign changes over a spread of sample points
+    (dense near zero, and getting sparser further out) and refining each
+    bracketed root with `mpmath.findroot()`. If no sign changes are found
+    (like for roots that only touch zero), a handful of starting points are
+    tried with Newton-style iteration instead. Every root found is checked by
+    plugging it back into the expression, which keeps poles (like the ones
+    `tan(x)` has) from being mistaken for roots.
+
+    Only real roots are searched for, and only for expressions of the one
+    symbol (after known symbols have been substituted). `findRoots()` gives back
+    `None` if the expression has any other symbols (meaning it can't be solved
+    numerically at all). Since a search like this can't prove it found every
+    root, the roots given are always a subset of the true roots.
+    """
+
+    numLinearSamples = 400
+    linearSampleBound = 10
+    logSampleBound = 6
+    startingPoints = (0, 1, -1, 0.5, -0.5, 2, -2, 10, -10)
+
+    def __init__(self, expression: sympy.Expr, symbol: sympy.Symbol, precision: int = 15):
+        assert precision > 0, "Roots must have at least one significant digit"
+        self._expression = expression
+        self._symbol = symbol
+        self._precision = precision
+        # (roots are refined with a few extra digits, so the last digit given
+        # is still correct)
+        self._workingPrecision = precision + 5
+        self._tolerance = mpmath.mpf(10) ** (-(precision // 2))
+
+    def findRoots(self) -> sympy.FiniteSet | None:
+        if self._expression.free_symbols - {self._symbol}:
+            return None
+
+        function = sympy.lambdify(self._symbol, self._expression, modules = "mpmath")
+        with mpmath.workdps(self._workingPrecision):
+            roots = self._findBracketedRoots(function)
+            if len(roots) == 0:
+                roots = self._findUnbracketedRoots(function)
+            roots = self._withoutDuplicates(roots)
+            return sympy.FiniteSet(*(
+                sympy.Float(mpmath.nstr(root, self._precision, strip_zeros = False), self._precision)
+                for root in roots
+            ))
+
+    def _findBracketedRoots(self, function):
+        roots: list[mpmath.mpf] = list()
+        lastPoint = None
+        lastValue = None
+        for point in self._samplePoints():
+            value = self._evaluate(function, point)
+            if value is None:
+                lastPoint = None
+                lastValue = None
+                continue
+
+            if value == 0:
+                roots.append(point)
+            elif lastValue is not None and lastValue != 0 and (lastValue < 0) != (value < 0):
+                root = self._refine(function, (lastPoint, point))
+                if root is not None and lastPoint <= root <= point:
+                    roots.append(root)
+            lastPoint = point
+            lastValue = value
+        return roots
+
+    def _findUnbracketedRoots(self, function):
+        roots: list[mpmath.mpf] = list()
+        for startingPoint in self.startingPoints:
+            root = self._refine(function, mpmath.mpf(startingPoint))
+            if root is not None:
+                roots.append(root)
+        return roots
+
+    def _samplePoints(self):
+        linearPoints = (
+            mpmath.mpf(self.linearSampleBound) * (2 * sampleIdx - self.numLinearSamples) / self.numLinearSamples
+            for sampleIdx in range(self.numLinearSamples + 1)
+        )
+        # (roots far from zero are found with exponentially spaced points)
+        numLogSamples = 20 * self.logSampleBound
+        logPoints = (
+            mpmath.mpf(10) ** (mpmath.mpf(self.logSampleBound) * sampleIdx / numLogSamples)
+            for sampleIdx in range(1, numLogSamples + 1)
+        )
+        farPoints = [
+            point
+            for point in logPoints
+            if point > self.linearSampleBound
+        ]
+        return [
+            *(-point for point in reversed(farPoints)),
+            *linearPoints,
+            *farPoints,
+        ]
+
+    def _evaluate(self, function, point):
+        try:
+            value = function(point)
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+        if isinstance(value, mpmath.mpc):
+            if abs(value.imag) > self._tolerance:
+                return None
+            value = value.real
+        if not isinstance(value, mpmath.mpf) or not mpmath.isfinite(value):
+            return None
+        return value
+
+    def _refine(self, function, start):
+        try:
+            if isinstance(start, tuple):
+                root = mpmath.findroot(function, start, solver = "anderson")
+            else:
+                root = mpmath.findroot(function, start)
+        except (ArithmeticError, ValueError, TypeError):
+            return None
+
+        if isinstance(root, mpmath.mpc):
+            if abs(root.imag) > self._tolerance:
+                return None
+            root = root.real
+        value = self._evaluate(function, root)
+        isActuallyRoot = value is not None and abs(value) <= self._tolerance
+        if not isActuallyRoot:
+            return None
+        return root
+
+    def _withoutDuplicates(self, roots: list[mpmath.mpf]):
+        uniqueRoots: list[mpmath.mpf] = list()
+        for root in sorted(roots):
+            isDuplicate = len(uniqueRoots) > 0 and \
+                abs(root - uniqueRoots[-1]) <= self._tolerance * max(1, abs(root))
+            if not isDuplicate:
+                uniqueRoots.append(root)
+        return uniqueRoots
@@ -0,0 +1,66 @@
+import sympy
+
+
+class PolynomialRootFinder:
+    """
+    Most relations, once all of their known symbols are substituted, end up
+    being a simple polynomial of the one symbol left over. For example
+
+    ```raw
+    a^2 + b*a = 6
+    b = 1
+    ```
+
+    becomes `a^2 + a - 6 = 0` while solving for `a`. General `solveset()` can
+    solve these just fine, but it goes through a *lot* of machinery (that is
+    mostly meant for much harder problems) to get there. This class skips all
+    of that for polynomials with numeric coefficients (of degree 4 or less) by
+    going straight to sympy's polynomial root finding.
+
+    Like the other solver helpers, this is a disposable, single-use object.
+    Roots are only given when they are cheap to find exactly, which means the
+    polynomial can be factored (or solved with the quadratic formula). Other
+    polynomials (like cubics that need the cubic formula) and anything that
+    isn't a polynomial give back `None`, meaning `solveset()` should be used
+    instead. The roots given are always the same as the ones `solveset()` would
+    give, although they are sometimes written differently (for example,
+    `I*sqrt(2)` instead of `sqrt(-2)`).
+    """
+
+    maxDegree = 4
+
+    def __init__(self, expression: sympy.Expr, symbol: sympy.Symbol):
+        self._expression = expression
+        self._symbol = symbol
+
+    def findRoots(self) -> sympy.FiniteSet | None:
+        polynomial = self._toNumericPolynomial()
+        if polynomial is None:
+            return None
+
+        # (the cubic/quartic formulas are left to `solveset()`, which also
+        # simplifies their results into a different form)
+        roots = sympy.roots(polynomial, cubics = False, quartics = False)
+        foundAllRoots = sum(roots.values()) == polynomial.degree()
+        if not foundAllRoots:
+            return None
+        # (`solveset()` also expands complex roots into their `re + I*im` form)
+        return sympy.FiniteSet(*(sympy.expand_complex(root) for root in roots))
+
+    def _toNumericPolynomial(self):
+        if not self._expression.is_polynomial(self._symbol):
+            return None
+        try:
+            polynomial = sympy.Poly(self._expression, self._symbol)
+        except sympy.PolynomialError:
+            return None
+
+        hasNumericCoefficients = all(
+            coefficient.is_number and coefficient.is_finite
+            for coefficient in polynomial.coeffs()
+        )
+        # (constant "polynomials" are left to `solveset()` as well, since
+        # they either have no solutions or every number is a solution)
+        if not hasNumericCoefficients or not 1 <= polynomial.degree() <= self.maxDegree:
+            return None
+        return polynomial
@@ -0,0 +1,307 @@
+from typing import Iterable
+
+import sympy
+
+from src.parsing.parser import freeSymbolsOf
+from src.algebrasolver.undoLog import UndoLog
+from src.algebrasolver.types import *
+
+
+class RelationComponent:
+    """
+    A single connected component of the relation/symbol graph; that is, a group
+    of relations that (directly or through each other) share symbols, along
+    with all the symbols in those relations. No relation in one component can
+    ever provide information on the symbols of another component.
+    """
+
+    def __init__(self):
+        # (dictionaries are used as ordered sets here)
+        self.relations: dict[Relation, None] = dict()
+        self.symbols: dict[sympy.Symbol, None] = dict()
+        # components are "exhausted" when inference was attempted and nothing
+        # (else) could be inferred; this stays true until a relation changes
+        self.isExhausted = False
+
+    def __repr__(self):
+        return f"RelationComponent({list(self.relations)})"
+
+
+class RelationComponents:
+    """
+    Keeps a live map of the connected components of the relation/symbol graph,
+    where relations are connected to the symbols they contain (expression list
+    symbols don't count, since they are always known).
+
+    This allows the solver to only do inference work on the relations that a
+    change could possibly affect. Consider the relations
+
+    ```raw
+    a + b = 4       (component 1)
+    a - b = 2       (component 1)
+    x * y = 12      (component 2)
+    ```
+
+    Recording `x = 3` can only ever affect component 2, so there is no reason
+    to search component 1 for things to infer (or contradictions to find).
+    Adding a relation merges every component it touches into one, and removing
+    a relation splits its component back apart (if it was the only thing
+    holding it together).
+
+    Since it has to know which symbols every relation contains anyway, this
+    also doubles as the solver's index of relations and symbols: each
+    relation's symbols are only ever worked out once (when it is added), and
+    `relationsWithSymbol()` is a single lookup rather than a scan over every
+    recorded relation.
+
+    Like the other solver data structures, changes are journaled in the
+    `UndoLog` given to it (if any).
+    """
+
+    def __init__(self, undoLog: UndoLog | None = None):
+        self._componentOfSymbol: dict[sympy.Symbol, RelationComponent] = dict()
+        self._componentOfRelation: dict[Relation, RelationComponent] = dict()
+        self._relationSymbols: dict[Relation, tuple[sympy.Symbol, ...]] = dict()
+        # (the reverse of the above; dictionaries are used as ordered sets)
+        self._relationsOfSymbol: dict[sympy.Symbol, dict[Relation, None]] = dict()
+        # relations are sorted by (number of symbols, insertion number)
+        self._relationSortKeys: dict[Relation, tuple[int, int]] = dict()
+        self._relationCounts: dict[Relation, int] = dict()
+        self._numInsertions = 0
+        self._undoLog = undoLog
+
+    def __iter__(self):
+        # (components are yielded once each, in no particular order)
+        return iter({
+            id(component): component
+            for component in self._componentOfRelation.values()
+        }.values())
+
+    def componentOf(self, key: sympy.Symbol | Relation):
+        if type(key) is Relation:
+            return self._componentOfRelation[key]
+        else:
+            return self._componentOfSymbol[key]
+
+    def getComponent(self, key: sympy.Symbol | Relation):
+        try:
+            return self.componentOf(key)
+        except KeyError:
+            return None
+
+    def sortedRelationsOf(self, component: RelationComponent):
+        """
+        Gives a component's relations in the same order they would appear in
+        the solver's sorted relation list (by number of symbols, ties broken by
+        the order they were added in)
+        """
+
+        return sorted(component.relations, key = self._relationSortKeys.__getitem__)
+
+    def sortedRelationsWithSymbols(self, symbols: Iterable[sympy.Symbol]):
+        """
+        Gives every relation containing at least one of the given symbols, in
+        the same order as `sortedRelationsOf()`
+        """
+
+        relations = {
+            relation: None
+            for symbol in symbols
+            for relation in self._relationsOfSymbol.get(symbol, ())
+        }
+        return sorted(relations, key = self._relationSortKeys.__getitem__)
+
+    def symbolsOf(self, relation: Relation):
+        return self._relationSymbols[relation]
+
+    def relationsWithSymbol(self, symbol: sympy.Symbol):
+        """Gives every relation containing a symbol, in the order they were added"""
+
+        return self._relationsOfSymbol.get(symbol, dict()).keys()
+
+    def addRelation(self, relation: Relation):
+        """Adds a relation, merging all the components it connects; returns its component"""
+
+        if relation in self._componentOfRelation:
+            # (identical relations can be recorded more than once, but they
+            # only need to show up once in their component)
+            self._relationCounts[relation] += 1
+            def undoCount():
+                self._relationCounts[relation] -= 1
+            self._recordUndo(undoCount)
+            return self._componentOfRelation[relation]
+
+        symbols = tuple(freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
+        sortKey = (len(symbols), self._numInsertions)
+        self._numInsertions += 1
+
+        connectedComponents = list({
+            id(component): component
+            for symbol in symbols
+            if symbol in self._componentOfSymbol
+            for component in [self._componentOfSymbol[symbol]]
+        }.values())
+        if len(connectedComponents) > 0:
+            # smaller components are merged into the largest one (so only the
+            # smaller components need their relations/symbols moved)
+            mergedComponent = max(connectedComponents, key = lambda component: len(component.relations))
+            componentsToMerge = [component for component in connectedComponents if component is not mergedComponent]
+        else:
+            mergedComponent = RelationComponent()
+            componentsToMerge = []
+        wasExhausted = mergedComponent.isExhausted
+        newSymbols = [
+            symbol
+            for component in componentsToMerge
+            for symbol in component.symbols
+        ] + [
+            symbol
+            for symbol in symbols
+            if symbol not in self._componentOfSymbol
+        ]
+        movedRelations = [
+            movedRelation
+            for component in componentsToMerge
+            for movedRelation in component.relations
+        ]
+
+        for symbol in newSymbols:
+            mergedComponent.symbols[symbol] = None
+            self._componentOfSymbol[symbol] = mergedComponent
+        for movedRelation in movedRelations + [relation]:
+            mergedComponent.relations[movedRelation] = None
+            self._componentOfRelation[movedRelation] = mergedComponent
+        mergedComponent.isExhausted = False
+        self._relationSymbols[relation] = symbols
+        self._indexRelationSymbols(relation, symbols)
+        self._relationSortKeys[relation] = sortKey
+        self._relationCounts[relation] = 1
+
+        def undo():
+            self._relationCounts.pop(relation)
+            self._relationSortKeys.pop(relation)
+            self._relationSymbols.pop(relation)
+            self._unindexRelationSymbols(relation, symbols)
+            mergedComponent.isExhausted = wasExhausted
+            mergedComponent.relations.pop(relation)
+            self._componentOfRelation.pop(relation)
+            for symbol in newSymbols:
+                mergedComponent.symbols.pop(symbol)
+                self._componentOfSymbol.pop(symbol)
+            for movedRelation in movedRelations:
+                mergedComponent.relations.pop(movedRelation)
+            # (the merged components were never modified, so they can just be
+            # linked back up again)
+            for component in componentsToMerge:
+                for symbol in component.symbols:
+                    self._componentOfSymbol[symbol] = component
+                for movedRelation in component.relations:
+                    self._componentOfRelation[movedRelation] = component
+            self._numInsertions -= 1
+        self._recordUndo(undo)
+        return mergedComponent
+
+    def removeRelation(self, relation: Relation):
+        """
+        Removes a relation, splitting its component if needed; returns the new
+        (split) components. Removing a relation can't make anything new
+        inferable, so the split components stay exhausted if the old one was
+        (see `markChanged()` for when values were lost along with it).
+        """
+
+        oldComponent = self._componentOfRelation[relation]
+        if self._relationCounts[relation] > 1:
+            self._relationCounts[relation] -= 1
+            def undoCount():
+                self._relationCounts[relation] += 1
+            self._recordUndo(undoCount)
+            return [oldComponent]
+
+        self._relationCounts.pop(relation)
+        symbols = self._relationSymbols.pop(relation)
+        self._unindexRelationSymbols(relation, symbols)
+        sortKey = self._relationSortKeys.pop(relation)
+        self._componentOfRelation.pop(relation)
+        for symbol in symbols:
+            self._componentOfSymbol.pop(symbol, None)
+
+        # the old component isn't modified; new components are built from the
+        # relations left in it (which might not be connected anymore)
+        relationsBySymbol: dict[sympy.Symbol, list[Relation]] = dict()
+        for otherRelation in oldComponent.relations:
+            if otherRelation != relation:
+                for symbol in self._relationSymbols[otherRelation]:
+                    relationsBySymbol.setdefault(symbol, []).append(otherRelation)
+        newComponents: list[RelationComponent] = list()
+        for startRelation in oldComponent.relations:
+            if startRelation == relation or startRelation in self._componentOfRelation and self._componentOfRelation[startRelation] is not oldComponent:
+                continue
+            newComponent = RelationComponent()
+            newComponent.isExhausted = oldComponent.isExhausted
+            relationsToVisit = [startRelation]
+            while len(relationsToVisit) > 0:
+                visitedRelation = relationsToVisit.pop()
+                if visitedRelation in newComponent.relations:
+                    continue
+                newComponent.relations[visitedRelation] = None
+                self._componentOfRelation[visitedRelation] = newComponent
+                for symbol in self._relationSymbols[visitedRelation]:
+                    if symbol not in newComponent.symbols:
+                        newComponent.symbols[symbol] = None
+                        self._componentOfSymbol[symbol] = newComponent
+                        relationsToVisit.extend(relationsBySymbol[symbol])
+            newComponents.append(newComponent)
+
+        def undo():
+            for newComponent in newComponents:
+                for symbol in newComponent.symbols:
+                    self._componentOfSymbol.pop(symbol)
+                for otherRelation in newComponent.relations:
+                    self._componentOfRelation.pop(otherRelation)
+            for symbol in oldComponent.symbols:
+                self._componentOfSymbol[symbol] = oldComponent
+            for otherRelation in oldComponent.relations:
+                self._componentOfRelation[otherRelation] = oldComponent
+            self._relationSymbols[relation] = symbols
+            self._relationSortKeys[relation] = sortKey
+            self._indexRelationSymbols(relation, symbols)
+            # (the relation has to go back where it was among the others, not
+            # at the end, so relations keep coming out in the order they were
+            # added)
+            for symbol in symbols:
+                self._relationsOfSymbol[symbol] = dict.fromkeys(sorted(
+                    self._relationsOfSymbol[symbol],
+                    key = lambda otherRelation: self._relationSortKeys[otherRelation][1]
+                ))
+            self._relationCounts[relation] = 1
+        self._recordUndo(undo)
+        return newComponents
+
+    def markExhausted(self, component: RelationComponent):
+        if not component.isExhausted:
+            component.isExhausted = True
+            def undo():
+                component.isExhausted = False
+            self._recordUndo(undo)
+
+    def markChanged(self, component: RelationComponent):
+        if component.isExhausted:
+            component.isExhausted = False
+            def undo():
+                component.isExhausted = True
+            self._recordUndo(undo)
+
+    def _indexRelationSymbols(self, relation: Relation, symbols: tuple[sympy.Symbol, ...]):
+        for symbol in symbols:
+            self._relationsOfSymbol.setdefault(symbol, dict())[relation] = None
+
+    def _unindexRelationSymbols(self, relation: Relation, symbols: tuple[sympy.Symbol, ...]):
+        for symbol in symbols:
+            relations = self._relationsOfSymbol[symbol]
+            relations.pop(relation)
+            if len(relations) == 0:
+                self._relationsOfSymbol.pop(symbol)
+
+    def _recordUndo(self, undo):
+        if self._undoLog is not None:
+            self._undoLog.record(undo)
@@ -2,6 +2,7 @@ from typing import TypeVar, overload
 
 import sympy
 
+from src.algebrasolver.undoLog import UndoLog
 from src.algebrasolver.types import *
 
 class RelationSymbolTable:
@@ -24,13 +25,18 @@ class RelationSymbolTable:
     assert table[Relation(a + b, 6)] == a
     assert table[b] == Relation(b, a - 2)
     ```
+
+    Like the `SymbolsDatabase`, changes to the table are journaled in the
+    `UndoLog` it is given (if any).
     """
 
     _DefaultType = TypeVar("_DefaultType")
+    _missing = object()
 
-    def __init__(self):
+    def __init__(self, undoLog: UndoLog | None = None):
         self._inferredSymbols: dict[Relation, sympy.Symbol] = dict()
         self._solvedRelations: dict[sympy.Symbol, Relation] = dict()
+        self._undoLog = undoLog
 
     @overload
     def __getitem__(self, key: sympy.Symbol) -> Relation: ...
@@ -53,10 +59,12 @@ class RelationSymbolTable:
     def __setitem__(self, key: sympy.Symbol | Relation, value: sympy.Symbol | Relation):
         if type(key) is sympy.Symbol:
             assert type(value) is Relation
+            self._recordUndo(key, value)
             self._solvedRelations[key] = value
             self._inferredSymbols[value] = key
         elif type(key) is Relation:
             assert type(value) is sympy.Symbol
+            self._recordUndo(value, key)
             self._inferredSymbols[key] = value
             self._solvedRelations[value] = key
         else:
@@ -104,14 +112,33 @@ class RelationSymbolTable:
 
     def pop(self, key: sympy.Symbol | Relation):
         if type(key) is sympy.Symbol:
+            self._recordUndo(key, self._solvedRelations[key])
             value = self._solvedRelations.pop(key)
             self._inferredSymbols.pop(value)
             return value
         elif type(key) is Relation:
+            self._recordUndo(self._inferredSymbols[key], key)
             value = self._inferredSymbols.pop(key)
             self._solvedRelations.pop(value)
             return value
         else:
             raise KeyError(key)
+
+    def _recordUndo(self, symbol: sympy.Symbol, relation: Relation):
+        if self._undoLog is None or not self._undoLog.isRecording:
+            return
+        
+        oldRelation = self._solvedRelations.get(symbol, self._missing)
+        oldSymbol = self._inferredSymbols.get(relation, self._missing)
+        def undo():
+            self._restoreEntry(self._solvedRelations, symbol, oldRelation)
+            self._restoreEntry(self._inferredSymbols, relation, oldSymbol)
+        self._undoLog.record(undo)
+
+    def _restoreEntry(self, dictionary: dict, key, oldValue):
+        if oldValue is self._missing:
+            dictionary.pop(key, None)
+        else:
+            dictionary[key] = oldValue
         
 
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+
+import sympy
+
+from src.common.sympyLinterFixes import solveSet
+from src.common.tracer import tracer
+from src.algebrasolver.polynomialRootFinder import PolynomialRootFinder
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool
+
+
+class SolveSetCache:
+    """
+    A bounded, least-recently-used cache sitting in front of `sympy.solveset()`.
+
+    Solving is by far the most expensive thing the solver does, and the solver
+    ends up asking sympy the same question quite often. Popping a relation
+    re-infers everything that was forgotten, restricted redefinitions solve
+    relations that were already solved once, and expression list combinations
+    can substitute down to the exact same expression over and over again.
+
+    Results are keyed on a "canonical" form of the expression (along with the
+    symbol being solved for), so that expressions that are only different by a
+    constant factor share a result. Since every expression given to the solver
+    is implicitly equal to zero, these all have the same solutions:
+
+    ```raw
+    2*x + 4 = 0
+    -x - 2 = 0
+    x + 2 = 0       <-- (canonical form)
+    ```
+
+    Once the cache holds `maxSize` results, the result used least recently is
+    forgotten to make room for the new one.
+
+    Results that aren't cached yet are found with a `PolynomialRootFinder` when
+    possible (which is much faster for simple polynomials), falling back to
+    `solveset()` for everything else. (The fast path can be turned off with
+    `usePolynomialRoots`, which is mostly useful for benchmarking it.)
+
+    If a `timeLimitedPool` is given, `solveset()` is run in one of its workers,
+    so an expression it gets stuck on raises `TimeLimitExceeded` (instead of
+    hanging forever). Results that time out aren't cached.
+    """
+
+    def __init__(self, maxSize: int = 1024, *, usePolynomialRoots: bool = True, timeLimitedPool: TimeLimitedPool | None = None):
+        assert maxSize > 0, "Cache must be able to hold at least one result"
+        self.maxSize = maxSize
+        self.usePolynomialRoots = usePolynomialRoots
+        self.timeLimitedPool = timeLimitedPool
+        self.hits = 0
+        self.misses = 0
+        self._solutions: OrderedDict[tuple[sympy.Expr, sympy.Symbol], sympy.Set] = OrderedDict()
+
+    def __len__(self):
+        return len(self._solutions)
+
+    def solve(self, expression: sympy.Expr, symbol: sympy.Symbol) -> sympy.Set:
+        """Gives the same result as `solveSet(expression, symbol)`, computing it only if needed"""
+
+        key = (self._canonicalize(expression), symbol)
+        solution = self._solutions.get(key)
+        if solution is not None:
+            self.hits += 1
+            self._solutions.move_to_end(key)
+            return solution
+
+        self.misses += 1
+        with tracer.span("solveSet") as span:
+            solution = None
+            if self.usePolynomialRoots:
+                solution = PolynomialRootFinder(expression, symbol).findRoots()
+            isPolynomialRoots = solution is not None
+            if solution is None and self.timeLimitedPool is not None:
+                solution = self.timeLimitedPool.run(solveSet, expression, symbol)
+            elif solution is None:
+                solution = solveSet(expression, symbol)
+            span.set(
+                polynomialRoots = isPolynomialRoots,
+                solutions = len(solution) if type(solution) is sympy.FiniteSet else None,
+            )
+        self._solutions[key] = solution
+        if len(self._solutions) > self.maxSize:
+            self._solutions.popitem(last = False)
+        return solution
+
+    def clear(self):
+        self._solutions.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _canonicalize(self, expression: sympy.Expr):
+        # (the rational "content" can be divided out since `expr = 0` and
+        # `c*expr = 0` have the same solutions, as long as c isn't zero)
+        (content, primitive) = sympy.sympify(expression).as_content_primitive()
+        if content == 0:
+            return expression
+        if primitive.could_extract_minus_sign():
+            primitive = -primitive
+        return primitive
@@ -1,15 +1,27 @@
 from typing import Iterable, Generator, Any
 import bisect
+import heapq
 
 import sympy
 
 from src.common.functions import first
-from src.common.sympyLinterFixes import solveSet
+from src.common.tracer import tracer
+from src.common.expressionStore import ExpressionStore
 from src.parsing.parser import isExpressionListSymbol, isNonSymbolicValue, freeSymbolsOf
+from src.parsing.sreprParser import parseSrepr
+from src.algebrasolver.undoLog import UndoLog
 from src.algebrasolver.relationSymbolTable import RelationSymbolTable
-from src.algebrasolver.symbolsDatabase import SymbolsDatabase
+from src.algebrasolver.relationComponents import RelationComponents, RelationComponent
+from src.algebrasolver.symbolsDatabase import SymbolsDatabase, LazyValues
 from src.algebrasolver.inferenceOrderSolver import InferenceOrderSolver
+from src.algebrasolver.matchingOrderSolver import MatchingOrderSolver
+from src.algebrasolver.linearFamilySolver import LinearFamilySolver
 from src.algebrasolver.combinationsSubstituter import CombinationsSubstituter
+from src.algebrasolver.solveSetCache import SolveSetCache
+from src.algebrasolver.numericRootFinder import NumericRootFinder
+from src.algebrasolver.familySolverPool import FamilySolverPool
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool, TimeLimitExceeded
+from src.algebrasolver.cancellation import CancellationToken
 from src.algebrasolver.types import *
 
 
@@ -24,7 +36,8 @@ class AlgebraSolver:
     All of this is one beast of a process; the AlgebraSolver really is a kind of
     mini math engine with more moving parts than anything else in Solver Pro.
     To summarize its behavior, the AlgebraSolver is used like such:
-        - Relations are recorded with `recordRelation()`
+        - Relations are recorded with `recordRelation()` (or many at once
+          with `recordRelations()`)
             - Any variables whose values can be inferred are solved for using
               back substitution
         - Relations may be optionally deleted
@@ -32,18 +45,90 @@ class AlgebraSolver:
               depended on this relation
         - Arbitrary expressions can be given to the solver for substitution of
           known symbols with their values (one symbol *can* map to many values)
+
+    Changes to the solver can also be grouped into transactions (see
+    `beginTransaction()`), which allows a failed group of changes to be undone
+    as a whole.
+
+    Relations that can't be solved exactly (like `x * e^x = 3`) can optionally
+    be solved numerically instead. This can be turned on for every relation
+    with `setNumericMode()`, or for only some relations with the `numeric`
+    option of `recordRelations()`.
+
+    Independent inference families can also be solved in parallel, by giving
+    the number of worker processes to use as `maxWorkers` (by default,
+    everything is solved serially). Worker processes (these, and those of a
+    `timeLimit`) are stopped with `shutdown()`.
+
+    Which symbols get solved with which relations is normally worked out by an
+    `InferenceOrderSolver`. With `useMatchingOrderSolver`, a
+    `MatchingOrderSolver` is used instead, which can find solvable families
+    the usual (greedy) pairing would miss.
+
+    Solving (and simplifying, with `simplify()`) can be given a `timeLimit` in
+    seconds, in which case it is done in a separate, pre-warmed worker process
+    that is killed if it takes too long. Relations that run past the limit
+    raise a `SolveTimeLimitException` (instead of hanging forever). By default,
+    there is no time limit. (A `timeLimitedPool` that is already running can be
+    given instead, to share its workers with other solvers.)
+
+    Anything the solver is doing can also be cancelled from another thread with
+    `cancel()`. The solver stops at the next "checkpoint" in its longer loops
+    and raises a `CancelledException`, undoing any changes it was making. (It
+    stays cancelled until `resetCancellation()` is called.)
     """
 
-    def __init__(self):
+    def __init__(self, *, numericPrecision: int = 15, maxWorkers: int = 0, timeLimit: float | None = None, timeLimitedPool: TimeLimitedPool | None = None, useMatchingOrderSolver: bool = False):
+        # journal of changes made during the current transaction (if any)
+        self._undoLog = UndoLog()
         # a list of relational expressions with an implied equality to zero
         self._recordedRelations: list[Relation] = list()
         self._recordedRelationsSorted: list[Relation] = list()
+        # connected groups of relations (inferences only happen within one)
+        self._relationComponents = RelationComponents(self._undoLog)
+        # canonical objects for the expressions the solver keeps (see
+        # `_sweepExpressionStore()` for how they are let go of)
+        self._expressionStore = ExpressionStore()
+        self._needsFullSweep = False
         # database for "known" values of symbols
-        self._symbolValuesDatabase = SymbolsDatabase()
+        self._symbolValuesDatabase = SymbolsDatabase(self._undoLog, self._expressionStore)
         # table relating symbols to the relations they were inferred from
-        self._inferenceTable = RelationSymbolTable()
+        self._inferenceTable = RelationSymbolTable(self._undoLog)
+        # flag checked throughout solving, for stopping part way through
+        self._cancellationToken = CancellationToken()
+        # worker processes for solving and simplifying with a time limit (if any)
+        self._ownsTimeLimitedPool = timeLimitedPool is None and timeLimit is not None
+        if self._ownsTimeLimitedPool:
+            timeLimitedPool = TimeLimitedPool(timeLimit) # type: ignore
+        self._timeLimitedPool = timeLimitedPool
+        # results of solving relations for symbols (since the same relations
+        # tend to be solved many times)
+        self._solveSetCache = SolveSetCache(timeLimitedPool = self._timeLimitedPool)
+        # relations allowed to be solved numerically (mapped to how many times
+        # each was recorded that way), and whether new relations should be
+        self._numericRelationCounts: dict[Relation, int] = dict()
+        self._isNumericMode = False
+        self._numericPrecision = numericPrecision
+        # worker processes for solving independent inference families (if any)
+        self._familySolverPool = FamilySolverPool(maxWorkers) if maxWorkers > 0 \
+            else None
+        # what finds the families of symbols/relations to solve (see
+        # `MatchingOrderSolver` for how the two differ)
+        self._orderSolverType = MatchingOrderSolver if useMatchingOrderSolver \
+            else InferenceOrderSolver
         # temporary table of "bad symbols", reset on every attempt to record a relation
-        self._contradictedSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None] = dict()
+        self._contradictedSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | LazyValues | None] = dict()
+
+    def shutdown(self):
+        """
+        Stops the solver's worker processes (except those of a `timeLimitedPool`
+        it was given, which are up to whoever made it)
+        """
+
+        if self._familySolverPool is not None:
+            self._familySolverPool.shutdown()
+        if self._ownsTimeLimitedPool:
+            self._timeLimitedPool.shutdown() # type: ignore
 
     def recordRelation(self, relation: Relation):
         """
@@ -93,87 +178,204 @@ class AlgebraSolver:
         ```
         """
 
-        # TODO: use transactional data types that can be reversed more efficiently
-        #       (this API also needs to be public for the driver -- there's a TODO about this)
-        relationsBackup = list(self._recordedRelations)
-        relationsSortedBackup = list(self._recordedRelationsSorted)
-        databaseBackup = self._symbolValuesDatabase.copy()
-        inferenceTableBackup = self._inferenceTable.copy()
-        
-        # if there is a contradiction, it would be with these
-        self._contradictedSymbolValues = {
-            symbol: {
-                conditional.value
-                for conditional in self._symbolValuesDatabase[symbol]
-            }
-            for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False)
-            if symbol in self._symbolValuesDatabase
-        }
+        return first(self.recordRelations([relation]))
+
+    def recordRelations(self, relations: Iterable[Relation], *, numeric: bool = False):
+        """
+        Records many relations at once, returning a list of "is redundant"
+        flags (one for each relation, in the same order). This behaves like
+        calling `recordRelation()` for each relation, except much less work is
+        repeated: every relation is validated first, the whole batch is merged
+        into the recorded relations in one go, and symbol values are only
+        inferred once at the very end.
+
+        The batch is atomic. If any one relation is contradictory (or
+        unsolvable, etc.), none of the relations are recorded.
+
+        Redundancy is judged against the batch as a whole. For example, in the
+        batch
+
+        ```raw
+        a*b = 6
+        a = 2
+        b = 3
+        ```
+
+        `a` and `b` are inferred straight from `a = 2` and `b = 3`, so it is
+        `a*b = 6` that ends up being reported as redundant (whereas recording
+        them one by one would find `b = 3` redundant instead).
+
+        If `numeric` is given (or numeric mode is on), relations that can't be
+        solved exactly are solved numerically. This sticks with the relations;
+        if their symbols ever need to be inferred again later, they will still
+        be solved numerically.
+        """
+
+        relations = list(relations)
+        batchContradictedSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None] = dict()
+        self.beginTransaction()
         try:
-            (isRedundant, isRedundantWithContradictions) = self._checkForRedundancies(relation)
-            if isRedundantWithContradictions:
-                # test for restricted redefinition case, which is when a
-                # relation is restricting what some variable's values are
-                # example: if `a` is already known, {-4, 2, 5}, and a new
-                # relation `a = 2` comes in, this is "redundant" (aka no new
-                # information about other variables) but also contradictory
-                # (because -4 ≠ 2 and 5 ≠ 2)
-                nonExprSymbols = tuple(symbol for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
-                wasActuallyRestrictRedefCase = False
-                couldBeRestrictRedefCase = len(nonExprSymbols) == 1
-                if couldBeRestrictRedefCase:
-                    symbol = first(nonExprSymbols)
-
-                    isRestrictionOfExpressionList = self._dependsOnExpressionListSymbols(symbol)
-                    if isRestrictionOfExpressionList:
-                        raise ContradictionException(self._contradictedSymbolValues, relation)
-
-                    (oldSolutions, oldRelation) = self._popInferredSolutions(symbol)
-
-                    try:
-                        (newSymbol, newSolutions, newRelation) = self._solveForRestrictRedefCase(symbol, relation)
-                    except ContradictionException:
-                        # shouldn't be possible... but just in case!
-                        raise RuntimeError("A contradiction was realized during restriction calculation (no new relations added...?)")
-                    assert symbol == newSymbol, "Restriction solutions don't match found symbol" # this shouldn't be possible (to fail) either!
-                    assert relation == newRelation, "Restriction solution relations don't match" # this ALSO shouldn't be possible (to fail)!
-                    if symbol is not None:
-                        oldSolutionValues = tuple(solution.value for solution in oldSolutions)
-                        newValuesAreActuallyRestrictions = len(newSolutions) < len(oldSolutions) and \
-                            all(solution.value in oldSolutionValues for solution in newSolutions)
-                        if newValuesAreActuallyRestrictions:
-                            newSolutionValues = {condition.value for condition in newSolutions}
-                            newSolutionsWithCorrectConditions = {
-                                condition
-                                for condition in oldSolutions
-                                if condition.value in newSolutionValues
-                            }
-                            self._setInferredSolutions(symbol, newSolutionsWithCorrectConditions, relation)
-                            isRedundant = False # since it technically did provide new information...
-                            wasActuallyRestrictRedefCase = True
-                            
-                            # TODO: (optimization) remove other symbol values that relied on any conditions now not present
-                            #       (since other symbols might have conditions that will never be true when substituted,
-                            #       due to the values that were just removed)
-                
-                if not wasActuallyRestrictRedefCase:
-                    raise ContradictionException(self._contradictedSymbolValues, relation)
+            if numeric or self._isNumericMode:
+                self._markNumericRelations(relations)
+
+            isRedundantFlags: list[bool] = list()
+            with tracer.span("validateRelations", relations = len(relations)):
+                for relation in relations:
+                    self._cancellationToken.checkpoint()
+                    relation.asExprEqToZero = self._expressionStore.intern(relation.asExprEqToZero)
+                    self._contradictedSymbolValues = self._getPotentiallyContradictedSymbolValues(relation)
+                    batchContradictedSymbolValues.update(self._contradictedSymbolValues)
+                    isRedundantFlags.append(self._validateNewRelation(relation))
             
-            self._recordedRelations.append(relation)
-            bisect.insort(
-                self._recordedRelationsSorted,
-                relation,
-                key = lambda relation: len(freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
-            )
-            self._inferSymbolValuesFromRelations()
-            return isRedundant
+            # (any contradiction found while inferring could be with any of
+            # the relations in the batch)
+            self._contradictedSymbolValues = batchContradictedSymbolValues
+            components = self._insertRelations(relations)
+            self._inferSymbolValuesFromRelations(components)
+
+            if len(relations) > 1:
+                # relations that looked useful on their own might not have
+                # been needed after all, now that the rest of the batch is known
+                for (relationIdx, relation) in enumerate(relations):
+                    wasUsedForInference = self._inferenceTable.get(relation) is not None
+                    if not isRedundantFlags[relationIdx] and not wasUsedForInference:
+                        (isRedundant, isRedundantWithContradictions) = self._checkForRedundancies(relation)
+                        isRedundantFlags[relationIdx] = isRedundant
+            self.commitTransaction()
+            return isRedundantFlags
         
         except Exception as exception:
-            self._recordedRelations = relationsBackup
-            self._recordedRelationsSorted = relationsSortedBackup
-            self._symbolValuesDatabase = databaseBackup
-            self._inferenceTable = inferenceTableBackup
-            self._contradictedSymbolValues = dict()
+            self.rollbackTransaction()
+            raise exception
+
+    def beginTransaction(self):
+        """
+        Starts a transaction. Every change made to the solver after this call
+        (recording relations, popping relations, and all the inferences that
+        come with them) is journaled until the transaction is either committed
+        with `commitTransaction()` or undone with `rollbackTransaction()`.
+
+        Transactions can be nested; rolling back an inner transaction only
+        undoes the changes made since it began, and committing it leaves its
+        changes up to the outer transaction.
+        """
+
+        self._undoLog.begin()
+
+    def commitTransaction(self):
+        """Keeps all changes made since the matching `beginTransaction()`"""
+
+        self._undoLog.commit()
+        self._sweepExpressionStore()
+
+    def rollbackTransaction(self):
+        """Undoes all changes made since the matching `beginTransaction()`"""
+
+        self._undoLog.rollback()
+        self._contradictedSymbolValues = dict()
+        self._sweepExpressionStore()
+
+    def setNumericMode(self, isEnabled: bool, *, precision: int | None = None):
+        """
+        Turns numeric mode on or off. While it is on, every relation recorded
+        can be solved numerically (see `recordRelations()`), giving values with
+        `precision` significant digits (if given, otherwise the precision stays
+        what it was).
+        """
+
+        self._isNumericMode = isEnabled
+        if precision is not None:
+            assert precision > 0, "Numeric values must have at least one significant digit"
+            self._numericPrecision = precision
+
+    @property
+    def isNumericMode(self):
+        return self._isNumericMode
+    
+    @property
+    def numericPrecision(self):
+        return self._numericPrecision
+
+    def exportState(self):
+        """
+        Gives everything the solver knows (recorded relations, inferred symbol
+        values with their conditions, which relation each symbol was inferred
+        from, and numeric settings) as plain data that can be written out as
+        JSON. Expressions are written with `sympy.srepr()`, so they come back
+        exactly the same (down to the digits of numeric values).
+        """
+
+        database = self._symbolValuesDatabase
+        return {
+            "relations": [
+                relation.exportState()
+                for relation in self._recordedRelations
+            ],
+            "numericRelations": [
+                [relation.exportState(), count]
+                for (relation, count) in self._numericRelationCounts.items()
+            ],
+            "isNumericMode": self._isNumericMode,
+            "numericPrecision": self._numericPrecision,
+            # (in resolution order, so conditions are always imported before
+            # the values conditioned on them)
+            "symbolValues": [
+                [
+                    sympy.srepr(symbol),
+                    self._inferenceTable[symbol].exportState(),
+                    [
+                        [
+                            sympy.srepr(conditionalValue.value),
+                            [
+                                [sympy.srepr(conditionSymbol), sympy.srepr(conditionValue)]
+                                for (conditionSymbol, conditionValue) in conditionalValue.conditions.items()
+                            ],
+                        ]
+                        for conditionalValue in database[symbol]
+                    ],
+                ]
+                for symbol in tuple(database)
+            ],
+        }
+
+    def importState(self, state: dict):
+        """
+        Restores the state given by `exportState()` into a solver that hasn't
+        recorded anything yet. Values are loaded directly; nothing is solved or
+        inferred again, which is what makes this much faster than recording the
+        same relations from scratch.
+        """
+
+        assert len(self._recordedRelations) == 0, "Solver state can only be imported into an empty solver"
+        self.beginTransaction()
+        try:
+            relations = [
+                Relation.importState(relationData)
+                for relationData in state["relations"]
+            ]
+            self._insertRelations(relations)
+            for (relationData, count) in state["numericRelations"]:
+                self._markNumericRelations([Relation.importState(relationData)] * count)
+            self._isNumericMode = state["isNumericMode"]
+            self._numericPrecision = state["numericPrecision"]
+
+            for (symbolStr, relationData, valuesData) in state["symbolValues"]:
+                solutions = {
+                    ConditionalValue(parseSrepr(valueStr), {
+                        parseSrepr(conditionSymbolStr): parseSrepr(conditionValueStr)
+                        for (conditionSymbolStr, conditionValueStr) in conditionsData
+                    })
+                    for (valueStr, conditionsData) in valuesData
+                }
+                self._setInferredSolutions(parseSrepr(symbolStr), solutions, Relation.importState(relationData))
+
+            # (state is only ever exported after inference finished, so there
+            # is nothing left to infer in any component)
+            for component in self._relationComponents:
+                self._relationComponents.markExhausted(component)
+            self.commitTransaction()
+        except Exception as exception:
+            self.rollbackTransaction()
             raise exception
 
     def getSymbolConditionalValues(self, symbol: sympy.Symbol):
@@ -183,11 +385,9 @@ class AlgebraSolver:
         return tuple(self._recordedRelations)
     
     def getRelationsWithSymbol(self, symbol: sympy.Symbol):
-        return tuple(
-            relation
-            for relation in self._recordedRelations
-            if symbol in freeSymbolsOf(relation.asExprEqToZero)
-        )
+        # (expression list symbols are always known, so relations are never
+        # looked up by them)
+        return tuple(self._relationComponents.relationsWithSymbol(symbol))
     
     def popRelation(self, relation: Relation):
         """
@@ -197,36 +397,61 @@ class AlgebraSolver:
         values for certain symbols depending on the known relations left over.
 
         The algorithm is fairly straightforward: Pop the relation and the
-        symbol. Check every other symbol's conditions. If the popped symbol ever
-        shows up in any of those conditions, those symbols are dependent on the
-        popped symbol and should be popped as well. Then just keep repeating
-        that process until there aren't any more dependent symbols in the
-        database.
+        symbol inferred from it. Any symbol whose values have conditions on a
+        popped symbol depends on that popped symbol, and should be popped as
+        well. The database keeps a reverse index of these dependencies, so this
+        is just a walk through the dependency graph starting from the first
+        popped symbol (and only ever visits the symbols that actually need to
+        be forgotten).
+        """
+        
+        self.popRelations([relation])
+
+    def popRelations(self, relations: Iterable[Relation]):
         """
+        Pops many relations at once. This behaves like calling `popRelation()`
+        for each relation, except values lost from every relation are forgotten
+        together, and whatever can still be inferred from the relations left
+        over is only searched for once at the end.
+
+        Like `recordRelations()`, the batch is atomic; if popping any one
+        relation fails, none of them are popped.
+        """
+
+        relations = list(relations)
+        self.beginTransaction()
+        try:
+            self._removeRelations(relations)
+            inferredSymbols = [
+                inferredSymbol
+                for relation in relations
+                for inferredSymbol in [self._inferenceTable.get(relation)]
+                if inferredSymbol is not None
+            ]
+            databaseDependsOnRelations = len(inferredSymbols) > 0
+            if databaseDependsOnRelations:
+                forgottenSymbols = self._popDependentSolutions(inferredSymbols)
+
+                # in case redundant relations can re-infer lost values
+                # (only relations that had any of the forgotten symbols in them
+                # could have possibly provided them, so nothing else is checked)
+                componentsToReinfer = {
+                    id(component): component
+                    for symbol in forgottenSymbols
+                    for component in [self._relationComponents.getComponent(symbol)]
+                    if component is not None
+                }.values()
+                for component in componentsToReinfer:
+                    self._relationComponents.markChanged(component)
+                self._inferSymbolValuesFromRelations(componentsToReinfer)
+            # (whatever the popped relations were keeping is let go of right
+            # away, not just once the store has grown enough)
+            self._needsFullSweep = True
+            self.commitTransaction()
         
-        self._recordedRelations.remove(relation)
-        self._recordedRelationsSorted.remove(relation)
-        inferredSymbol = self._inferenceTable.get(relation)
-        databaseDependsOnRelation = inferredSymbol is not None
-        if databaseDependsOnRelation:
-            self._popInferredSolutions(inferredSymbol)
-            poppedSymbols = {inferredSymbol}
-            # TODO: there's probably some dependency-path optimization that could be made here
-            anyPopped = True
-            while anyPopped:
-                anyPopped = False
-                for symbol in self._symbolValuesDatabase:
-                    for conditionalValue in self._symbolValuesDatabase[symbol]:
-                        conditions = conditionalValue.conditions
-                        symbolDependsOnPoppedSymbols = any(poppedSymbol in conditions for poppedSymbol in poppedSymbols)
-                        if symbolDependsOnPoppedSymbols:
-                            self._popInferredSolutions(symbol)
-                            poppedSymbols.add(symbol)
-                            anyPopped = True
-                            break # to move on to the next symbol
-
-        # in case redundant relations can re-infer lost values
-        self._inferSymbolValuesFromRelations()
+        except Exception as exception:
+            self.rollbackTransaction()
+            raise exception
     
     def substituteKnownsFor(self, expression: sympy.Expr):
         """
@@ -236,9 +461,12 @@ class AlgebraSolver:
         name is literally the set of values they represent). Multiple
         expressions may be returned if one or more symbols evaluate to multiple
         values.
+
+        (These are only for showing, so combinations of numbers are evaluated
+        all at once with NumPy, if it is installed; see `CombinationsSubstituter`.)
         """
         
-        conditionals = CombinationsSubstituter({expression}, self._symbolValuesDatabase).substitute()
+        conditionals = CombinationsSubstituter({expression}, self._symbolValuesDatabase, cancellationToken = self._cancellationToken, vectorize = True).substitute()
         values = {
             conditional.value
             for conditional in conditionals
@@ -252,17 +480,146 @@ class AlgebraSolver:
         tied to it (given as a `ConditionalValue` instance).
         """
         
-        conditionals = CombinationsSubstituter({expression}, self._symbolValuesDatabase).substitute()
+        conditionals = CombinationsSubstituter({expression}, self._symbolValuesDatabase, cancellationToken = self._cancellationToken, vectorize = True).substitute()
         return set(conditionals)
+
+    def cancel(self):
+        """Makes whatever the solver is currently doing (or does next) raise a `CancelledException`"""
+
+        self._cancellationToken.cancel()
+
+    def resetCancellation(self):
+        self._cancellationToken.reset()
+
+    def simplify(self, expression: sympy.Expr):
+        """
+        Simplifies an expression with `sympy.simplify()`, within the solver's
+        time limit (if it has one)
+        """
+
+        if self._timeLimitedPool is None:
+            return sympy.simplify(expression)
+        try:
+            return self._timeLimitedPool.run(sympy.simplify, expression)
+        except TimeLimitExceeded as exception:
+            raise SimplifyTimeLimitException(expression, exception.timeLimit)
     
-    def _setInferredSolutions(self, symbol: sympy.Symbol, solutions: set[ConditionalValue[sympy.Expr]], associatedRelation: Relation):
+    def _insertRelations(self, relations: list[Relation]):
+        """
+        Adds relations to both recorded relation lists and the relation
+        components (journaling the change for the current transaction), and
+        returns the components they joined. This should *always* be used
+        instead of modifying the lists directly.
+        """
+
+        # (relations are indexed first, so their symbols are only worked out once)
+        for relation in relations:
+            self._relationComponents.addRelation(relation)
+        sortKey = lambda relation: len(self._relationComponents.symbolsOf(relation))
+        oldRecordedRelations = self._recordedRelations
+        oldRecordedRelationsSorted = self._recordedRelationsSorted
+        if len(relations) == 1:
+            relation = first(relations)
+            sortedIdx = bisect.bisect_right(self._recordedRelationsSorted, sortKey(relation), key = sortKey)
+            self._recordedRelations.append(relation)
+            self._recordedRelationsSorted.insert(sortedIdx, relation)
+            def undoInsert():
+                self._recordedRelationsSorted.pop(sortedIdx)
+                self._recordedRelations.pop()
+            self._undoLog.record(undoInsert)
+        else:
+            # (merging is stable and favors the first list, so ties are placed
+            # after relations that were already recorded, just like `insort`)
+            self._recordedRelations = oldRecordedRelations + relations
+            self._recordedRelationsSorted = list(heapq.merge(oldRecordedRelationsSorted, sorted(relations, key = sortKey), key = sortKey))
+            def undoMerge():
+                self._recordedRelations = oldRecordedRelations
+                self._recordedRelationsSorted = oldRecordedRelationsSorted
+            self._undoLog.record(undoMerge)
+
+        # (components can merge while adding, so they are only looked up after)
+        return list({
+            id(component): component
+            for relation in relations
+            for component in [self._relationComponents.componentOf(relation)]
+        }.values())
+
+    def _removeRelations(self, relations: list[Relation]):
+        """
+        Removes relations from both recorded relation lists and the relation
+        components (journaling the change for the current transaction). This
+        should *always* be used instead of modifying the lists directly.
+        """
+
+        oldRecordedRelations = self._recordedRelations
+        oldRecordedRelationsSorted = self._recordedRelationsSorted
+        if len(relations) == 1:
+            relation = first(relations)
+            relationIdx = self._recordedRelations.index(relation)
+            sortedIdx = self._recordedRelationsSorted.index(relation)
+            self._recordedRelations.pop(relationIdx)
+            self._recordedRelationsSorted.pop(sortedIdx)
+            def undoRemove():
+                self._recordedRelationsSorted.insert(sortedIdx, relation)
+                self._recordedRelations.insert(relationIdx, relation)
+            self._undoLog.record(undoRemove)
+        else:
+            self._recordedRelations = self._withoutRelations(oldRecordedRelations, relations)
+            self._recordedRelationsSorted = self._withoutRelations(oldRecordedRelationsSorted, relations)
+            def undoFilter():
+                self._recordedRelations = oldRecordedRelations
+                self._recordedRelationsSorted = oldRecordedRelationsSorted
+            self._undoLog.record(undoFilter)
+
+        for relation in relations:
+            self._relationComponents.removeRelation(relation)
+        self._unmarkNumericRelations(relations)
+
+    def _markNumericRelations(self, relations: list[Relation]):
+        """Allows relations to be solved numerically (journaling the change for the current transaction)"""
+
+        for relation in relations:
+            self._numericRelationCounts[relation] = self._numericRelationCounts.get(relation, 0) + 1
+            def undoMark(relation = relation):
+                self._numericRelationCounts[relation] -= 1
+                if self._numericRelationCounts[relation] == 0:
+                    del self._numericRelationCounts[relation]
+            self._undoLog.record(undoMark)
+
+    def _unmarkNumericRelations(self, relations: list[Relation]):
+        for relation in relations:
+            if relation not in self._numericRelationCounts:
+                continue
+            self._numericRelationCounts[relation] -= 1
+            if self._numericRelationCounts[relation] == 0:
+                del self._numericRelationCounts[relation]
+            def undoUnmark(relation = relation):
+                self._numericRelationCounts[relation] = self._numericRelationCounts.get(relation, 0) + 1
+            self._undoLog.record(undoUnmark)
+
+    def _withoutRelations(self, relationsList: list[Relation], relationsToRemove: list[Relation]):
+        # (like calling `list.remove()` for each relation, but in one pass)
+        numToRemove: dict[Relation, int] = dict()
+        for relation in relationsToRemove:
+            numToRemove[relation] = numToRemove.get(relation, 0) + 1
+        remainingRelations: list[Relation] = list()
+        for relation in relationsList:
+            if numToRemove.get(relation, 0) > 0:
+                numToRemove[relation] -= 1
+            else:
+                remainingRelations.append(relation)
+        if any(num > 0 for num in numToRemove.values()):
+            raise ValueError("Cannot remove relations that were never recorded")
+        return remainingRelations
+
+    def _setInferredSolutions(self, symbol: sympy.Symbol, solutions: set[ConditionalValue[sympy.Expr]] | LazyValues, associatedRelation: Relation):
         """
         Sets a symbol's solutions by keeping the database and relation-symbol
         table in sync. This should *always* be used instead of modifying the
         database/table directly.
         """
 
-        assert all(isNonSymbolicValue(solution.value) for solution in solutions), "Solver tried to set a variable's inferred values to an unsolved expression"
+        assert type(solutions) is LazyValues or all(isNonSymbolicValue(solution.value) for solution in solutions), "Solver tried to set a variable's inferred values to an unsolved expression"
         self._symbolValuesDatabase[symbol] = solutions
         self._inferenceTable[symbol] = associatedRelation
 
@@ -277,11 +634,118 @@ class AlgebraSolver:
         associatedRelation = self._inferenceTable.pop(symbol)
         return (solutions, associatedRelation)
 
+    def _forgetInferredSolutions(self, symbol: sympy.Symbol):
+        """Like `_popInferredSolutions()`, but doesn't bother working out lazy solutions that are just being thrown away"""
+
+        self._symbolValuesDatabase.discard(symbol)
+        self._inferenceTable.pop(symbol)
+
+    def _popDependentSolutions(self, symbols: Iterable[sympy.Symbol]):
+        """
+        Pops the solutions of the given symbols, along with every symbol that
+        (directly or indirectly) depends on them, and returns all the symbols
+        that were popped
+        """
+
+        poppedSymbols: set[sympy.Symbol] = set()
+        symbolsToPop = list(symbols)
+        while len(symbolsToPop) > 0:
+            symbol = symbolsToPop.pop()
+            if symbol in poppedSymbols:
+                continue
+
+            symbolsToPop.extend(self._symbolValuesDatabase.getDependentSymbols(symbol))
+            self._forgetInferredSolutions(symbol)
+            poppedSymbols.add(symbol)
+        return poppedSymbols
+
+    def _getContradictedSymbolValues(self) -> dict[sympy.Symbol, set[sympy.Expr] | None]:
+        """Gives the values of the "bad symbols" (working out any that were inferred lazily)"""
+
+        return {
+            symbol: values if type(values) is not LazyValues else {
+                solution.value
+                for solution in values.resolve()
+            }
+            for (symbol, values) in self._contradictedSymbolValues.items()
+        }
+
+    def _getPotentiallyContradictedSymbolValues(self, relation: Relation):
+        # if there is a contradiction, it would be with these
+        return {
+            symbol: {
+                conditional.value
+                for conditional in self._symbolValuesDatabase[symbol]
+            }
+            for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False)
+            if symbol in self._symbolValuesDatabase
+        }
+
+    def _validateNewRelation(self, relation: Relation):
+        """
+        Checks a relation that is about to be recorded for redundancies and
+        contradictions (raising if it is contradictory), and returns whether it
+        is redundant. This also handles the "restricted redefinition" case,
+        which is the one case where a relation is allowed to change values that
+        were already known.
+        """
+
+        (isRedundant, isRedundantWithContradictions) = self._checkForRedundancies(relation)
+        if isRedundantWithContradictions:
+            # test for restricted redefinition case, which is when a
+            # relation is restricting what some variable's values are
+            # example: if `a` is already known, {-4, 2, 5}, and a new
+            # relation `a = 2` comes in, this is "redundant" (aka no new
+            # information about other variables) but also contradictory
+            # (because -4 ≠ 2 and 5 ≠ 2)
+            nonExprSymbols = tuple(symbol for symbol in freeSymbolsOf(relation.asExprEqToZero, includeExpressionLists = False))
+            wasActuallyRestrictRedefCase = False
+            couldBeRestrictRedefCase = len(nonExprSymbols) == 1
+            if couldBeRestrictRedefCase:
+                symbol = first(nonExprSymbols)
+
+                isRestrictionOfExpressionList = self._dependsOnExpressionListSymbols(symbol)
+                if isRestrictionOfExpressionList:
+                    raise ContradictionException(self._getContradictedSymbolValues(), relation)
+
+                (oldSolutions, oldRelation) = self._popInferredSolutions(symbol)
+
+                try:
+                    (newSymbol, newSolutions, newRelation) = self._solveForRestrictRedefCase(symbol, relation)
+                except ContradictionException:
+                    # shouldn't be possible... but just in case!
+                    raise RuntimeError("A contradiction was realized during restriction calculation (no new relations added...?)")
+                assert symbol == newSymbol, "Restriction solutions don't match found symbol" # this shouldn't be possible (to fail) either!
+                assert relation == newRelation, "Restriction solution relations don't match" # this ALSO shouldn't be possible (to fail)!
+                if symbol is not None:
+                    oldSolutionValues = tuple(solution.value for solution in oldSolutions)
+                    newValuesAreActuallyRestrictions = len(newSolutions) < len(oldSolutions) and \
+                        all(solution.value in oldSolutionValues for solution in newSolutions)
+                    if newValuesAreActuallyRestrictions:
+                        newSolutionValues = {condition.value for condition in newSolutions}
+                        newSolutionsWithCorrectConditions = {
+                            condition
+                            for condition in oldSolutions
+                            if condition.value in newSolutionValues
+                        }
+                        self._setInferredSolutions(symbol, newSolutionsWithCorrectConditions, relation)
+                        isRedundant = False # since it technically did provide new information...
+                        wasActuallyRestrictRedefCase = True
+                        
+                        # TODO: (optimization) remove other symbol values that relied on any conditions now not present
+                        #       (since other symbols might have conditions that will never be true when substituted,
+                        #       due to the values that were just removed)
+            
+            if not wasActuallyRestrictRedefCase:
+                raise ContradictionException(self._getContradictedSymbolValues(), relation)
+
+        return isRedundant
+
     def _checkForRedundancies(self, relation: Relation):
         isRedundantWithContradictions = False
-        for conditionalSubbedRelationExpr in CombinationsSubstituter({relation.asExprEqToZero}, self._symbolValuesDatabase).substitute():
+        for conditionalSubbedRelationExpr in CombinationsSubstituter({relation.asExprEqToZero}, self._symbolValuesDatabase, cancellationToken = self._cancellationToken).substitute():
             subbedRelationExpr = conditionalSubbedRelationExpr.value
-            if subbedRelationExpr != 0:
+            if not self._isZero(subbedRelationExpr):
                 if len(freeSymbolsOf(subbedRelationExpr)) == 0:
                     isRedundantWithContradictions = True
                 else:
@@ -300,16 +764,15 @@ class AlgebraSolver:
         
         if symbol not in symbolsChecked:
             symbolsChecked.add(symbol)
-            for conditionalValue in self._symbolValuesDatabase[symbol]:
-                for conditionalSymbol in conditionalValue.conditions:
-                    if isExpressionListSymbol(conditionalSymbol) or self._dependsOnExpressionListSymbols(conditionalSymbol, symbolsChecked):
-                        return True
+            for conditionalSymbol in self._symbolValuesDatabase.getConditionSymbols(symbol):
+                if isExpressionListSymbol(conditionalSymbol) or self._dependsOnExpressionListSymbols(conditionalSymbol, symbolsChecked):
+                    return True
         return False
     
     def _solveForRestrictRedefCase(self, symbol: sympy.Symbol, relation: Relation):
         return first(self._forwardSolveSymbols([(symbol, relation)], isRestrictRedefSolve = True))
 
-    def _inferSymbolValuesFromRelations(self):
+    def _inferSymbolValuesFromRelations(self, components: Iterable[RelationComponent]):
         """
         This is the main "brain" function of the solver. There are four logical
         stages to how symbol values are inferred:
@@ -324,21 +787,99 @@ class AlgebraSolver:
 
         Each step is described in more detail in the documentation of its
         associated function.
+
+        All of this is only done for the given relation `components` (the ones
+        that changed), since inferences can never cross from one component to
+        another. Components that are already exhausted (nothing left to infer)
+        are skipped.
         """
         
-        symbolsToSolve = None
-        firstLoop = True
-        while symbolsToSolve is not None or firstLoop:
-            if not firstLoop and symbolsToSolve is not None:
-                symbolsToBackSubstitute = reversed(tuple(self._forwardSolveSymbols(symbolsToSolve)))
-                self._backSubstituteSymbols(symbolsToBackSubstitute)
-                self._checkForContradictions()
-            symbolsToSolve = InferenceOrderSolver(self._recordedRelationsSorted, self._symbolValuesDatabase).findSolveOrder()
-            firstLoop = False
+        with tracer.span("inferSymbolValues") as inferSpan:
+            numFamilies = 0
+            numSymbolsSolved = 0
+            # (families from different components never share symbols, so the
+            # families of every component can be solved at the same time, one
+            # group at a time)
+            pendingComponents = [
+                component
+                for component in components
+                if not component.isExhausted
+            ]
+            while len(pendingComponents) > 0:
+                familyGroups: list[list[list[tuple[sympy.Symbol, Relation]]]] = list()
+                componentsWithFamilies: list[RelationComponent] = list()
+                for component in pendingComponents:
+                    self._cancellationToken.checkpoint()
+                    componentRelations = self._relationComponents.sortedRelationsOf(component)
+                    with tracer.span("findSolveOrder", relations = len(componentRelations)) as span:
+                        componentFamilyGroups = self._orderSolverType(
+                            componentRelations,
+                            self._symbolValuesDatabase,
+                            symbolsOf = self._relationComponents.symbolsOf
+                        ).findSolveOrders()
+                        # (only counted for the trace)
+                        if tracer.isEnabled:
+                            span.set(
+                                families = sum(len(familyGroup) for familyGroup in componentFamilyGroups),
+                                symbols = sum(len(symbolsToSolve) for familyGroup in componentFamilyGroups for symbolsToSolve in familyGroup),
+                            )
+                    if len(componentFamilyGroups) == 0:
+                        self._relationComponents.markExhausted(component)
+                    else:
+                        componentsWithFamilies.append(component)
+                        for (groupIdx, familyGroup) in enumerate(componentFamilyGroups):
+                            if groupIdx == len(familyGroups):
+                                familyGroups.append(list())
+                            familyGroups[groupIdx].extend(familyGroup)
+
+                for families in familyGroups:
+                    self._solveInferenceFamilies(families)
+                    if tracer.isEnabled:
+                        numFamilies += len(families)
+                        numSymbolsSolved += sum(len(symbolsToSolve) for symbolsToSolve in families)
+                # (solving can make more families solid, which are looked for
+                # in the next round)
+                pendingComponents = componentsWithFamilies
+            inferSpan.set(families = numFamilies, symbolsSolved = numSymbolsSolved)
         
         self._contradictedSymbolValues = dict()
 
-    def _forwardSolveSymbols(self, symbolsToSolve: Iterable[tuple[sympy.Symbol, Relation]], database: SymbolsDatabase | None = None, *, isRestrictRedefSolve: bool = False) -> Generator[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation], Any, None]:
+    def _solveInferenceFamilies(self, families: list[list[tuple[sympy.Symbol, Relation]]]):
+        """
+        Solves a group of independent inference families (families that don't
+        share any unknown symbols), first trying exact linear elimination, then
+        worker processes, and then forward-solving and back-substituting here.
+        """
+
+        with tracer.span("solveLinearFamilies", families = len(families)) as span:
+            linearSolutionsOfFamilies = [
+                LinearFamilySolver(symbolsToSolve, self._symbolValuesDatabase).solve()
+                for symbolsToSolve in families
+            ]
+            if tracer.isEnabled:
+                span.set(familiesSolved = sum(linearSolutions is not None for linearSolutions in linearSolutionsOfFamilies))
+        workerSolutionsOfFamilies = self._solveFamiliesInWorkers([
+            symbolsToSolve
+            for (symbolsToSolve, linearSolutions) in zip(families, linearSolutionsOfFamilies)
+            if linearSolutions is None
+        ])
+        for (symbolsToSolve, linearSolutions) in zip(families, linearSolutionsOfFamilies):
+            self._cancellationToken.checkpoint()
+            if linearSolutions is not None:
+                self._setFamilySolutions(linearSolutions)
+            else:
+                workerSolutions = next(workerSolutionsOfFamilies)
+                if workerSolutions is not None:
+                    self._setFamilySolutions(workerSolutions)
+                else:
+                    symbolsToBackSubstitute = reversed(self._forwardSolveSymbols(symbolsToSolve))
+                    self._backSubstituteSymbols(symbolsToBackSubstitute)
+            # (only relations with symbols that were just solved can have
+            # been contradicted)
+            solvedSymbols = [symbol for (symbol, relation) in symbolsToSolve]
+            self._checkForContradictions(self._relationComponents.sortedRelationsWithSymbols(solvedSymbols))
+
+    def _forwardSolveSymbols(self, symbolsToSolve: Iterable[tuple[sympy.Symbol, Relation]], *, isRestrictRedefSolve: bool = False) -> list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]]:
         """
         Forward-solving symbols is the process of repeatedly solving a relation
         for a given symbol and substituting that symbol in all future relations.
@@ -372,22 +913,37 @@ class AlgebraSolver:
         And we're done! After going through that, the function returns all of
         the symbols, their symbolic (or numeric) values, and their paired
         relations.
+
+        (The symbolic values are temporarily written into the database so
+        later relations can substitute them; they are journaled in their own
+        transaction, which is always rolled back before returning.)
         """
         
-        if database is None:
-            database = self._symbolValuesDatabase.copy()
-        
-        for (symbol, relation) in symbolsToSolve:
-            restrictRedefSymbol = None if not isRestrictRedefSolve \
-                else symbol
-            relationsWithKnownsAndInferredSubbed = CombinationsSubstituter({relation.asExprEqToZero}, database, restrictRedefSymbol = restrictRedefSymbol).substitute()
-            flattenedConditionalSolutions = {
-                ConditionalValue(solution, conditionalSolutions.conditions)
-                for conditionalSolutions in self._solveRelationForSymbol(relationsWithKnownsAndInferredSubbed, relation, symbol)
-                for solution in conditionalSolutions.value
-            }
-            database[symbol] = flattenedConditionalSolutions
-            yield (symbol, flattenedConditionalSolutions, relation)
+        database = self._symbolValuesDatabase
+        forwardSolved: list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]] = list()
+        with tracer.span("forwardSolveSymbols") as span:
+            self._undoLog.begin()
+            try:
+                for (symbol, relation) in symbolsToSolve:
+                    self._cancellationToken.checkpoint()
+                    restrictRedefSymbol = None if not isRestrictRedefSolve \
+                        else symbol
+                    relationsWithKnownsAndInferredSubbed = CombinationsSubstituter({relation.asExprEqToZero}, database, restrictRedefSymbol = restrictRedefSymbol, cancellationToken = self._cancellationToken).substitute()
+                    flattenedConditionalSolutions = {
+                        ConditionalValue(solution, conditionalSolutions.conditions)
+                        for conditionalSolutions in self._solveRelationForSymbol(relationsWithKnownsAndInferredSubbed, relation, symbol)
+                        for solution in conditionalSolutions.value
+                    }
+                    database[symbol] = flattenedConditionalSolutions
+                    forwardSolved.append((symbol, flattenedConditionalSolutions, relation))
+            finally:
+                self._undoLog.rollback()
+                if tracer.isEnabled:
+                    span.set(
+                        symbols = len(forwardSolved),
+                        solutions = sum(len(solutions) for (symbol, solutions, relation) in forwardSolved),
+                    )
+        return forwardSolved
 
     def _backSubstituteSymbols(self, symbolsToBackSubstitute: Iterable[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]]):
         """
@@ -422,67 +978,262 @@ class AlgebraSolver:
         you don't accidentally swap variables between the two scenarios!).
         """
         
-        for (symbol, unsolvedConditionalSolutions, relationKnownFrom) in symbolsToBackSubstitute:
-            conditionalSolutionsWithKnownSymbols = {
-                ConditionalValue(
-                    conditional.value,
-                    {
-                        symbol: condition
-                        for (symbol, condition) in conditional.conditions.items()
-                        if symbol in self._symbolValuesDatabase
-                    }
-                )
-                for conditional in unsolvedConditionalSolutions
-            }
-            subbedSolutions = {
-                ConditionalValue(
-                    subbedConditionalSolution.value,
-                    self._unionConditions(
-                        subbedConditionalSolution.conditions,
-                        conditionalSolution.conditions
+        with tracer.span("backSubstituteSymbols") as span:
+            numSymbols = 0
+            numLazySymbols = 0
+            numSolutions = 0
+            for (symbol, unsolvedConditionalSolutions, relationKnownFrom) in symbolsToBackSubstitute:
+                self._cancellationToken.checkpoint()
+                numSymbols += 1
+                conditionalSolutionsWithKnownSymbols = {
+                    ConditionalValue(
+                        conditional.value,
+                        {
+                            symbol: condition
+                            for (symbol, condition) in conditional.conditions.items()
+                            if symbol in self._symbolValuesDatabase
+                        }
                     )
-                )
-                for (unsubbedSolutionExpr, subbedConditionalSolutions) in CombinationsSubstituter(
-                    {conditionalSolution.value for conditionalSolution in unsolvedConditionalSolutions},
-                    self._symbolValuesDatabase
-                ).substituteForMapping().items()
-                for subbedConditionalSolution in subbedConditionalSolutions
-                for conditionalSolution in conditionalSolutionsWithKnownSymbols
-                if conditionalSolution.value == unsubbedSolutionExpr
-            }
-            self._setInferredSolutions(symbol, subbedSolutions, relationKnownFrom)
+                    for conditional in unsolvedConditionalSolutions
+                }
+                lazySolutions = self._backSubstituteLazily(unsolvedConditionalSolutions, conditionalSolutionsWithKnownSymbols)
+                if lazySolutions is not None:
+                    self._setInferredSolutions(symbol, lazySolutions, relationKnownFrom)
+                    # (the values are only worked out if there ever is a contradiction)
+                    self._contradictedSymbolValues[symbol] = lazySolutions
+                    numLazySymbols += 1
+                    continue
+
+                subbedSolutions = self._substituteBackSolutions(unsolvedConditionalSolutions, conditionalSolutionsWithKnownSymbols, self._symbolValuesDatabase)
+                self._setInferredSolutions(symbol, subbedSolutions, relationKnownFrom)
+                numSolutions += len(subbedSolutions)
             
-            inferredValues = {
-                subbedConditionalSolution.value
-                for subbedConditionalSolution in subbedSolutions
+                inferredValues = {
+                    subbedConditionalSolution.value
+                    for subbedConditionalSolution in subbedSolutions
+                }
+                # just in case there ever is a contradiction...
+                # (otherwise the user will never be able to see what the value
+                # was, since it'll be "forgotten")
+                self._contradictedSymbolValues[symbol] = inferredValues
+            # (lazily substituted symbols' solutions aren't known yet)
+            span.set(symbols = numSymbols, lazySymbols = numLazySymbols, solutions = numSolutions)
+
+    def _backSubstituteLazily(self, unsolvedConditionalSolutions: set[ConditionalValue[sympy.Expr]], conditionalSolutionsWithKnownSymbols: set[ConditionalValue[sympy.Expr]]):
+        """
+        Most symbols in a big system are never looked at again after they are
+        inferred, so back substitution doesn't actually need to happen until a
+        symbol's values are read. This gives `LazyValues` that back substitute
+        the first time they are read, using a scratch database with exactly
+        the values that would have been used right now (so the results are
+        always the same as substituting right away).
+
+        This gives `None` if the solutions have symbols that aren't known, in
+        which case they should be substituted right away (which will fail).
+        """
+
+        database = self._symbolValuesDatabase
+        substitutedSymbols = {
+            substitutedSymbol
+            for conditionalSolution in unsolvedConditionalSolutions
+            for substitutedSymbol in freeSymbolsOf(conditionalSolution.value)
+        }
+        if not all(substitutedSymbol in database for substitutedSymbol in substitutedSymbols):
+            return None
+
+        # (the substituter gives conditions for every symbol it substitutes)
+        conditionSymbols = substitutedSymbols | {
+            conditionSymbol
+            for conditionalSolution in conditionalSolutionsWithKnownSymbols
+            for conditionSymbol in conditionalSolution.conditions
+        }
+        neededSymbols: set[sympy.Symbol] = set()
+        symbolsToCheck = list(conditionSymbols)
+        while len(symbolsToCheck) > 0:
+            neededSymbol = symbolsToCheck.pop()
+            if neededSymbol in neededSymbols:
+                continue
+            neededSymbols.add(neededSymbol)
+            symbolsToCheck.extend(database.getConditionSymbols(neededSymbol))
+        scratchDatabase = database.subset(neededSymbols)
+        return LazyValues(
+            lambda: self._substituteBackSolutions(unsolvedConditionalSolutions, conditionalSolutionsWithKnownSymbols, scratchDatabase),
+            conditionSymbols
+        )
+
+    def _substituteBackSolutions(self, unsolvedConditionalSolutions: set[ConditionalValue[sympy.Expr]], conditionalSolutionsWithKnownSymbols: set[ConditionalValue[sympy.Expr]], database: SymbolsDatabase):
+        subbedSolutions = {
+            ConditionalValue(
+                subbedConditionalSolution.value,
+                self._unionConditions(
+                    subbedConditionalSolution.conditions,
+                    conditionalSolution.conditions
+                )
+            )
+            for (unsubbedSolutionExpr, subbedConditionalSolutions) in CombinationsSubstituter(
+                {conditionalSolution.value for conditionalSolution in unsolvedConditionalSolutions},
+                database,
+                cancellationToken = self._cancellationToken,
+            ).substituteForMapping().items()
+            for subbedConditionalSolution in subbedConditionalSolutions
+            for conditionalSolution in conditionalSolutionsWithKnownSymbols
+            if conditionalSolution.value == unsubbedSolutionExpr
+        }
+        assert all(isNonSymbolicValue(solution.value) for solution in subbedSolutions), "Solver tried to set a variable's inferred values to an unsolved expression"
+        return subbedSolutions
+
+    def _solveFamiliesInWorkers(self, families: list[list[tuple[sympy.Symbol, Relation]]]):
+        """
+        Forward solves and back substitutes independent inference families in
+        the solver's worker processes, giving an iterator of each family's
+        solutions (in the same format as `LinearFamilySolver.solve()`). Every
+        result is `None` if the families weren't given to workers (because
+        there's no pool, or too few families), in which case they should be
+        solved here instead. A family that fails in a worker raises its error
+        here straight away; it isn't solved again here, since that would only
+        fail the same way (after taking just as long, if it ran out of time).
+        """
+
+        if self._familySolverPool is None:
+            return iter([None] * len(families))
+
+        jobs = [
+            (
+                symbolsToSolve,
+                self._knownValuesNeededFor(symbolsToSolve),
+                [
+                    relation
+                    for (symbol, relation) in symbolsToSolve
+                    if relation in self._numericRelationCounts
+                ],
+                self._numericPrecision,
+                self._timeLimitedPool.timeLimit if self._timeLimitedPool is not None else None,
+            )
+            for symbolsToSolve in families
+        ]
+        with tracer.span("solveFamiliesInWorkers", families = len(families)):
+            return iter(self._familySolverPool.runAll(_solveFamilyInWorker, jobs))
+
+    def _knownValuesNeededFor(self, symbolsToSolve: list[tuple[sympy.Symbol, Relation]]):
+        """
+        Gives the values of the known symbols an inference family needs to be
+        solved, along with the symbols those values are conditioned on (all in
+        resolution order, so a database built from them orders them the same)
+        """
+
+        familySymbols = {symbol for (symbol, relation) in symbolsToSolve}
+        symbolsToCheck = [
+            symbol
+            for (familySymbol, relation) in symbolsToSolve
+            for symbol in self._relationComponents.symbolsOf(relation)
+            if symbol not in familySymbols
+        ]
+        neededSymbols: set[sympy.Symbol] = set()
+        while len(symbolsToCheck) > 0:
+            symbol = symbolsToCheck.pop()
+            if symbol in neededSymbols or symbol not in self._symbolValuesDatabase:
+                continue
+            neededSymbols.add(symbol)
+            symbolsToCheck.extend(self._symbolValuesDatabase.getConditionSymbols(symbol))
+        return [
+            (symbol, self._symbolValuesDatabase[symbol])
+            for symbol in self._symbolValuesDatabase
+            if symbol in neededSymbols
+        ]
+
+    def _setFamilySolutions(self, solvedSymbols: list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]], Relation]]):
+        """
+        Records the solutions of an inference family that was solved all at
+        once, either by a `LinearFamilySolver` (which takes the place of forward
+        solving *and* back substitution) or by a worker process
+        """
+
+        # (later symbols are set first, since earlier symbols' values are
+        # conditioned on them, just like in back substitution)
+        for (symbol, solutions, relationKnownFrom) in reversed(solvedSymbols):
+            self._setInferredSolutions(symbol, solutions, relationKnownFrom)
+            self._contradictedSymbolValues[symbol] = {
+                solution.value
+                for solution in solutions
             }
-            # just in case there ever is a contradiction...
-            # (otherwise the user will never be able to see what the value
-            # was, since it'll be "forgotten")
-            self._contradictedSymbolValues[symbol] = inferredValues
 
-    def _checkForContradictions(self):
+    def _checkForContradictions(self, sortedRelations: Iterable[Relation]):
         # sorted is theoretically faster to detect since it'll check single-variable
         # relations first (which are the most common kinds of contradictions)
-        for relation in self._recordedRelationsSorted:
-            if relation in self._inferenceTable:
-                # can't have contradictions if it's part of where the solution came from...
-                continue
+        with tracer.span("checkForContradictions") as span:
+            numRelationsScanned = 0
+            numRelationsSubstituted = 0
+            try:
+                for relation in sortedRelations:
+                    self._cancellationToken.checkpoint()
+                    numRelationsScanned += 1
+                    if relation in self._inferenceTable:
+                        # can't have contradictions if it's part of where the solution came from...
+                        continue
+                    relationSymbols = self._relationComponents.symbolsOf(relation)
+                    if len(relationSymbols) > 0 and not any(symbol in self._symbolValuesDatabase for symbol in relationSymbols):
+                        # nothing to substitute, so nothing could have been contradicted
+                        continue
 
-            relationsWithKnownsSubbed = CombinationsSubstituter({relation.asExprEqToZero}, self._symbolValuesDatabase).substitute()
-            if not all(
-                relationExprCondition.value == 0
-                for relationExprCondition in relationsWithKnownsSubbed
-                if len(relationExprCondition.value.free_symbols) == 0
-            ):
-                raise ContradictionException(self._contradictedSymbolValues, relation)
+                    numRelationsSubstituted += 1
+                    relationsWithKnownsSubbed = CombinationsSubstituter({relation.asExprEqToZero}, self._symbolValuesDatabase, cancellationToken = self._cancellationToken).substitute()
+                    if not all(
+                        self._isZero(relationExprCondition.value)
+                        for relationExprCondition in relationsWithKnownsSubbed
+                        if len(relationExprCondition.value.free_symbols) == 0
+                    ):
+                        raise ContradictionException(self._getContradictedSymbolValues(), relation)
+            finally:
+                span.set(relations = numRelationsScanned, relationsSubstituted = numRelationsSubstituted)
             
+    def _sweepExpressionStore(self):
+        """
+        Evicts every expression the solver doesn't keep anymore from its
+        `ExpressionStore`, once the outermost transaction is over. (Only every
+        so often, since it means going over everything the solver knows,
+        unless relations were just popped.)
+        """
+
+        if self._undoLog.depth > 0:
+            return
+        if not self._needsFullSweep and not self._expressionStore.needsSweep:
+            return
+        self._needsFullSweep = False
+        self._expressionStore.retainOnly((
+            *(relation.asExprEqToZero for relation in self._recordedRelations),
+            *self._symbolValuesDatabase.expressions(),
+        ))
+
+    def _isZero(self, expression: sympy.Expr):
+        # (zero is a singleton, so the identity check catches almost every case)
+        if expression is sympy.S.Zero or expression == 0:
+            return True
+        # (numeric values are only accurate to so many digits, so substituting
+        # them almost never gives exactly zero)
+        if len(expression.free_symbols) == 0 and expression.has(sympy.Float):
+            tolerance = sympy.Float(10) ** -(self._numericPrecision // 2)
+            return bool(abs(sympy.N(expression, self._numericPrecision)) <= tolerance)
+        return False
+
     def _solveRelationForSymbol(self, relationsWithKnownsSubbed: Iterable[ConditionalValue[sympy.Expr]], fromRelation: Relation, unknownSymbol: sympy.Symbol):
-        """This function just serves as a simple wrapper around `sympy.solveSet()`"""
+        """
+        This function just serves as a simple wrapper around `sympy.solveSet()`
+        (through the solver's cache, so nothing is solved twice), falling back
+        to numeric solutions for relations allowed to be solved numerically
+        """
         
+        canSolveNumerically = fromRelation in self._numericRelationCounts
         for relationExprCondition in relationsWithKnownsSubbed:
             relationExpr = relationExprCondition.value
-            solution = solveSet(relationExpr, unknownSymbol)
+            try:
+                solution = self._solveSetCache.solve(relationExpr, unknownSymbol)
+            except TimeLimitExceeded as exception:
+                raise SolveTimeLimitException(unknownSymbol, exception.timeLimit, self._getContradictedSymbolValues(), fromRelation)
+            isExactSolution = type(solution) is sympy.FiniteSet or solution is sympy.EmptySet
+            if canSolveNumerically and not isExactSolution:
+                numericSolution = NumericRootFinder(relationExpr, unknownSymbol, self._numericPrecision).findRoots()
+                if numericSolution is not None:
+                    solution = numericSolution
             solutionSet = self._interpretSympySolution(unknownSymbol, solution, fromRelation)
             yield ConditionalValue(solutionSet, relationExprCondition.conditions)
 
@@ -500,7 +1251,7 @@ class AlgebraSolver:
         # example:
         #   a/(b - 1) = 5; b = 1; a = {}
         elif solution is sympy.EmptySet:
-            raise NoSolutionException([symbol], self._contradictedSymbolValues, fromRelation)
+            raise NoSolutionException([symbol], self._getContradictedSymbolValues(), fromRelation)
         
         else:
             raise NotImplementedError(f"Solver reached unconsidered set: {type(solution).__name__}")
@@ -511,3 +1262,36 @@ class AlgebraSolver:
             assert symbol not in newConditions or newConditions[symbol] == condition
             newConditions[symbol] = condition
         return newConditions
+
+
+# (each worker process keeps one time limited pool for every family it solves,
+# so its own workers are only started and warmed up once)
+_workerTimeLimitedPool: TimeLimitedPool | None = None
+
+
+def _solveFamilyInWorker(symbolsToSolve: list[tuple[sympy.Symbol, Relation]], knownValues: list[tuple[sympy.Symbol, set[ConditionalValue[sympy.Expr]]]], numericRelations: list[Relation], numericPrecision: int, timeLimit: float | None):
+    """
+    Solves one inference family in a worker process, using a scratch solver
+    that only knows the values the family needs (see
+    `AlgebraSolver._solveFamiliesInWorkers()`). The scratch solver has the
+    same time limit as the solver that asked. Errors (like a family running
+    past that limit) are raised back in the solver that asked.
+    """
+
+    global _workerTimeLimitedPool
+    timeLimitedPool = None
+    if timeLimit is not None:
+        if _workerTimeLimitedPool is None:
+            _workerTimeLimitedPool = TimeLimitedPool(timeLimit)
+        _workerTimeLimitedPool.timeLimit = timeLimit
+        timeLimitedPool = _workerTimeLimitedPool
+    solver = AlgebraSolver(numericPrecision = numericPrecision, timeLimitedPool = timeLimitedPool)
+    for (symbol, values) in knownValues:
+        solver._symbolValuesDatabase[symbol] = values
+    solver._markNumericRelations(numericRelations)
+    forwardSolved = solver._forwardSolveSymbols(symbolsToSolve)
+    solver._backSubstituteSymbols(reversed(forwardSolved))
+    return [
+        (symbol, solver._symbolValuesDatabase[symbol], relation)
+        for (symbol, unsolvedValues, relation) in forwardSolved
+    ]
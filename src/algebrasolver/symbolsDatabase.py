@@ -1,11 +1,128 @@
-from typing import TypeVar
+from typing import Callable, Iterable, TypeVar
 
 import sympy
 
 from src.parsing.lexer import CommandLexer
 from src.parsing.parser import CommandParser, isExpressionListSymbol
+from src.common.expressionStore import ExpressionStore
+from src.algebrasolver.undoLog import UndoLog
 from src.algebrasolver.types import *
 
+class LazyValues:
+    """
+    A set of values for a symbol that isn't worked out until it is actually
+    needed. Only the symbols the values will be conditioned on need to be known
+    ahead of time (since the database keeps track of dependencies and
+    resolution order with them). The first time the values are read, they are
+    found with the given function, which is never called again after that.
+    """
+
+    def __init__(self, resolveFn: Callable[[], set[ConditionalValue[sympy.Expr]]], conditionSymbols: set[sympy.Symbol]):
+        self.conditionSymbols = conditionSymbols
+        self._resolveFn: Callable[[], set[ConditionalValue[sympy.Expr]]] | None = resolveFn
+        self._values: set[ConditionalValue[sympy.Expr]] | None = None
+
+    def __repr__(self):
+        if self.isResolved:
+            return f"LazyValues({self._values})"
+        return "LazyValues(<unresolved>)"
+
+    @property
+    def isResolved(self):
+        return self._resolveFn is None
+
+    def resolve(self):
+        if self._resolveFn is not None:
+            self._values = self._resolveFn()
+            # (the function can hold on to a lot, so it is let go of as soon
+            # as possible)
+            self._resolveFn = None
+        assert self._values is not None
+        return self._values
+
+
+class _ResolutionOrder:
+    """
+    The order symbols are resolved in, kept sorted by their rank (and then by
+    when they were put in). Symbols of each rank are kept in their own "bucket"
+    (an insertion-ordered dictionary), and buckets are kept in a list indexed by
+    rank. Ranks are small numbers (never more than the length of the longest
+    chain of symbols depending on each other), so putting a symbol in or
+    taking it out only ever touches its own bucket, and (at most) grows or
+    shrinks the end of the list; both are O(1). Iterating is O(n + r) for n symbols and a
+    highest rank of r, since the empty buckets left by taken out symbols are
+    skipped. Every symbol is given an insertion number, which is how it is put
+    back in the exact same spot when a change is undone.
+    """
+
+    def __init__(self):
+        self._keyOfSymbol: dict[sympy.Symbol, tuple[int, int]] = dict()
+        # (rank --> symbol --> insertion number)
+        self._buckets: list[dict[sympy.Symbol, int]] = list()
+        self._numInsertions = 0
+
+    def __iter__(self):
+        for bucket in self._buckets:
+            yield from bucket
+
+    def __len__(self):
+        return len(self._keyOfSymbol)
+
+    def rankOf(self, symbol: sympy.Symbol, default: int | None = None):
+        key = self._keyOfSymbol.get(symbol)
+        return key[0] if key is not None else default
+
+    def keyOf(self, symbol: sympy.Symbol):
+        return self._keyOfSymbol.get(symbol)
+
+    def insert(self, symbol: sympy.Symbol, rank: int, insertionNum: int | None = None):
+        assert symbol not in self._keyOfSymbol, "Symbol was already in the resolution order"
+        assert rank >= 0, "Ranks are never negative"
+        if insertionNum is None:
+            insertionNum = self._numInsertions
+            self._numInsertions += 1
+        while len(self._buckets) <= rank:
+            self._buckets.append(dict())
+        bucket = self._buckets[rank]
+        isInOrder = len(bucket) == 0 or next(reversed(bucket.values())) < insertionNum
+        bucket[symbol] = insertionNum
+        if not isInOrder:
+            # (only happens when a change is undone, so sorting is rare)
+            self._buckets[rank] = dict(sorted(bucket.items(), key = lambda symbolAndNum: symbolAndNum[1]))
+        key = (rank, insertionNum)
+        self._keyOfSymbol[symbol] = key
+        return key
+
+    def remove(self, symbol: sympy.Symbol):
+        key = self._keyOfSymbol.pop(symbol)
+        (rank, insertionNum) = key
+        del self._buckets[rank][symbol]
+        # (empty buckets in the middle are kept, since their ranks are likely
+        # to be used again)
+        while len(self._buckets) > 0 and len(self._buckets[-1]) == 0:
+            self._buckets.pop()
+        return key
+
+    def copy(self):
+        return self.subset(self._keyOfSymbol)
+
+    def subset(self, keys: set[sympy.Symbol] | dict[sympy.Symbol, object]):
+        newOrder = _ResolutionOrder()
+        for (rank, bucket) in enumerate(self._buckets):
+            newBucket = {
+                symbol: insertionNum
+                for (symbol, insertionNum) in bucket.items()
+                if symbol in keys
+            }
+            newOrder._buckets.append(newBucket)
+            for (symbol, insertionNum) in newBucket.items():
+                newOrder._keyOfSymbol[symbol] = (rank, insertionNum)
+        while len(newOrder._buckets) > 0 and len(newOrder._buckets[-1]) == 0:
+            newOrder._buckets.pop()
+        newOrder._numInsertions = self._numInsertions
+        return newOrder
+
+
 class SymbolsDatabase:
     """
     A database for known symbols. Logically this is a union between two dictionaries:
@@ -13,18 +130,45 @@ class SymbolsDatabase:
     2. An infinite dictionary mapping "expression list symbols" to a list of actual expressions
 
     (Where an "expression list symbol" is a symbol that looks like `Symbol("{1,2,3}")`.)
+
+    If an `UndoLog` is given, every change made to the database is journaled in
+    it, so the change can be reversed if the log's transaction is rolled back.
+
+    Values can also be set lazily (see `LazyValues`). Lazy values are only
+    worked out the first time they are read, but otherwise behave exactly like
+    any other values.
+
+    If an `ExpressionStore` is given, every value (and condition value) set is
+    interned in it, so equal values all over the database are the same object
+    (see `ExpressionStore`). Copies and subsets of the database share its store.
+
+    Iterating over the database gives its symbols in "resolution order", where
+    every symbol comes after the symbols its values are conditioned on. This is
+    done by giving each symbol a rank, one more than the highest rank of its
+    condition symbols (so `a = 2` is rank 1, `b = a/2` is rank 2, `c = a + b`
+    is rank 3, and so on). Ranks are remembered, so setting a symbol only
+    needs the ranks of its own condition symbols; only if its rank changes are
+    the symbols depending on it ranked again.
     """
 
     _DefaultType = TypeVar("_DefaultType")
+    _missing = object()
 
-    def __init__(self):
+    def __init__(self, undoLog: UndoLog | None = None, expressionStore: ExpressionStore | None = None):
         # a mapping of a variable to its potential values and conditions
         # (like b = 4 when a = 2 and b = 5 when a = -1)
-        self._symbolValues: dict[sympy.Symbol, set[ConditionalValue[sympy.Expr]]] = dict()
+        self._symbolValues: dict[sympy.Symbol, set[ConditionalValue[sympy.Expr]] | LazyValues] = dict()
         # a mapping of symbols to conditional values for "expression list symbols"
         self._exprListSymbolValues: dict[sympy.Symbol, set[ConditionalValue[sympy.Expr]]] = dict()
         # the order in which symbols are iterated over (for substitution)
-        self._symbolResolutionOrder: list[tuple[int, sympy.Symbol]] = list()
+        self._resolutionOrder = _ResolutionOrder()
+        # a reverse index of the symbols whose conditions mention a given symbol
+        # (like {a: {b}} when b = 4 when a = 2)
+        self._dependentSymbols: dict[sympy.Symbol, set[sympy.Symbol]] = dict()
+        # journal to record changes in (for transactions)
+        self._undoLog = undoLog
+        # where values are interned (if anywhere)
+        self.expressionStore = expressionStore
 
     def __getitem__(self, key: sympy.Symbol):
         if isExpressionListSymbol(key):
@@ -32,31 +176,45 @@ class SymbolsDatabase:
                 self._exprListSymbolValues[key] = self._parseExprListSymbol(key)
                 # resolution order doesn't include expression list symbols;
                 # the generator knows how to handle this
-                # self._insertSymbolToResolutionOrder(key)
             return self._exprListSymbolValues[key]
         else:
-            return self._symbolValues[key]
+            value = self._symbolValues[key]
+            if type(value) is LazyValues:
+                return value.resolve()
+            return value
     
-    def __setitem__(self, key: sympy.Symbol, value: set[ConditionalValue[sympy.Expr]]):
+    def __setitem__(self, key: sympy.Symbol, value: set[ConditionalValue[sympy.Expr]] | LazyValues):
         if isExpressionListSymbol(key):
             raise ValueError("Cannot set values for expression list symbols")
-        if key in self._symbolValues:
-            self._popSymbolFromResolutionOrder(key)
+        if self.expressionStore is not None and type(value) is not LazyValues:
+            # (lazy values aren't interned when they are worked out; they are
+            # mostly for showing, and are thrown away as soon as the symbols
+            # they are conditioned on change)
+            value = self._internValues(value)
+        oldValue = self._symbolValues.get(key, self._missing)
+        if oldValue is not self._missing:
+            self._unindexDependencies(key, oldValue) # type: ignore
         self._symbolValues[key] = value
-        self._insertSymbolToResolutionOrder(key)
+        self._indexDependencies(key, value)
+        self._recordUndo(key, oldValue, value)
+        self._updateResolutionRanks(key)
 
     def __iter__(self):
-        for (rank, symbol) in self._symbolResolutionOrder:
-            yield symbol
+        return iter(self._resolutionOrder)
 
     def __contains__(self, key: sympy.Symbol):
         return key in self._symbolValues or isExpressionListSymbol(key)
 
     def copy(self):
-        newDatabase = SymbolsDatabase()
+        # (copies are scratch databases; they don't share the journal)
+        newDatabase = SymbolsDatabase(expressionStore = self.expressionStore)
         newDatabase._symbolValues = dict(self._symbolValues)
         newDatabase._exprListSymbolValues = dict(self._exprListSymbolValues)
-        newDatabase._symbolResolutionOrder = list(self._symbolResolutionOrder)
+        newDatabase._resolutionOrder = self._resolutionOrder.copy()
+        newDatabase._dependentSymbols = {
+            symbol: set(dependentSymbols)
+            for (symbol, dependentSymbols) in self._dependentSymbols.items()
+        }
         return newDatabase
     
     def get(self, key: sympy.Symbol, default: _DefaultType = None) -> set[ConditionalValue[sympy.Expr]] | _DefaultType:
@@ -65,11 +223,148 @@ class SymbolsDatabase:
         except KeyError:
             return default
     
+    def subset(self, keys: set[sympy.Symbol]):
+        """
+        Creates a scratch database with just the given symbols (which should
+        include every symbol their values are conditioned on), in the same
+        resolution order they have in this database
+        """
+
+        newDatabase = SymbolsDatabase(expressionStore = self.expressionStore)
+        newDatabase._symbolValues = {
+            symbol: value
+            for (symbol, value) in self._symbolValues.items()
+            if symbol in keys
+        }
+        newDatabase._resolutionOrder = self._resolutionOrder.subset(keys)
+        for (symbol, value) in newDatabase._symbolValues.items():
+            newDatabase._indexDependencies(symbol, value)
+        return newDatabase
+    
+    def expressions(self):
+        """
+        Gives every expression the database keeps (values and condition values
+        of every symbol, except lazy values not worked out yet), which is what
+        has to stay in its `ExpressionStore`. (Expression list values aren't
+        interned, since they're cached for as long as the database lives.)
+        """
+
+        for values in self._symbolValues.values():
+            if type(values) is LazyValues:
+                if not values.isResolved:
+                    continue
+                values = values.resolve()
+            for conditionalValue in values:
+                yield conditionalValue.value
+                yield from conditionalValue.conditions.values()
+
+    def inResolutionOrder(self, symbols: Iterable[sympy.Symbol]):
+        """
+        Gives some of the database's symbols in the same order iterating over
+        the whole database would, without going over every other symbol
+        """
+
+        return sorted(symbols, key = self._resolutionOrder.keyOf)
+
     def pop(self, key: sympy.Symbol):
+        oldValue = self.discard(key)
+        if type(oldValue) is LazyValues:
+            return oldValue.resolve()
+        return oldValue
+    
+    def discard(self, key: sympy.Symbol):
+        """Pops a symbol's values, without working them out if they are still lazy"""
+
         if isExpressionListSymbol(key):
             raise ValueError("Cannot pop values for expression list symbols")
-        self._popSymbolFromResolutionOrder(key)
-        return self._symbolValues.pop(key)
+        oldValue = self._symbolValues.pop(key)
+        self._unindexDependencies(key, oldValue)
+        self._recordUndo(key, oldValue, self._missing)
+        # (symbols depending on this one keep their ranks; they are still
+        # after everything they depend on)
+        self._moveInResolutionOrder(key, None)
+        return oldValue
+
+    def isResolved(self, key: sympy.Symbol):
+        """Checks if a symbol's values are already worked out (which is always true unless they were set lazily)"""
+
+        value = self._symbolValues.get(key)
+        return type(value) is not LazyValues or value.isResolved
+
+    def getConditionSymbols(self, key: sympy.Symbol) -> set[sympy.Symbol]:
+        """Gives the symbols a symbol's values are conditioned on (without working out lazy values)"""
+
+        if isExpressionListSymbol(key):
+            return set()
+        return self._conditionSymbolsOf(key, self._symbolValues[key])
+
+    def getDependentSymbols(self, symbol: sympy.Symbol) -> tuple[sympy.Symbol, ...]:
+        """
+        Gives the symbols that have at least one value conditioned on the given
+        symbol (aka the symbols that were inferred from its values)
+        """
+
+        return tuple(self._dependentSymbols.get(symbol, ()))
+
+    def _indexDependencies(self, key: sympy.Symbol, value: set[ConditionalValue[sympy.Expr]] | LazyValues):
+        for conditionSymbol in self._conditionSymbolsOf(key, value):
+            self._dependentSymbols.setdefault(conditionSymbol, set()).add(key)
+
+    def _unindexDependencies(self, key: sympy.Symbol, value: set[ConditionalValue[sympy.Expr]] | LazyValues):
+        for conditionSymbol in self._conditionSymbolsOf(key, value):
+            dependentSymbols = self._dependentSymbols[conditionSymbol]
+            dependentSymbols.discard(key)
+            if len(dependentSymbols) == 0:
+                self._dependentSymbols.pop(conditionSymbol)
+
+    def _conditionSymbolsOf(self, key: sympy.Symbol, value: set[ConditionalValue[sympy.Expr]] | LazyValues):
+        if type(value) is LazyValues:
+            return {
+                conditionSymbol
+                for conditionSymbol in value.conditionSymbols
+                if conditionSymbol != key
+            }
+        return {
+            conditionSymbol
+            for conditionalValue in value
+            for conditionSymbol in conditionalValue.conditions
+            if conditionSymbol != key
+        }
+
+    def _recordUndo(self, key: sympy.Symbol, oldValue, newValue):
+        if self._undoLog is None or not self._undoLog.isRecording:
+            return
+        
+        def undo():
+            if newValue is not self._missing:
+                self._unindexDependencies(key, newValue)
+            if oldValue is self._missing:
+                self._symbolValues.pop(key)
+            else:
+                self._symbolValues[key] = oldValue
+                self._indexDependencies(key, oldValue)
+        self._undoLog.record(undo)
+
+    def _internValues(self, values: set[ConditionalValue[sympy.Expr]]):
+        """Interns a set's values, only making new `ConditionalValue`s (and a new set) if any of them weren't canonical yet"""
+
+        assert self.expressionStore is not None
+        internedValues: set[ConditionalValue[sympy.Expr]] = set()
+        isChanged = False
+        for conditionalValue in values:
+            value = self.expressionStore.intern(conditionalValue.value)
+            conditions = {
+                conditionSymbol: self.expressionStore.intern(conditionValue)
+                for (conditionSymbol, conditionValue) in conditionalValue.conditions.items()
+            }
+            if value is not conditionalValue.value or any(
+                conditionValue is not conditionalValue.conditions[conditionSymbol]
+                for (conditionSymbol, conditionValue) in conditions.items()
+            ):
+                conditionalValue = ConditionalValue(value, conditions)
+                isChanged = True
+            internedValues.add(conditionalValue)
+        return internedValues if isChanged else values
 
     def _parseExprListSymbol(self, exprListSymbol: sympy.Symbol) -> set[ConditionalValue[sympy.Expr]]:
         assert isExpressionListSymbol(exprListSymbol)
@@ -81,41 +376,43 @@ class SymbolsDatabase:
             for expression in expressionList
         }
     
-    def _insertSymbolToResolutionOrder(self, symbol: sympy.Symbol):
-        assert symbol in self, "Should not insert symbol's resolution order before it has values"
-        symbolSortRank = self._calculateSymbolResolutionRank(symbol)
-        if symbolSortRank == 0:
-            self._symbolResolutionOrder.insert(0, (symbolSortRank, symbol))
-        else:
-            insertIdx = len(self._symbolResolutionOrder) + 1
-            rankBeforeInsert = None
-            while rankBeforeInsert is None or rankBeforeInsert > symbolSortRank:
-                insertIdx -= 1
-                if insertIdx == 0:
-                    break
-                (rankBeforeInsert, symbolBeforeInsert) = self._symbolResolutionOrder[insertIdx - 1]
-            self._symbolResolutionOrder.insert(insertIdx, (symbolSortRank, symbol))
-
-    def _calculateSymbolResolutionRank(self, symbol: sympy.Symbol):
-        if isExpressionListSymbol(symbol):
-            return 0
-        else:
-            conditionSymbols = {
-                symbol
-                for conditionValue in self[symbol]
-                for symbol in conditionValue.conditions.keys()
-            }
-            rank = 1 + sum(
-                self._calculateSymbolResolutionRank(symbol)
-                for symbol in conditionSymbols
+    def _updateResolutionRanks(self, symbol: sympy.Symbol):
+        """
+        Ranks a symbol that was just set, and then ranks again any symbols
+        depending on it whose rank changed because of it (and any depending on
+        those, and so on).
+        """
+
+        symbolsToRank = [symbol]
+        while len(symbolsToRank) > 0:
+            symbolToRank = symbolsToRank.pop()
+            rank = 1 + max(
+                (
+                    self._resolutionOrder.rankOf(conditionSymbol, 0)
+                    for conditionSymbol in self._conditionSymbolsOf(symbolToRank, self._symbolValues[symbolToRank])
+                ),
+                default = 0,
             )
-            return rank
+            if self._resolutionOrder.rankOf(symbolToRank) == rank:
+                continue
+            self._moveInResolutionOrder(symbolToRank, rank)
+            symbolsToRank.extend(self._dependentSymbols.get(symbolToRank, ()))
 
-    def _popSymbolFromResolutionOrder(self, symbol: sympy.Symbol):
-        symbolIdx = [
-            symbol
-            for (rank, symbol) in self._symbolResolutionOrder
-        ].index(symbol)
-        return self._symbolResolutionOrder.pop(symbolIdx)
+    def _moveInResolutionOrder(self, symbol: sympy.Symbol, rank: int | None):
+        """Moves a symbol to the end of the given rank's symbols (or takes it out of the order if `rank` is `None`)"""
 
+        oldKey = self._resolutionOrder.remove(symbol) if self._resolutionOrder.keyOf(symbol) is not None \
+            else None
+        newKey = self._resolutionOrder.insert(symbol, rank) if rank is not None \
+            else None
+        if self._undoLog is None or not self._undoLog.isRecording:
+            return
 
+        # (undos are always run newest-first, so the resolution order is
+        # guaranteed to look exactly like it did right after this change)
+        def undo():
+            if newKey is not None:
+                self._resolutionOrder.remove(symbol)
+            if oldKey is not None:
+                self._resolutionOrder.insert(symbol, *oldKey)
+        self._undoLog.record(undo)
@@ -0,0 +1,159 @@
+import multiprocessing
+import pickle
+from multiprocessing.connection import Connection
+from typing import Any, Callable
+
+import sympy
+
+from src.common.sympyLinterFixes import solveSet
+
+
+class TimeLimitExceeded(Exception):
+    """Raised when a job given to a `TimeLimitedPool` runs past its time limit"""
+
+    def __init__(self, timeLimit: float):
+        self.timeLimit = timeLimit
+        super().__init__(timeLimit)
+
+
+class WorkerFailure(Exception):
+    """
+    Raised when a job given to a `TimeLimitedPool` couldn't be run by a worker
+    (because the job or its result couldn't be sent between processes, or the
+    worker died part way through)
+    """
+
+
+# (workers are never forked straight from the process using the pool, since it
+# might have other threads running (like the app's); where there is a fork
+# server, it has this module (and so `sympy`) already imported, so workers still
+# start quickly)
+if "forkserver" in multiprocessing.get_all_start_methods():
+    workerContext = multiprocessing.get_context("forkserver")
+    workerContext.set_forkserver_preload([__name__])
+else:
+    workerContext = multiprocessing.get_context("spawn")
+
+
+class TimeLimitedPool:
+    """
+    A pool of worker processes that run jobs with a time limit. Some
+    expressions can keep `solveset()` or `simplify()` busy for minutes (or
+    forever), and since there's no way to interrupt sympy part way through,
+    the only way to get control back is to run it somewhere that can be
+    killed. That's what these workers are for:
+
+    ```raw
+    pool.run(sympy.simplify, expr)          (gives the simplified expr...)
+        [worker runs past the time limit]
+                                            (...or raises TimeLimitExceeded)
+        [worker is killed]
+        [a new worker starts warming up]
+    ```
+
+    Workers are started (and warmed up, since sympy's first few calls are
+    quite a bit slower than the rest) as soon as the pool is made, and a
+    worker that is killed is replaced right away, so one is (almost) always
+    ready to go when the next job comes along. (If one isn't, the job waits for
+    it to finish warming up before its time starts counting.)
+
+    Jobs are (picklable, module-level) functions, just like with the
+    `FamilySolverPool`. If a job can't be sent to a worker (or its result can't
+    be sent back, or the worker dies), `WorkerFailure` is raised; the job is
+    never run here instead, since it would have no time limit. Errors raised
+    by a job are raised again here.
+    """
+
+    def __init__(self, timeLimit: float, *, numWorkers: int = 1):
+        assert timeLimit > 0, "Pool must give jobs some time to run"
+        assert numWorkers > 0, "Pool must have at least one worker"
+        self.timeLimit = timeLimit
+        self.numTimeouts = 0
+        self.numWorkerFailures = 0
+        self._warmingConnections: set[Connection] = set()
+        self._idleWorkers: list[tuple[multiprocessing.Process, Connection]] = [
+            self._startWorker()
+            for _ in range(numWorkers)
+        ]
+
+    def run(self, jobFn: Callable[..., Any], *args, timeLimit: float | None = None):
+        if timeLimit is None:
+            timeLimit = self.timeLimit
+        if len(self._idleWorkers) == 0:
+            # (only happens if a job is run from inside another job)
+            self._idleWorkers.append(self._startWorker())
+
+        (process, connection) = self._idleWorkers.pop()
+        try:
+            if connection in self._warmingConnections:
+                # (workers say when they're warmed up)
+                connection.recv()
+                self._warmingConnections.remove(connection)
+            connection.send((jobFn, args))
+            if not connection.poll(timeLimit):
+                self._replaceWorker(process, connection)
+                self.numTimeouts += 1
+                raise TimeLimitExceeded(timeLimit)
+            (isSuccess, result) = connection.recv()
+        except (OSError, EOFError, pickle.PicklingError, TypeError, AttributeError) as exception:
+            # (pickling problems, or the worker died)
+            self._replaceWorker(process, connection)
+            self.numWorkerFailures += 1
+            raise WorkerFailure(f"Worker could not run {getattr(jobFn, '__name__', jobFn)}()") from exception
+
+        self._idleWorkers.append((process, connection))
+        if not isSuccess:
+            raise result
+        return result
+
+    def shutdown(self):
+        for (process, connection) in self._idleWorkers:
+            self._stopWorker(process, connection)
+        self._idleWorkers = list()
+        self._warmingConnections = set()
+
+    def _startWorker(self):
+        (parentConnection, childConnection) = workerContext.Pipe()
+        process = workerContext.Process(target = _workerMain, args = (childConnection,), daemon = True)
+        process.start()
+        childConnection.close()
+        self._warmingConnections.add(parentConnection)
+        return (process, parentConnection)
+
+    def _replaceWorker(self, process: multiprocessing.Process, connection: Connection):
+        self._stopWorker(process, connection)
+        self._idleWorkers.append(self._startWorker())
+
+    def _stopWorker(self, process: multiprocessing.Process, connection: Connection):
+        process.terminate()
+        process.join()
+        connection.close()
+        self._warmingConnections.discard(connection)
+
+
+def _workerMain(connection: Connection):
+    _warmUpWorker()
+    connection.send(None)
+    while True:
+        try:
+            (jobFn, args) = connection.recv()
+        except EOFError:
+            return
+        try:
+            response = (True, jobFn(*args))
+        except Exception as exception:
+            response = (False, exception)
+        try:
+            connection.send(response)
+        except Exception:
+            # (the result couldn't be pickled; the pool will find out when it
+            # can't read it)
+            connection.close()
+            return
+
+def _warmUpWorker():
+    # for some reason, the first calls to these are a tad slow...
+    # this just gets that out of the way so the first job doesn't time out
+    x = sympy.Symbol("x")
+    sympy.simplify(x + x)
+    solveSet(x**2 - 1, x)
@@ -1,5 +1,6 @@
 from abc import ABC, abstractmethod
-from typing import Generic, Collection, TypeVar
+from types import MappingProxyType
+from typing import Generic, Collection, Mapping, TypeVar
 
 import sympy
 
@@ -7,6 +8,7 @@ from src.common.functions import first, surroundJoin
 from src.common.sympyLinterFixes import subsExpr, createSymbol
 from src.common.types import FormattedStr
 from src.common.exceptions import MultilineException
+from src.parsing.sreprParser import parseSrepr
 from src.app.widgets.colors import Colors
 
 
@@ -29,23 +31,41 @@ class ConditionalValue(Generic[_ValueType]):
     symbol-value combinations when substituting.
     """
     
-    def __init__(self, value: _ValueType, conditions: dict[sympy.Symbol, sympy.Expr]):
-        self.value = value
-        self.conditions = conditions
+    __slots__ = ("value", "conditions", "_hash")
+
+    def __init__(self, value: _ValueType, conditions: Mapping[sympy.Symbol, sympy.Expr]):
+        # (these objects live in sets and dictionary keys all over the solver,
+        # so they are immutable; conditions are copied so nobody else can
+        # change them either)
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "conditions", MappingProxyType(dict(conditions)))
+        object.__setattr__(self, "_hash", None)
+
+    def __setattr__(self, name: str, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+    
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return (type(self), (self.value, dict(self.conditions)))
 
     def __repr__(self):
-        return f"ConditionalValue({self.value}, {self.conditions})"
+        return f"ConditionalValue({self.value}, {dict(self.conditions)})"
     
     def __hash__(self):
-        conditionsHash = 1
-        for (symbol, value) in self.conditions.items():
-            conditionsHash *= symbol - value # type: ignore
-        return hash((self.value, conditionsHash))
+        # (hashed lazily, since some values, like solution sets, are never
+        # hashed and can't be)
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((self.value, frozenset(self.conditions.items()))))
+        return self._hash
 
     def __eq__(self, other):
         if type(other) is not ConditionalValue:
             return False
         
+        if self is other:
+            return True
         return self.value == other.value and self.conditions == other.conditions
     
 
@@ -81,6 +101,15 @@ class Relation:
         
         return self.leftExpr == other.leftExpr and self.rightExpr == other.rightExpr
 
+    def exportState(self):
+        # (`srepr()` strings give back exactly the same expressions)
+        return [sympy.srepr(self.leftExpr), sympy.srepr(self.rightExpr)]
+
+    @classmethod
+    def importState(cls, state: list[str]):
+        (leftExprStr, rightExprStr) = state
+        return cls(parseSrepr(leftExprStr), parseSrepr(rightExprStr)) # type: ignore
+
 
 class BadRelationException(MultilineException, ABC):
     """An extension of MultilineException that handles "bad" relations of some kind"""
@@ -101,6 +130,11 @@ class BadRelationException(MultilineException, ABC):
             ]
         ))
 
+    def __reduce__(self):
+        # (these are raised by families solved in worker processes too, so
+        # they are sent back by making them again from the same arguments)
+        return (type(self), self._initArgs)
+
     def formatPoorSymbols(self, poorSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None]):
         return surroundJoin(
             (str(symbol) for symbol in poorSymbolValues.keys()),
@@ -119,6 +153,7 @@ class ContradictionException(BadRelationException):
     """Represents a relation that implies contradictory values to one or more already known symbols"""
 
     def __init__(self, contradictedSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None], badRelation: Relation):
+        self._initArgs = (contradictedSymbolValues, badRelation)
         symbolsStr = f" for {self.formatPoorSymbols(contradictedSymbolValues)}" \
             if len(contradictedSymbolValues) > 0 else ""
         super().__init__(
@@ -131,6 +166,7 @@ class NoSolutionException(BadRelationException):
     """Represents a relation that makes it impossible to extract values for some symbol"""
 
     def __init__(self, symbolsMissingSolutions: Collection[sympy.Symbol], badSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None], badRelation: Relation):
+        self._initArgs = (tuple(symbolsMissingSolutions), badSymbolValues, badRelation)
         symbolsStr = f" for {self.formatPoorSymbols({symbol: None for symbol in symbolsMissingSolutions})}" \
             if len(symbolsMissingSolutions) > 0 else ""
         for unsolvedSymbol in symbolsMissingSolutions:
@@ -142,3 +178,37 @@ class NoSolutionException(BadRelationException):
             badRelation
         )
 
+class SolveTimeLimitException(BadRelationException):
+    """Represents a relation that took too long to solve for some symbol"""
+
+    def __init__(self, unsolvedSymbol: sympy.Symbol, timeLimit: float, badSymbolValues: dict[sympy.Symbol, set[sympy.Expr] | None], badRelation: Relation):
+        self._initArgs = (unsolvedSymbol, timeLimit, badSymbolValues, badRelation)
+        self.timeLimit = timeLimit
+        if unsolvedSymbol not in badSymbolValues:
+            badSymbolValues[unsolvedSymbol] = None
+        super().__init__(
+            f"Relation took longer than {timeLimit:g}s to solve for {self.formatPoorSymbols({unsolvedSymbol: None})}",
+            badSymbolValues,
+            badRelation
+        )
+
+class CancelledException(MultilineException):
+    """Represents a solver operation that was cancelled before it finished"""
+
+    def __init__(self):
+        super().__init__((
+            "Command was cancelled",
+            "(nothing was changed)",
+        ))
+
+class SimplifyTimeLimitException(MultilineException):
+    """Represents an expression that took too long to simplify"""
+
+    def __init__(self, expression: sympy.Expr, timeLimit: float):
+        self.expression = expression
+        self.timeLimit = timeLimit
+        super().__init__((
+            f"Expression took longer than {timeLimit:g}s to simplify",
+            f"[{Colors.textRed.hex}]{self.renderer.formatExpressions([expression])}[/]",
+        ))
+
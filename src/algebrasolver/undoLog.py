@@ -0,0 +1,69 @@
+from typing import Callable
+
+
+class UndoLog:
+    """
+    A journal of "undo actions" that makes a group of changes reversible.
+
+    Instead of backing up an entire data structure before changing it (which
+    costs the full size of the structure every time, even if only one entry
+    changes), each mutation records a small function that reverses it. If the
+    changes need to be thrown away, the recorded functions are run backwards
+    (newest first), leaving things exactly how they were before. If the changes
+    should be kept, the journal is simply forgotten.
+
+    ```raw
+    log.begin()
+    table[a] = 5            (records: "pop a")
+    table[b] = 6            (records: "pop b")
+    log.rollback()          (runs: "pop b", "pop a")
+    ```
+
+    Transactions may be nested. An inner `begin()` only marks a "savepoint" in
+    the journal; rolling back the inner transaction undoes everything since that
+    savepoint, and committing it hands its undo actions over to the outer
+    transaction (so the outer transaction can still undo them later). When no
+    transaction is active, nothing is recorded at all.
+    """
+
+    def __init__(self):
+        self._undoActions: list[Callable[[], None]] = list()
+        self._savepoints: list[int] = list()
+        self._isUndoing = False
+
+    @property
+    def isRecording(self):
+        return len(self._savepoints) > 0 and not self._isUndoing
+
+    @property
+    def depth(self):
+        return len(self._savepoints)
+
+    def begin(self):
+        self._savepoints.append(len(self._undoActions))
+
+    def commit(self):
+        if len(self._savepoints) == 0:
+            raise RuntimeError("Cannot commit; no transaction was started")
+        self._savepoints.pop()
+        isOutermostTransaction = len(self._savepoints) == 0
+        if isOutermostTransaction:
+            self._undoActions.clear()
+
+    def rollback(self):
+        if len(self._savepoints) == 0:
+            raise RuntimeError("Cannot roll back; no transaction was started")
+        savepoint = self._savepoints.pop()
+        self._isUndoing = True
+        try:
+            while len(self._undoActions) > savepoint:
+                undoAction = self._undoActions.pop()
+                undoAction()
+        finally:
+            self._isUndoing = False
+
+    def record(self, undoAction: Callable[[], None]):
+        """Records a function that reverses a change that was just (or is about to be) made"""
+
+        if self.isRecording:
+            self._undoActions.append(undoAction)
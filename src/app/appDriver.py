@@ -1,19 +1,38 @@
-from typing import Collection
+from typing import Collection, Iterable
 
 import sympy
 
 from src.common.functions import surroundJoin, first
 from src.common.exceptions import TracebackException, MultilineException
 from src.app.textRenderer import TextRenderer
+from src.app.sessionStore import SessionStore
 from src.app.widgets.colors import Colors
 from src.algebrasolver.solver import AlgebraSolver, Relation
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool
 from src.parsing.lexer import CommandLexer, LexerToken, LexerTokenTypes
 from src.parsing.parser import CommandParser, Command, CommandType, AliasTemplate, freeSymbolsOf
 
 
 class AppDriver:
-    def __init__(self):
-        self._solver = AlgebraSolver()
+    # (inputs with only other kinds of commands don't need to be journaled)
+    _stateChangingCommands = (
+        Command.RECORD_RELATIONS,
+        Command.RECORD_RELATIONS_NUMERICALLY,
+        Command.RECORD_ALIAS,
+        Command.SET_NUMERIC_MODE,
+    )
+
+    # (how long the app lets solving or simplifying go on before giving up, in
+    # seconds; long enough that only inputs that would hang hit it)
+    defaultTimeLimit = 30.0
+
+    def __init__(self, sessionStore: SessionStore | None = None, *, timeLimitedPool: TimeLimitedPool | None = None, maxWorkers: int = 0):
+        # (solving and simplifying are done in the pool's workers, within its
+        # time limit, if a pool is given; the pool can be shared, so it is up
+        # to whoever made it to shut it down; independent families are solved
+        # in up to `maxWorkers` worker processes of the solver's own, which
+        # are stopped with `shutdown()`)
+        self._solver = AlgebraSolver(timeLimitedPool = timeLimitedPool, maxWorkers = maxWorkers)
 
         self._inputHistory: list[str] = list()
         self._historySearchTerm: str = ""
@@ -21,9 +40,51 @@ class AppDriver:
 
         self._aliases: dict[str, AliasTemplate] = dict()
 
-        self._warmUpSimplify()
+        # changes are journaled to the session store (if any), except while
+        # the session is being restored from it
+        self._sessionStore = sessionStore
+        self._isJournaling = False
+        # (inputs that couldn't be replayed while restoring the session, and
+        # the errors they gave)
+        self.restoreErrors: list[tuple[str, Exception]] = list()
+        if sessionStore is not None:
+            self._restoreSession()
+            self._isJournaling = True
+
+        if timeLimitedPool is None:
+            # (otherwise the pool's workers are warmed up instead)
+            self._warmUpSimplify()
+
+    def shutdown(self):
+        """
+        Saves a snapshot of the session (if it is being kept), so the journal
+        never has to be replayed next time, and stops the solver's worker
+        processes
+        """
+
+        try:
+            if self._sessionStore is not None:
+                self.saveSession()
+        finally:
+            self._solver.shutdown()
+
+    def saveSession(self):
+        """Saves a snapshot of the whole session to the session store"""
+
+        assert self._sessionStore is not None, "Cannot save session without a session store"
+        self._sessionStore.saveSnapshot({
+            "solver": self._solver.exportState(),
+            "aliases": [
+                [aliasName, list(aliasTemplate.argNames), aliasTemplate.evaluate(*aliasTemplate.argNames)]
+                for (aliasName, aliasTemplate) in self._aliases.items()
+            ],
+            "inputHistory": self._inputHistory,
+        })
 
     def processCommandLines(self, commandsStr: str):
+        isStateChanging = False
+        numStateChangesApplied = 0
+        succeeded = False
         try:
             tokensWithAliases = tuple(CommandLexer.findTokens(commandsStr))
 
@@ -46,10 +107,16 @@ class AppDriver:
             for command in CommandParser.parseCommand(processedTokens):
                 if command.type is not Command.EMPTY:
                     anyNonEmptyCommands = True
-                yield self._processCommand(command, processedTokens)
+                if command.type in self._stateChangingCommands:
+                    isStateChanging = True
+                result = self._processCommand(command, processedTokens)
+                if command.type in self._stateChangingCommands:
+                    numStateChangesApplied += 1
+                yield result
             
             if anyNonEmptyCommands:
                 self._inputHistory.insert(0, commandsStr)
+            succeeded = True
         
         except Exception as exception:
             self._inputHistory.insert(0, commandsStr)
@@ -57,6 +124,33 @@ class AppDriver:
 
         finally:
             self.resetHistoryState()
+            # (a command that fails (or times out, or is cancelled) doesn't
+            # change anything, so only inputs that were applied are journaled;
+            # otherwise every restore would run into the same failure (or wait
+            # out the same time limit) all over again; the exception is an
+            # input of several lines failing after some of them were applied,
+            # which is replayed the same way to get those changes back)
+            if isStateChanging and (succeeded or numStateChangesApplied > 0):
+                self._journal({"input": commandsStr})
+
+    def cancelCommand(self):
+        """
+        Cancels the command currently being processed (from another thread),
+        which then raises a `CancelledException` without changing anything.
+        Commands keep being cancelled until `resetCancellation()` is called.
+        """
+
+        self._solver.cancel()
+
+    def resetCancellation(self):
+        """
+        Lets commands run again after one was cancelled. This should be called
+        before starting each command, from the same thread `cancelCommand()` is
+        called from; resetting from the thread processing the command could
+        clear a cancellation that was asked for before it got started.
+        """
+
+        self._solver.resetCancellation()
 
     def validateSingleLine(self, commandStr: str):
         if "\n" in commandStr:
@@ -67,24 +161,38 @@ class AppDriver:
     
     def deleteRelation(self, relation: Relation):
         self._solver.popRelation(relation)
+        self._journal({"delete": [relation.exportState()]})
+
+    def deleteRelations(self, relations: Iterable[Relation]):
+        relations = list(relations)
+        self._solver.popRelations(relations)
+        self._journal({"delete": [relation.exportState() for relation in relations]})
 
     def replaceRelation(self, oldRelation: Relation, newRelationCommand: str):
         self.validateSingleLine(newRelationCommand)
-        # TODO: this would be a good use case for transactional solver stuff when that's implemented
-        self._solver.popRelation(oldRelation)
+        self._solver.beginTransaction()
+        wasJournaling = self._isJournaling
+        self._isJournaling = False
         try:
+            self._solver.popRelation(oldRelation)
             commandHasMultipleRelations = len([char for char in newRelationCommand if char == "="]) > 1
             if commandHasMultipleRelations:
                 raise TooManyRelationsException(oldRelation, newRelationCommand)
 
-            result = first(self.processCommandLines(newRelationCommand), None)
+            commandResults = self.processCommandLines(newRelationCommand)
+            result = first(commandResults, None)
+            commandResults.close()
             if result is None or result.type is not Command.RECORD_RELATIONS:
                 raise NotARelationException(oldRelation, newRelationCommand)
-            else:
-                return result
+            
+            self._solver.commitTransaction()
         except Exception as exception:
-            self._solver.recordRelation(oldRelation)
+            self._solver.rollbackTransaction()
             raise exception
+        finally:
+            self._isJournaling = wasJournaling
+        self._journal({"replace": oldRelation.exportState(), "input": newRelationCommand})
+        return result
         
     def getAllAliasNames(self):
         return tuple(self._aliases.keys()) + tuple(CommandParser.builtinAliases.keys())
@@ -145,21 +253,12 @@ class AppDriver:
             return ProcessResult(Command.EMPTY, None)
         
         elif command.type is Command.RECORD_RELATIONS:
-            relations = [
-                Relation(leftExpr, rightExpr)
-                for (leftExprIdx, leftExpr) in enumerate(command.data)
-                for rightExpr in [
-                    command.data[leftExprIdx + 1]
-                    if leftExprIdx + 1 < len(command.data)
-                    else command.data[-1]
-                ]
-                if leftExprIdx + 1 < len(command.data)
-            ]
-            relationsWithRedundancies = [
-                (relation, isRedundant)
-                for relation in relations
-                for isRedundant in [self._solver.recordRelation(relation)]
-            ]
+            relationsWithRedundancies = self._recordRelations(command.data, numeric = False)
+            return ProcessResult(Command.RECORD_RELATIONS, relationsWithRedundancies)
+        
+        elif command.type is Command.RECORD_RELATIONS_NUMERICALLY:
+            # (these are still just recorded relations, as far as results go)
+            relationsWithRedundancies = self._recordRelations(command.data, numeric = True)
             return ProcessResult(Command.RECORD_RELATIONS, relationsWithRedundancies)
         
         elif command.type is Command.EVALUATE_EXPRESSION:
@@ -189,12 +288,70 @@ class AppDriver:
         elif command.type is Command.SIMPLIFY_EXPRESSION:
             expr: sympy.Expr = command.data
             assert isinstance(expr, sympy.Expr)
-            expr = sympy.simplify(expr)
+            expr = self._solver.simplify(expr)
             return ProcessResult(Command.SIMPLIFY_EXPRESSION, {expr})
         
+        elif command.type is Command.SET_NUMERIC_MODE:
+            isEnabled: bool = command.data
+            assert type(isEnabled) is bool
+            self._solver.setNumericMode(isEnabled)
+            return ProcessResult(Command.SET_NUMERIC_MODE, isEnabled)
+        
         else:
             raise NotImplementedError(f"Processing command of type {command.type} not implemented")
         
+    def _recordRelations(self, relationExprs: list[sympy.Expr], *, numeric: bool):
+        relations = [
+            Relation(leftExpr, rightExpr)
+            for (leftExprIdx, leftExpr) in enumerate(relationExprs)
+            for rightExpr in [
+                relationExprs[leftExprIdx + 1]
+                if leftExprIdx + 1 < len(relationExprs)
+                else relationExprs[-1]
+            ]
+            if leftExprIdx + 1 < len(relationExprs)
+        ]
+        # (chained relations like `a = b = c` are recorded all at once)
+        return list(zip(relations, self._solver.recordRelations(relations, numeric = numeric)))
+        
+    def _restoreSession(self):
+        assert self._sessionStore is not None
+        (snapshot, journalEntries) = self._sessionStore.load()
+        if snapshot is not None:
+            self._solver.importState(snapshot["solver"])
+            for (aliasName, aliasArgs, aliasTemplateStr) in snapshot["aliases"]:
+                self._aliases[aliasName] = AliasTemplate(aliasName, tuple(aliasArgs), tuple(CommandLexer.findTokens(aliasTemplateStr)))
+            self._inputHistory = list(snapshot["inputHistory"])
+
+        for entry in journalEntries:
+            # (entries were applied successfully the first time, so a failure
+            # here means something else changed, like the time limit; the rest
+            # of the session is still restored, and the user is told about it)
+            try:
+                if "replace" in entry:
+                    self.replaceRelation(Relation.importState(entry["replace"]), entry["input"])
+                elif "delete" in entry:
+                    self._solver.popRelations([
+                        Relation.importState(relationData)
+                        for relationData in entry["delete"]
+                    ])
+                else:
+                    for _ in self.processCommandLines(entry["input"]):
+                        pass
+            except Exception as exception:
+                self.restoreErrors.append((entry.get("input", ""), exception))
+
+        # (so the journal never has to be replayed again)
+        if len(journalEntries) > 0:
+            self.saveSession()
+
+    def _journal(self, entry: dict):
+        if not self._isJournaling or self._sessionStore is None:
+            return
+        self._sessionStore.append(entry)
+        if self._sessionStore.needsSnapshot:
+            self.saveSession()
+
     def _warmUpSimplify(self):
         # for some reason, the first call to this is a tad slow...
         # this just gets that out of the way so the app doesn't feel slow
@@ -1,6 +1,57 @@
+import argparse
+import multiprocessing
+import os
+
+from src.app.appDriver import AppDriver
+from src.app.sessionStore import SessionStore
 from src.app.widgets.solverProApp import SolverProApp
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool
 
 
 if __name__ == "__main__":
-    app = SolverProApp()
-    app.run()
+    # (the solver's time limit runs in worker processes, which need this to
+    # start in a frozen (PyInstaller) build)
+    multiprocessing.freeze_support()
+
+    argParser = argparse.ArgumentParser(prog = "solverpro")
+    # (sessions are only kept if asked for, in the directory given, or in the
+    # home directory if none is)
+    argParser.add_argument(
+        "--session",
+        dest = "sessionDirectoryPath",
+        nargs = "?",
+        metavar = "DIRECTORY",
+        const = SessionStore.defaultDirectoryPath(),
+        default = None,
+        help = "keep the session in this directory, to pick it back up next time",
+    )
+    argParser.add_argument(
+        "--time-limit",
+        dest = "timeLimit",
+        type = float,
+        default = AppDriver.defaultTimeLimit,
+        help = "seconds to let solving or simplifying run before giving up (0 for no limit)",
+    )
+    # (one worker per core; with only one core, there's nothing to gain)
+    numCores = os.cpu_count() or 1
+    argParser.add_argument(
+        "--workers",
+        dest = "maxWorkers",
+        type = int,
+        default = numCores if numCores > 1 else 0,
+        help = "worker processes to solve independent relations in at the same time (0 to solve everything in order)",
+    )
+    args = argParser.parse_args()
+
+    sessionStore = SessionStore(args.sessionDirectoryPath) if args.sessionDirectoryPath is not None else None
+    # (one pool of workers is shared by everything the app solves or simplifies)
+    timeLimitedPool = TimeLimitedPool(args.timeLimit) if args.timeLimit > 0 else None
+    app = None
+    try:
+        app = SolverProApp(sessionStore, timeLimitedPool = timeLimitedPool, maxWorkers = max(args.maxWorkers, 0))
+        app.run()
+    finally:
+        if app is not None:
+            app.driver.shutdown()
+        if timeLimitedPool is not None:
+            timeLimitedPool.shutdown()
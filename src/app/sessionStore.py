@@ -0,0 +1,152 @@
+import json
+import os
+
+
+class SessionStore:
+    """
+    Keeps a Solver Pro session on disk, so it can be picked back up right where
+    it was left off (without recording everything all over again). A session
+    is kept in a directory as two files:
+
+    ```raw
+    snapshot.json       (everything the session knew at some point)
+    journal.jsonl       (every change made since then, one JSON object per line)
+    ```
+
+    Changes are appended to the journal as they happen, and every line is
+    flushed all the way to the disk before moving on, so at most the change
+    being written at the time of a crash can be lost. A half-written last line
+    is simply ignored (and cut off) the next time the session is loaded.
+
+    Replaying a long journal is slow, so every once in a while the whole
+    session is written as a new snapshot, and the journal starts over. Both
+    files are replaced atomically (by writing a temporary file and renaming it
+    over the old one). Each snapshot is numbered with a "generation", and the
+    journal starts with the generation of the snapshot it continues from; if a
+    crash happens between replacing the snapshot and replacing the journal,
+    the (old) journal's generation doesn't match, so it is known to already be
+    part of the snapshot and is ignored.
+    """
+
+    snapshotFileName = "snapshot.json"
+    journalFileName = "journal.jsonl"
+
+    def __init__(self, directoryPath: str, *, maxJournalEntries: int = 200):
+        assert maxJournalEntries > 0, "Journal must be able to hold at least one entry"
+        self.directoryPath = directoryPath
+        self.maxJournalEntries = maxJournalEntries
+        self.numJournalEntries = 0
+        self._generation = 0
+
+    @classmethod
+    def defaultDirectoryPath(cls):
+        return os.path.join(os.path.expanduser("~"), ".solverpro", "session")
+
+    @property
+    def snapshotPath(self):
+        return os.path.join(self.directoryPath, self.snapshotFileName)
+
+    @property
+    def journalPath(self):
+        return os.path.join(self.directoryPath, self.journalFileName)
+
+    @property
+    def needsSnapshot(self):
+        return self.numJournalEntries >= self.maxJournalEntries
+
+    def load(self) -> tuple[dict | None, list[dict]]:
+        """
+        Gives the last snapshot saved (or `None` if there isn't one) and the
+        journal entries recorded after it. This should be called once, before
+        anything is appended.
+        """
+
+        os.makedirs(self.directoryPath, exist_ok = True)
+        snapshot = None
+        if os.path.exists(self.snapshotPath):
+            with open(self.snapshotPath, "r", encoding = "utf-8") as snapshotFile:
+                snapshotData = json.load(snapshotFile)
+            self._generation = snapshotData["generation"]
+            snapshot = snapshotData["session"]
+
+        entries = self._loadJournal()
+        if entries is None:
+            # (missing or stale journals are started over)
+            self._writeJournal()
+            entries = []
+        self.numJournalEntries = len(entries)
+        return (snapshot, entries)
+
+    def append(self, entry: dict):
+        """Durably records a change at the end of the journal"""
+
+        with open(self.journalPath, "a", encoding = "utf-8") as journalFile:
+            journalFile.write(self._encode(entry) + "\n")
+            journalFile.flush()
+            os.fsync(journalFile.fileno())
+        self.numJournalEntries += 1
+
+    def saveSnapshot(self, session: dict):
+        """Saves a snapshot of the whole session, and starts the journal over"""
+
+        self._generation += 1
+        self._replaceFile(self.snapshotPath, self._encode({
+            "generation": self._generation,
+            "session": session,
+        }))
+        self._writeJournal()
+        self.numJournalEntries = 0
+
+    def _loadJournal(self):
+        if not os.path.exists(self.journalPath):
+            return None
+
+        with open(self.journalPath, "rb") as journalFile:
+            journalBytes = journalFile.read()
+        lines = journalBytes.split(b"\n")
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return None
+        if header.get("generation") != self._generation:
+            return None
+
+        entries: list[dict] = list()
+        validLength = len(lines[0]) + 1
+        # (the last "line" is whatever comes after the last newline, which is
+        # either nothing or a line that was never finished)
+        for line in lines[1:-1]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # (a crash left this line half written; nothing after it can
+                # have been recorded)
+                break
+            entries.append(entry)
+            validLength += len(line) + 1
+        if validLength < len(journalBytes):
+            with open(self.journalPath, "r+b") as journalFile:
+                journalFile.truncate(validLength)
+                os.fsync(journalFile.fileno())
+        return entries
+
+    def _writeJournal(self):
+        self._replaceFile(self.journalPath, self._encode({"generation": self._generation}) + "\n")
+
+    def _replaceFile(self, path: str, contents: str):
+        temporaryPath = path + ".tmp"
+        with open(temporaryPath, "w", encoding = "utf-8") as temporaryFile:
+            temporaryFile.write(contents)
+            temporaryFile.flush()
+            os.fsync(temporaryFile.fileno())
+        os.replace(temporaryPath, path)
+        if hasattr(os, "O_DIRECTORY"):
+            # (renames are only durable once the directory itself is synced)
+            directoryFd = os.open(self.directoryPath, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(directoryFd)
+            finally:
+                os.close(directoryFd)
+
+    def _encode(self, data: dict):
+        return json.dumps(data, separators = (",", ":"))
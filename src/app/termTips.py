@@ -92,6 +92,13 @@ class TermTips:
 
                     self._renderer.formatLexerSyntax("simplify: expr") + "\n" + \
                     "Processes an expression without substituting known/inferred values.",
+
+                    self._renderer.formatLexerSyntax("numeric: relation") + "\n" + \
+                    "Records a relation, solving it numerically if it can't be solved exactly.",
+
+                    self._renderer.formatLexerSyntax("numeric: on") + "\n" + \
+                    "Solves every relation recorded from now on numerically when needed " \
+                    "(and " + self._renderer.formatLexerSyntax("numeric: off") + " stops doing so).",
                 )
             ),
             'identifiers': 'identifier',
@@ -122,6 +122,16 @@ class TextRenderer:
             self.formatRelation(relation, warnRedundant = False, highlightSyntax = highlightSyntax),
             f"[{Colors.textMuted.hex}]was deleted[/]",
         ])
+
+    def formatRelationsDeleted(self, relations: Iterable[Relation], *, highlightSyntax: bool = False):
+        return self._formatLines([
+            f"[{Colors.textMuted.hex}]Relations[/]",
+            *(
+                self.formatRelation(relation, warnRedundant = False, highlightSyntax = highlightSyntax)
+                for relation in relations
+            ),
+            f"[{Colors.textMuted.hex}]were deleted[/]",
+        ])
     
     def formatExpressions(self, exprs: Iterable[sympy.Expr], *, highlightSyntax: bool = False):
         return self._formatLines([
@@ -141,6 +151,12 @@ class TextRenderer:
                 else aliasStr
         ]))
     
+    def formatNumericMode(self, isEnabled: bool):
+        modeStr = "on" if isEnabled else "off"
+        return self._formatLines([
+            f"[{Colors.textMuted.hex}]Numeric solving turned {modeStr}[/]",
+        ])
+    
     def formatException(self, exception: Exception, *, withErrorHeader: bool):
         if isinstance(exception, TracebackException):
             assert len([
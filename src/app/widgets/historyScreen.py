@@ -6,7 +6,7 @@ from textual.reactive import var
 from textual.screen import Screen
 from textual.containers import VerticalScroll, Horizontal, HorizontalScroll
 from textual.widget import Widget
-from textual.widgets import Button, Label
+from textual.widgets import Button, Label, Checkbox
 
 from src.algebrasolver.solver import Relation
 from src.app.textRenderer import TextRenderer
@@ -35,6 +35,17 @@ class HistoryScreen(Screen):
             background: {Colors.fillPlain.hex};
         }}
 
+        HistoryScreen #topBar {{
+            height: auto;
+        }}
+
+        HistoryScreen #deleteSelectedButton {{
+            min-width: 18;
+            height: 3;
+            margin: 2 3;
+            background: {Colors.fillRed.hex};
+        }}
+
         HistoryScreen .emptyState {{
             color: {Colors.textMuted.hex};
             height: 9;
@@ -54,7 +65,9 @@ class HistoryScreen(Screen):
     def compose(self):
         assert self.relations is not None
         with VerticalScroll(id = 'mainContainer'):
-            yield Button("← Back", id = 'backButton')
+            with Horizontal(id = 'topBar'):
+                yield Button("← Back", id = 'backButton')
+                yield Button("Delete selected", id = 'deleteSelectedButton')
             anyRelations = False
             for relation in self.relations:
                 anyRelations = True
@@ -67,6 +80,26 @@ class HistoryScreen(Screen):
     def goBack(self):
         self.dismiss()
 
+    @on(Button.Pressed, '#deleteSelectedButton')
+    def deleteSelectedRelations(self):
+        assert type(self.app) is lazyImportSolverProApp()
+
+        selectedRows = [
+            row
+            for row in self.query(RelationEditRow)
+            if row.isSelected
+        ]
+        if len(selectedRows) == 0:
+            return
+        
+        # (all selected relations are deleted at once, so values are only
+        # re-inferred a single time)
+        deletedRelations = self.app.deleteRelations(row.relation for row in selectedRows)
+        noErrorsHappened = deletedRelations is not None
+        if noErrorsHappened:
+            for row in selectedRows:
+                row.add_class('hidden')
+
 
 class RelationEditRow(Widget):
     DEFAULT_CSS = f"""
@@ -94,6 +127,11 @@ class RelationEditRow(Widget):
             content-align: left middle;
         }}
 
+        RelationEditRow Checkbox {{
+            height: 100%;
+            margin: 0 1;
+        }}
+
         RelationEditRow Input {{
             width: 100%;
             height: 1fr;
@@ -145,6 +183,7 @@ class RelationEditRow(Widget):
         renderer = self.app.textRenderer
 
         with Horizontal(id = 'staticGroup'):
+            yield Checkbox()
             with HorizontalScroll():
                 yield Label(self.relationStr(True))
             yield Button("Edit", id = 'edit')
@@ -155,6 +194,10 @@ class RelationEditRow(Widget):
             yield Button("Cancel", id = 'cancel')
             yield Button("Save", id = 'save')
 
+    @property
+    def isSelected(self):
+        return not self.has_class('hidden') and self.query_one(Checkbox).value
+
     def relationStr(self, highlightSyntax: bool):
         assert self.relation is not None
         assert type(self.app) is lazyImportSolverProApp()
@@ -1,7 +1,8 @@
+from typing import Iterable
 from threading import Timer
 
 import sympy
-from textual import on
+from textual import on, work
 from textual.events import Key
 from textual.app import App
 from textual.reactive import var
@@ -10,7 +11,8 @@ from textual.containers import Horizontal, Vertical
 from textual.widgets import RichLog, Button, Label
 
 from src.common.functions import first, getVersion
-from src.app.appDriver import AppDriver, Command
+from src.app.appDriver import AppDriver, Command, ProcessResult
+from src.app.sessionStore import SessionStore
 from src.app.widgets.appHeader import AppHeader
 from src.app.widgets.coloredInput import ColoredInput
 from src.app.widgets.termTipModal import TermTipModal
@@ -21,6 +23,7 @@ from src.app.termTips import TermTips
 from src.app.textRenderer import TextRenderer
 from src.parsing.parser import AliasTemplate
 from src.algebrasolver.solver import Relation
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool
 
 
 class MainScreen(Screen):
@@ -38,6 +41,12 @@ class MainScreen(Screen):
         MainScreen Input.highlighted .input--placeholder {{
             background: {Colors.fillBright.hex};
         }}
+        MainScreen Input.solving {{
+            border: tall {Colors.textYellow.hex};
+        }}
+        MainScreen Input.solving .input--placeholder {{
+            color: {Colors.textYellow.hex};
+        }}
 
         MainScreen #rightSection {{
             min-width: 16;
@@ -71,7 +80,13 @@ class MainScreen(Screen):
         }}
     """
 
+    BINDINGS = [
+        ('escape', 'cancelCommand', 'Cancel command'),
+    ]
+
     inputTimer: var[Timer | None] = var(None)
+    # (commands are processed in the background, one at a time)
+    isSolving: var[bool] = var(False)
 
     def compose(self):
         yield AppHeader()
@@ -91,9 +106,19 @@ class MainScreen(Screen):
 
     def on_mount(self):
         self.app.title = f"--- Solver Pro {getVersion()} ---"
+        assert type(self.app) is SolverProApp
+        renderer = self.app.textRenderer
+        # (inputs from the last session that couldn't be replayed aren't part
+        # of this one, so the user should know about them)
+        for (commandStr, error) in self.app.driver.restoreErrors:
+            self.writeToLogger(commandStr, False, renderer.formatException(error, withErrorHeader = True))
 
     @on(ColoredInput.Submitted)
     def runCommand(self, event: ColoredInput.Submitted):
+        if self.isSolving:
+            self.app.bell()
+            return
+
         input = event.input
         commandStr = input.value.strip()
         input.value = ""
@@ -101,9 +126,19 @@ class MainScreen(Screen):
         if self.inputTimer is not None:
             self.inputTimer.cancel()
 
+        self.isSolving = True
+        assert type(self.app) is SolverProApp
+        # (reset here instead of in the background, where an escape pressed
+        # before the command got started would be reset (and lost) too)
+        self.app.driver.resetCancellation()
+        self.processCommandInBackground(commandStr)
+
+    @work(thread = True, exclusive = True, group = 'command')
+    def processCommandInBackground(self, commandStr: str):
+        # (this runs in a separate thread, so the app doesn't freeze while
+        # the command is solved; the results are shown back in the app's thread)
         assert type(self.app) is SolverProApp
         driver = self.app.driver
-        renderer = self.app.textRenderer
         try:
             # only single lines are accepted for now;
             # `renderer` (for exceptions) can't handle multiple lines yet,
@@ -111,6 +146,14 @@ class MainScreen(Screen):
             # third of four lines still actually executes the first two)
             driver.validateSingleLine(commandStr)
             result = first(tuple(driver.processCommandLines(commandStr)))
+            self.app.call_from_thread(self.showCommandResult, commandStr, result)
+        except Exception as error:
+            self.app.call_from_thread(self.showCommandError, commandStr, error)
+
+    def showCommandResult(self, commandStr: str, result: ProcessResult):
+        assert type(self.app) is SolverProApp
+        renderer = self.app.textRenderer
+        try:
             if result.type is Command.EMPTY:
                 self.writeSpacerToLogger()
 
@@ -140,15 +183,52 @@ class MainScreen(Screen):
                     renderer.formatAliasTemplate(aliasTemplate, highlightSyntax = True)
                 )
 
+            elif result.type is Command.SET_NUMERIC_MODE:
+                isEnabled = result.data
+                assert type(isEnabled) is bool
+                self.writeToLogger(
+                    commandStr,
+                    True,
+                    renderer.formatNumericMode(isEnabled)
+                )
+
             else:
                 raise NotImplementedError(f"Command result of type {result.type} not implemented")
         
         except Exception as error:
-            self.writeToLogger(commandStr, False, renderer.formatException(error, withErrorHeader = True))
-        
+            self.showCommandError(commandStr, error)
+            return
+        self.finishCommand()
+
+    def showCommandError(self, commandStr: str, error: Exception):
+        assert type(self.app) is SolverProApp
+        renderer = self.app.textRenderer
+        self.writeToLogger(commandStr, False, renderer.formatException(error, withErrorHeader = True))
+        self.finishCommand()
+
+    def finishCommand(self):
+        self.isSolving = False
+        assert type(self.app) is SolverProApp
+        # (so a cancelled command doesn't also cancel editing relations in
+        # the history screen)
+        self.app.driver.resetCancellation()
+        input = self.query_one(MainInput)
         self.inputTimer = Timer(0.1, lambda: input.remove_class('highlighted'))
         self.inputTimer.start()
 
+    def watch_isSolving(self, isSolving: bool):
+        input = self.query_one(MainInput)
+        input.set_class(isSolving, 'solving')
+        input.placeholder = " < Solving... (esc to cancel) >" if isSolving \
+            else " < Command >"
+
+    def action_cancelCommand(self):
+        if self.isSolving:
+            assert type(self.app) is SolverProApp
+            # (the command stops at its next checkpoint, and its error is
+            # shown like any other)
+            self.app.driver.cancelCommand()
+
     def writeToLogger(self, commandStr: str, commandSucceeded: bool, formattedStr: str, *, highlightSyntax: bool = True):
         assert type(self.app) is SolverProApp
         renderer = self.app.textRenderer
@@ -178,6 +258,10 @@ class MainScreen(Screen):
     @on(Button.Pressed, '#historyButton')
     def openHistoryScreen(self):
         assert type(self.app) is SolverProApp
+        if self.isSolving:
+            # (relations can't be changed while a command is changing them)
+            self.app.bell()
+            return
         relations_newestFirst = reversed(self.app.driver.getRelations())
         self.app.push_screen(HistoryScreen(relations_newestFirst))
 
@@ -202,6 +286,11 @@ class SolverProApp(App):
 
     mainScreen: var[MainScreen] = var(lambda: MainScreen())
 
+    def __init__(self, sessionStore: SessionStore | None = None, *, timeLimitedPool: TimeLimitedPool | None = None, maxWorkers: int = 0):
+        super().__init__()
+        if sessionStore is not None or timeLimitedPool is not None or maxWorkers > 0:
+            self.driver = AppDriver(sessionStore, timeLimitedPool = timeLimitedPool, maxWorkers = maxWorkers)
+
     def on_mount(self):
         self.textRenderer.useAliasProvider(self.driver)
         self.push_screen(self.mainScreen)
@@ -254,6 +343,27 @@ class SolverProApp(App):
                 highlightSyntax = False,
             )
             return None
+
+    def deleteRelations(self, relations: Iterable[Relation]):
+        relations = tuple(relations)
+        deletedRelationsStr = f"[{Colors.textMuted.hex}]<[/]delete {len(relations)} relations[{Colors.textMuted.hex}]>[/]"
+        try:
+            self.driver.deleteRelations(relations)
+            self.mainScreen.writeToLogger(
+                deletedRelationsStr,
+                True,
+                self.textRenderer.formatRelationsDeleted(relations, highlightSyntax = True),
+                highlightSyntax = False,
+            )
+            return relations
+        except Exception as exception:
+            self.mainScreen.writeToLogger(
+                deletedRelationsStr,
+                False,
+                self.textRenderer.formatException(exception, withErrorHeader = True),
+                highlightSyntax = False,
+            )
+            return None
         
 
 class MainInput(ColoredInput):
@@ -0,0 +1,106 @@
+from typing import Iterable, TypeVar
+
+import sympy
+
+
+_ExpressionType = TypeVar("_ExpressionType")
+
+class ExpressionStore:
+    """
+    An interning ("hash-consing") store for `sympy` expressions. Structurally
+    equal expressions are built over and over again all across Solver Pro; the
+    parser builds the members of every expression list each time one is looked
+    up, every `Relation` builds its own `left - right`, and the substituter
+    builds a fresh expression for every combination it substitutes, even though
+    most of them come out exactly the same:
+
+    ```raw
+    a^2 = 16
+    b = a/2
+    (a + b).subs(...)   -->  -6, 6, -6, 6, ...
+    ```
+
+    Each `AlgebraSolver` has a store of its own, and only the expressions it
+    keeps (relations as they are recorded, and values as they are written to
+    its `SymbolsDatabase`) are put in it with `intern()`, which gives back one
+    canonical object for all the expressions that are equal to it. Everything
+    else (like substitution results) is only looked up with `lookup()`, so
+    expressions that are only needed for a moment never pile up in the store,
+    but ones equal to a kept expression still end up as the same object. Code
+    comparing them can then check `is` before falling back on a (much slower)
+    structural comparison.
+
+    `sympy` expressions can't be referenced weakly (so a `WeakValueDictionary`
+    can't hold them), so the solver tells the store what it still keeps
+    instead: `retainOnly()` evicts every other expression. The solver does this
+    once its changes are done (and only every so often, once the store has
+    doubled in size since the last time; see `needsSweep`). Hits and misses
+    are counted the same way `SolveSetCache` counts them.
+    """
+
+    def __init__(self, *, minSweepSize: int = 1024):
+        assert minSweepSize > 0, "Store must be able to hold at least one expression"
+        self.minSweepSize = minSweepSize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._expressions: dict[sympy.Basic, sympy.Basic] = dict()
+        self._nextSweepSize = minSweepSize
+
+    def __len__(self):
+        return len(self._expressions)
+
+    def __contains__(self, expression: sympy.Basic):
+        return expression in self._expressions
+
+    @property
+    def hitRate(self):
+        numLookups = self.hits + self.misses
+        if numLookups == 0:
+            return 0.0
+        return self.hits / numLookups
+
+    @property
+    def needsSweep(self):
+        return len(self._expressions) >= self._nextSweepSize
+
+    def intern(self, expression: _ExpressionType) -> _ExpressionType:
+        """Gives the canonical object for the expression (which is the expression itself the first time it's seen)"""
+
+        if not isinstance(expression, sympy.Basic):
+            return expression
+
+        canonicalExpression = self._expressions.get(expression)
+        if canonicalExpression is not None:
+            self.hits += 1
+            return canonicalExpression # type: ignore
+
+        self.misses += 1
+        self._expressions[expression] = expression
+        return expression
+
+    def lookup(self, expression: _ExpressionType) -> _ExpressionType:
+        """Gives the canonical object for the expression if the store has one, or the expression itself (without keeping it) if it doesn't"""
+
+        if not isinstance(expression, sympy.Basic):
+            return expression
+
+        canonicalExpression = self._expressions.get(expression)
+        if canonicalExpression is None:
+            self.misses += 1
+            return expression
+        self.hits += 1
+        return canonicalExpression # type: ignore
+
+    def retainOnly(self, expressions: Iterable[sympy.Basic]):
+        """Evicts every expression except the given ones"""
+
+        retainedExpressions = {
+            expression: canonicalExpression
+            for expression in expressions
+            for canonicalExpression in [self._expressions.get(expression)]
+            if canonicalExpression is not None
+        }
+        self.evictions += len(self._expressions) - len(retainedExpressions)
+        self._expressions = retainedExpressions
+        self._nextSweepSize = max(self.minSweepSize, 2 * len(self._expressions))
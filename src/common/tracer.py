@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+import time
+
+
+class Span:
+    """
+    A single timed piece of work, started when its `with` block is entered and
+    finished when it is exited. Sizes of the work (like how many relations were
+    scanned) can be given when the span is made, or added along the way with
+    `set()`.
+    """
+
+    __slots__ = ("name", "args", "_tracer", "_startTime")
+
+    def __init__(self, tracer: "Tracer", name: str, args: dict):
+        self.name = name
+        self.args = args
+        self._tracer = tracer
+        self._startTime = 0
+
+    def set(self, **args):
+        self.args.update(args)
+
+    def __enter__(self):
+        self._startTime = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        endTime = time.perf_counter_ns()
+        self._tracer._recordSpan(self, self._startTime, endTime)
+
+
+class _NullSpan:
+    # (handed out when tracing is off, so the only cost of a span is the call
+    # that makes it)
+    __slots__ = ()
+
+    def set(self, **args):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        pass
+
+_nullSpan = _NullSpan()
+
+
+class Tracer:
+    """
+    Records nested, timed "spans" of work, so it's possible to see where the
+    time went when something is slow. Spans are made with `with` blocks, and
+    nest however the blocks do:
+
+    ```raw
+    with tracer.span("recordRelations", relations = 3):
+        with tracer.span("findSolveOrder", relations = 12) as span:
+            ...
+            span.set(symbols = 2)
+    ```
+
+    Tracing is off until `enable()` is called, and while it's off, `span()`
+    gives back a shared do-nothing span (so leaving spans in even the busiest
+    parts of the solver costs next to nothing). Recorded spans can be exported
+    as Chrome trace events (see `exportChromeTrace()`), which can be opened in
+    trace viewers like Perfetto or `chrome://tracing`.
+
+    Spans around lazily consumed work (like a generator) are timed from the
+    first item to the last, so they also include whatever the consumer did in
+    between.
+    """
+
+    def __init__(self):
+        self.isEnabled = False
+        self._events: list[dict] = list()
+        self._originTime = time.perf_counter_ns()
+
+    def enable(self):
+        self.isEnabled = True
+
+    def disable(self):
+        self.isEnabled = False
+
+    def clear(self):
+        self._events = list()
+        self._originTime = time.perf_counter_ns()
+
+    def span(self, name: str, **args):
+        if not self.isEnabled:
+            return _nullSpan
+        return Span(self, name, args)
+
+    def getSpans(self):
+        """Gives `(name, durationSeconds, args)` for every finished span, in the order they finished"""
+
+        return tuple(
+            (event["name"], event["dur"] / 1e6, event["args"])
+            for event in self._events
+        )
+
+    def exportChromeTrace(self):
+        return {
+            "traceEvents": list(self._events),
+            "displayTimeUnit": "ms",
+        }
+
+    def writeChromeTrace(self, path: str):
+        with open(path, "w", encoding = "utf-8") as traceFile:
+            json.dump(self.exportChromeTrace(), traceFile)
+
+    def _recordSpan(self, span: Span, startTime: int, endTime: int):
+        # ("complete" events; times are in microseconds)
+        self._events.append({
+            "name": span.name,
+            "ph": "X",
+            "ts": (startTime - self._originTime) / 1000,
+            "dur": (endTime - startTime) / 1000,
+            "pid": os.getpid(),
+            "tid": threading.get_ident(),
+            "args": span.args,
+        })
+
+
+# (shared by everything that traces, so one trace shows the whole pipeline)
+tracer = Tracer()
@@ -388,6 +388,24 @@ class CommandParserSequencer(Sequencer):
         if commandName == "simplify":
             expression = self.sequenceExpression()
             return Command.simplifyExpression(expression)
+        
+        elif commandName == "numeric":
+            # branch: IDENTIFIER(on/off) (turns numeric mode on/off for the session)
+            isModeSwitch = self._currToken.type is LexerTokenTypes.IDENTIFIER and \
+                self._currToken.match.lower() in ("on", "off") and \
+                (self.numTokensParsed + 1) < len(self._tokens) and \
+                self._tokens[self.numTokensParsed + 1].type is LexerTokenTypes.EOL
+            if isModeSwitch:
+                isEnabled = self._currToken.match.lower() == "on"
+                self._consumeCurrToken(LexerTokenTypes.IDENTIFIER)
+                return Command.setNumericMode(isEnabled)
+            
+            # branch: relations (solved numerically for just this command)
+            relations = self.sequenceRelations()
+            if len(relations) < 2:
+                self._throwUnexpectedToken((LexerTokenTypes.EQUALS,))
+            return Command.recordRelationsNumerically(relations)
+        
         else:
             raise UnknownCommandException(self._tokens, commandTokenIdx)
     
@@ -53,9 +53,11 @@ class CommandType(EnumString):
 class Command(Enum):
     EMPTY = CommandType("EMPTY")
     RECORD_RELATIONS = CommandType("RECORD_RELATIONS")
+    RECORD_RELATIONS_NUMERICALLY = CommandType("RECORD_RELATIONS_NUMERICALLY")
     EVALUATE_EXPRESSION = CommandType("EVALUATE_EXPRESSION")
     SIMPLIFY_EXPRESSION = CommandType("SIMPLIFY_EXPRESSION")
     RECORD_ALIAS = CommandType("RECORD_ALIAS")
+    SET_NUMERIC_MODE = CommandType("SET_NUMERIC_MODE")
 
     def __init__(self, commandType: CommandType, data):
         self.type = commandType
@@ -75,6 +77,10 @@ class Command(Enum):
     def recordRelations(cls, relations: list[sympy.Expr]):
         return cls(cls.RECORD_RELATIONS, relations)
     
+    @classmethod
+    def recordRelationsNumerically(cls, relations: list[sympy.Expr]):
+        return cls(cls.RECORD_RELATIONS_NUMERICALLY, relations)
+    
     @classmethod
     def evaluateExpression(cls, expression: sympy.Expr):
         return cls(cls.EVALUATE_EXPRESSION, expression)
@@ -87,6 +93,10 @@ class Command(Enum):
     def recordAlias(cls, aliasTemplate: tuple[str, tuple[str, ...], str]):
         return cls(cls.RECORD_ALIAS, aliasTemplate)
     
+    @classmethod
+    def setNumericMode(cls, isEnabled: bool):
+        return cls(cls.SET_NUMERIC_MODE, isEnabled)
+    
 
 class ParseException(TracebackException):
     def __init__(self, expectedTypes: tuple[LexerTokenType, ...], tokens: tuple[LexerToken, ...], unexpectedTokenIdx: int):
@@ -0,0 +1,74 @@
+import ast
+
+import sympy
+
+
+# everything `srepr()` can write out: sympy's classes (like `Symbol`, `Add`,
+# `Float`, and ones only used inside others, like `ExprCondPair`) and its
+# singletons (like `pi`, `oo`, `true`)
+_sreprNames: dict[str, object] = {
+    name: value
+    for (name, value) in vars(sympy).items()
+    if (isinstance(value, type) and issubclass(value, sympy.Basic)) or isinstance(value, sympy.Basic)
+}
+_basicTypesToCheck: list[type] = [sympy.Basic]
+while len(_basicTypesToCheck) > 0:
+    _basicType = _basicTypesToCheck.pop()
+    _sreprNames.setdefault(_basicType.__name__, _basicType)
+    _basicTypesToCheck.extend(_basicType.__subclasses__())
+
+
+class SreprParseError(ValueError):
+    """Raised when a string given to `parseSrepr()` isn't something `srepr()` would write"""
+
+
+def parseSrepr(sreprStr: str) -> sympy.Basic:
+    """
+    Gives back the expression a `sympy.srepr()` string was made from. Unlike
+    `sympy.sympify()` (or `eval()`), nothing in the string is ever run as code;
+    it is parsed into a syntax tree, and only plain values and calls to sympy's
+    own classes are allowed in it:
+
+    ```raw
+    Add(Symbol('x'), Integer(2))            (gives x + 2)
+    Mul(Float('1.5', precision=53), pi)     (gives 1.5*pi)
+    __import__('os').system('...')          (raises SreprParseError)
+    ```
+
+    This is what session files are read with, since anyone could have written
+    them.
+    """
+
+    try:
+        tree = ast.parse(sreprStr, mode = "eval")
+    except SyntaxError as exception:
+        raise SreprParseError(f"Not an srepr() string: {sreprStr!r}") from exception
+    result = _evaluateNode(tree.body)
+    if not isinstance(result, sympy.Basic):
+        raise SreprParseError(f"Not an srepr() string of an expression: {sreprStr!r}")
+    return result
+
+def _evaluateNode(node: ast.AST):
+    if type(node) is ast.Constant and type(node.value) in (str, int, float, bool, type(None)):
+        return node.value
+    elif type(node) is ast.Name and node.id in _sreprNames:
+        return _sreprNames[node.id]
+    elif type(node) is ast.UnaryOp and type(node.op) is ast.USub:
+        # (like `-oo`)
+        return -_evaluateNode(node.operand) # type: ignore
+    elif type(node) is ast.Tuple:
+        return tuple(_evaluateNode(element) for element in node.elts)
+    elif type(node) is ast.List:
+        return [_evaluateNode(element) for element in node.elts]
+    elif type(node) is ast.Call and type(node.func) is ast.Name and isinstance(_sreprNames.get(node.func.id), type):
+        constructor = _sreprNames[node.func.id]
+        args = [_evaluateNode(arg) for arg in node.args]
+        kwargs = {
+            keyword.arg: _evaluateNode(keyword.value)
+            for keyword in node.keywords
+            if keyword.arg is not None
+        }
+        if len(kwargs) != len(node.keywords):
+            raise SreprParseError("srepr() strings never unpack keyword arguments")
+        return constructor(*args, **kwargs) # type: ignore
+    raise SreprParseError(f"srepr() strings never have {ast.dump(node)} in them")
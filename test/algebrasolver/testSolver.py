@@ -1,8 +1,25 @@
+import operator
+import os
+import time
+
+import pytest
 import sympy
 
 from src.common.functions import runForError
-from src.common.sympyLinterFixes import createSymbol
-from src.algebrasolver.solver import AlgebraSolver, ConditionalValue, Relation, ContradictionException, NoSolutionException
+from src.common.sympyLinterFixes import createSymbol, solveSet
+from src.common.expressionStore import ExpressionStore
+from src.common.tracer import tracer
+from src.algebrasolver.solver import AlgebraSolver, ConditionalValue, Relation, ContradictionException, NoSolutionException, SolveTimeLimitException, SimplifyTimeLimitException, CancelledException
+from src.algebrasolver.solveSetCache import SolveSetCache
+from src.algebrasolver.polynomialRootFinder import PolynomialRootFinder
+from src.algebrasolver.linearFamilySolver import LinearFamilySolver
+from src.algebrasolver.numericRootFinder import NumericRootFinder
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool, TimeLimitExceeded, WorkerFailure
+from src.algebrasolver.symbolsDatabase import SymbolsDatabase, LazyValues
+from src.algebrasolver.combinationsSubstituter import CombinationsSubstituter, numpy
+from src.algebrasolver.undoLog import UndoLog
+from src.algebrasolver.inferenceOrderSolver import InferenceOrderSolver
+from src.algebrasolver.matchingOrderSolver import MatchingOrderSolver
 
 
 class AlgebraSolverTester:
@@ -228,6 +245,18 @@ class AlgebraSolverTester:
         ), "Solver should preserve relations in order of recording (case 2)"
         assert solver.getRelationsWithSymbol(sympy.parse_expr("nonexistant")) == tuple()
 
+        solver.beginTransaction()
+        solver.popRelation(Relation(sympy.parse_expr("a + d"), 14)) # type: ignore
+        assert solver.getRelationsWithSymbol(sympy.parse_expr("a")) == tuple(), "Solver did not forget popped relation"
+        assert solver.getRelationsWithSymbol(sympy.parse_expr("d")) == (
+            Relation(sympy.parse_expr("2*c - d"), 9), # type: ignore
+        ), "Solver did not forget popped relation"
+        solver.rollbackTransaction()
+        assert solver.getRelationsWithSymbol(sympy.parse_expr("d")) == (
+            Relation(sympy.parse_expr("a + d"), 14), # type: ignore
+            Relation(sympy.parse_expr("2*c - d"), 9), # type: ignore
+        ), "Solver should preserve relations in order of recording after rolling back"
+
     def testCatchesRedundantRelations(self):
         solver1 = AlgebraSolver()
         
@@ -477,6 +506,714 @@ class AlgebraSolverTester:
             ConditionalValue(sympy.parse_expr("y"), dict()),
         }, "Solver should forget inferred values after finding an unsolvable variable"
 
+    def testCachesSolutions(self):
+        solver = AlgebraSolver()
+        (a, b, x, y) = sympy.symbols("a, b, x, y")
+
+        solver.recordRelation(Relation(a**2, 16)) # type: ignore
+        solver.recordRelation(Relation(b, a / 2)) # type: ignore
+        numMisses = solver._solveSetCache.misses
+        solver.popRelation(Relation(a**2, 16)) # type: ignore
+        solver.recordRelation(Relation(a**2, 16)) # type: ignore
+        assert solver._solveSetCache.misses == numMisses, "Solver re-solved relations it already solved"
+        assert solver._solveSetCache.hits > 0
+        assert solver.substituteKnownsFor(b) == {-2, 2}
+
+        assert solver._solveSetCache.solve(-2*x - 4, x) == {-2} # type: ignore
+        numHits = solver._solveSetCache.hits
+        assert solver._solveSetCache.solve(x + 2, x) == {-2} # type: ignore
+        assert solver._solveSetCache.hits == numHits + 1, "Cache did not share solutions for expressions that only differ by a constant factor"
+
+        solver.recordRelation(Relation(x / (y - 2), 6)) # type: ignore
+        for attempt in range(2):
+            error = runForError(lambda: solver.recordRelation(Relation(y, 2))) # type: ignore
+            assert type(error) is NoSolutionException, "Cached empty solutions did not raise the same exception"
+        assert solver.substituteKnownsFor(y) == {y}
+
+        cache = SolveSetCache(maxSize = 2)
+        cache.solve(x - 1, x)
+        cache.solve(x - 2, x)
+        cache.solve(x - 1, x)
+        cache.solve(x - 3, x)
+        assert len(cache) == 2
+        cache.solve(x - 1, x)
+        assert (cache.hits, cache.misses) == (2, 3), "Cache did not forget the least recently used solution"
+
+    def testFindsPolynomialRoots(self):
+        (x, y) = sympy.symbols("x, y")
+
+        for polynomial in [
+            x**2 - 4,
+            x**2 + x + 1,
+            x**2 + sympy.sqrt(2)*x - 1,
+            x**2 + sympy.I*x + 2,
+            sympy.Float(1.5)*x**2 - sympy.Float(0.3),
+            x**3 - 6*x**2 + 11*x - 6,
+            x**4 + 1,
+        ]:
+            assert PolynomialRootFinder(polynomial, x).findRoots() == solveSet(polynomial, x), \
+                "Polynomial roots did not match what solveset() finds"
+        
+        for nonPolynomial in [
+            x**3 + x + 1,   # (needs the cubic formula)
+            x**5 - x - 1,
+            x*y - 3,
+            1/x + 1,
+            sympy.exp(x) - 2,
+        ]:
+            assert PolynomialRootFinder(nonPolynomial, x).findRoots() is None
+
+    def testSolvesNumerically(self):
+        (x, y, z) = sympy.symbols("x, y, z")
+
+        assert NumericRootFinder(sympy.cos(x) - x, x).findRoots() == sympy.FiniteSet(sympy.Float("0.739085133215161", 15))
+        assert NumericRootFinder(x**5 - x - 1, x, 30).findRoots() == sympy.FiniteSet(sympy.Float("1.16730397826141868425604589985", 30))
+        assert NumericRootFinder(sympy.exp(x) + 1, x).findRoots() == sympy.EmptySet
+        assert NumericRootFinder(x*y - sympy.exp(x), x).findRoots() is None
+
+        solver = AlgebraSolver()
+        xRelation = Relation(x*sympy.exp(x), 3)
+        error = runForError(lambda: solver.recordRelation(xRelation))
+        assert type(error) is NotImplementedError, \
+            "Solver solved a relation numerically without being asked to"
+        assert solver.getRelations() == ()
+
+        solver.recordRelations([xRelation], numeric = True)
+        assert solver.substituteKnownsFor(x) == {sympy.Float("1.04990889496404", 15)}
+
+        # (numeric values are checked against other relations with some tolerance)
+        assert solver.recordRelation(Relation(3*sympy.exp(-x), x)) is True
+        error = runForError(lambda: solver.recordRelation(Relation(x, 1)))
+        assert type(error) is ContradictionException
+
+        # (relations recorded numerically can still be solved again later)
+        yRelation = Relation(y, x)
+        solver.recordRelation(yRelation)
+        solver.recordRelations([Relation(z*sympy.exp(z), y + 2)], numeric = True)
+        solver.popRelation(yRelation)
+        assert solver.substituteKnownsFor(z) == {z}
+        solver.recordRelation(yRelation)
+        assert solver.substituteKnownsFor(z) == {sympy.Float("1.05837603179949", 15)}
+
+        numericSolver = AlgebraSolver()
+        numericSolver.setNumericMode(True, precision = 30)
+        numericSolver.recordRelation(Relation(sympy.exp(x), 2 - x))
+        assert numericSolver.substituteKnownsFor(x) == {sympy.Float("0.442854401002388583141327999999", 30)}
+
+    def testSolvesLinearFamiliesAllAtOnce(self):
+        (a, b, c, x) = sympy.symbols("a, b, c, x")
+
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(x, 5)) # type: ignore
+        solver.recordRelation(Relation(a + b + x, 4)) # type: ignore
+        familySolver = LinearFamilySolver(
+            [(a, Relation(a - b, 2)), (b, Relation(a + b + x, 4))], # type: ignore
+            solver._symbolValuesDatabase,
+        )
+        assert familySolver.solve() == [
+            (a, {ConditionalValue(sympy.Rational(1, 2), {b: sympy.Rational(-3, 2)})}, Relation(a - b, 2)), # type: ignore
+            (b, {ConditionalValue(sympy.Rational(-3, 2), {x: 5})}, Relation(a + b + x, 4)), # type: ignore
+        ], "Linear family solutions did not have the same conditions back substitution would give"
+
+        solver.recordRelation(Relation(a - b, 2)) # type: ignore
+        assert solver.substituteKnownsFor(a) == {sympy.Rational(1, 2)}
+        assert solver.substituteKnownsFor(b) == {sympy.Rational(-3, 2)}
+
+        for nonLinearFamily in [
+            [(a, Relation(a * b, 2)), (b, Relation(a + b, 3))],
+            [(a, Relation(a - b, sympy.sqrt(2))), (b, Relation(a + b, 3))],
+            [(a, Relation(a - b, 2)), (b, Relation(2*a - 2*b, 4))],
+        ]:
+            assert LinearFamilySolver(nonLinearFamily, SymbolsDatabase()).solve() is None # type: ignore
+
+    def testRollsBackTransactions(self):
+        solver = AlgebraSolver()
+
+        solver.recordRelation(Relation(sympy.parse_expr("a + b"), 5)) # type: ignore
+
+        solver.beginTransaction()
+        solver.recordRelation(Relation(sympy.parse_expr("a"), 2)) # type: ignore
+        assert solver.substituteKnownsFor(sympy.parse_expr("b")) == {3}
+        solver.rollbackTransaction()
+
+        assert solver.getRelations() == (
+            Relation(sympy.parse_expr("a + b"), 5), # type: ignore
+        ), "Solver did not forget relations recorded during a rolled back transaction"
+        assert solver.substituteKnownsFor(sympy.parse_expr("a")) == {sympy.parse_expr("a")}
+        assert solver.substituteKnownsFor(sympy.parse_expr("b")) == {sympy.parse_expr("b")}, \
+            "Solver did not forget values inferred during a rolled back transaction"
+        
+        solver.recordRelation(Relation(sympy.parse_expr("a"), 2)) # type: ignore
+        solver.beginTransaction()
+        solver.popRelation(Relation(sympy.parse_expr("a"), 2)) # type: ignore
+        assert solver.substituteKnownsFor(sympy.parse_expr("b")) == {sympy.parse_expr("b")}
+        solver.beginTransaction()
+        solver.recordRelation(Relation(sympy.parse_expr("b"), 4)) # type: ignore
+        solver.commitTransaction()
+        assert solver.substituteKnownsFor(sympy.parse_expr("a")) == {1}
+        solver.rollbackTransaction()
+
+        assert solver.getRelations() == (
+            Relation(sympy.parse_expr("a + b"), 5), # type: ignore
+            Relation(sympy.parse_expr("a"), 2), # type: ignore
+        ), "Solver did not restore popped relations (in order) after rolling back nested transactions"
+        assert solver.substituteKnownsFor(sympy.parse_expr("a")) == {2}
+        assert solver.substituteKnownsFor(sympy.parse_expr("b")) == {3}, \
+            "Solver did not restore forgotten values after rolling back nested transactions"
+
+    def testRecordsRelationsInBatches(self):
+        solver = AlgebraSolver()
+        (a, b, c, x) = sympy.symbols("a, b, c, x")
+
+        isRedundantFlags = solver.recordRelations([
+            Relation(a * b, 6), # type: ignore
+            Relation(a + c, 5), # type: ignore
+            Relation(a, 2), # type: ignore
+            Relation(b, 3), # type: ignore
+        ])
+        assert isRedundantFlags == [True, False, False, False], \
+            "Solver did not judge redundancy against the whole batch"
+        assert solver.getRelations() == (
+            Relation(a * b, 6), # type: ignore
+            Relation(a + c, 5), # type: ignore
+            Relation(a, 2), # type: ignore
+            Relation(b, 3), # type: ignore
+        ), "Solver did not record batched relations in order"
+        assert solver._recordedRelationsSorted == [
+            Relation(a, 2), # type: ignore
+            Relation(b, 3), # type: ignore
+            Relation(a * b, 6), # type: ignore
+            Relation(a + c, 5), # type: ignore
+        ], "Solver did not merge batched relations into the sorted relations"
+        assert solver.substituteKnownsFor(c) == {3}
+
+        try:
+            solver.recordRelations([
+                Relation(x, 4), # type: ignore
+                Relation(c, x), # type: ignore
+            ])
+            assert False, "Solver did not detect a contradiction in a batch"
+        except ContradictionException:
+            pass
+        assert len(solver.getRelations()) == 4, "Solver did not roll back the whole batch"
+        assert solver.substituteKnownsFor(x) == {x}
+
+        solver.popRelations([
+            Relation(a, 2), # type: ignore
+            Relation(b, 3), # type: ignore
+        ])
+        assert solver.getRelations() == (
+            Relation(a * b, 6), # type: ignore
+            Relation(a + c, 5), # type: ignore
+        )
+        assert solver.substituteKnownsFor(a) == {a}
+        assert solver.substituteKnownsFor(c) == {c}, "Solver did not forget values from a batch of popped relations"
+
+        try:
+            solver.popRelations([
+                Relation(a * b, 6), # type: ignore
+                Relation(a, 2), # type: ignore
+            ])
+            assert False, "Solver popped a relation that was never recorded"
+        except ValueError:
+            pass
+        assert len(solver.getRelations()) == 2, "Solver did not roll back the whole batch of popped relations"
+
+    def testConditionalValuesAreImmutable(self):
+        (a, b) = sympy.symbols("a, b")
+        conditions = {a: 1, b: 2}
+        conditional = ConditionalValue(5, conditions) # type: ignore
+
+        conditions[a] = 3
+        assert conditional.conditions == {a: 1, b: 2}, "Conditions were changed from outside the conditional value"
+        def changeConditions():
+            conditional.conditions[a] = 3 # type: ignore
+        assert type(runForError(changeConditions)) is TypeError
+        assert type(runForError(lambda: setattr(conditional, "value", 6))) is AttributeError
+
+        sameConditional = ConditionalValue(5, {b: 2, a: 1}) # type: ignore
+        assert conditional == sameConditional and hash(conditional) == hash(sameConditional)
+        assert len({conditional, sameConditional, ConditionalValue(5, {a: 1})}) == 2 # type: ignore
+
+    def testBackSubstitutesLazily(self):
+        (a, b, c, x) = sympy.symbols("a, b, c, x")
+
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(x**2, 4)) # type: ignore
+        solver.recordRelation(Relation(a**2 + a*x, 8)) # type: ignore
+        solver.recordRelation(Relation(b + x, 1)) # type: ignore
+        database = solver._symbolValuesDatabase
+        assert not database.isResolved(a) and not database.isResolved(b), \
+            "Solver back substituted values that were never read"
+
+        solver.recordRelation(Relation(c, a + b)) # type: ignore
+        assert database.isResolved(a) and database.isResolved(b)
+        assert solver.substituteKnownsFor(c) == {1, -5, 7}
+        assert solver.getSymbolConditionalValues(b) == {
+            ConditionalValue(-1, {x: 2}), # type: ignore
+            ConditionalValue(3, {x: -2}), # type: ignore
+        }, "Lazy values were not the same as back substituting right away"
+
+        # (lazy values don't need to be worked out just to be forgotten)
+        solver.popRelation(Relation(b + x, 1)) # type: ignore
+        assert solver.substituteKnownsFor(b) == {b}
+        assert solver.substituteKnownsFor(a) == {2, -4, 4, -2}
+
+    def testSubstitutesOnlyRelevantSymbols(self):
+        (x, y) = sympy.symbols("x, y")
+        otherSymbols = sympy.symbols("s0:10")
+
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(x**2, 4)) # type: ignore
+        solver.recordRelation(Relation(y, x + 1)) # type: ignore
+        for symbol in otherSymbols:
+            solver.recordRelation(Relation(symbol**2, 1)) # type: ignore
+
+        tracer.enable()
+        try:
+            assert solver.substituteKnownsFor(y + 1) == {4, 0}
+            assert solver.substituteKnownsFor(otherSymbols[0] + otherSymbols[1]) == {-2, 0, 2}
+        finally:
+            tracer.disable()
+        substituteSpans = [args for (name, duration, args) in tracer.getSpans() if name == "substitute"]
+        tracer.clear()
+        # (only x's values (which y's are conditioned on) are combined for the
+        # first, not the 2^10 combinations of every other symbol's values)
+        assert [args["combinations"] for args in substituteSpans] == [2, 4], \
+            "Substituter combined values of symbols the expression does not depend on"
+
+    def testSubstitutesSymbolsInsideValues(self):
+        (a, b, c, d, e) = sympy.symbols("a, b, c, d, e")
+
+        # (`a` is forward solved in terms of `b` without being conditioned on
+        # it, so `b` still has to be included)
+        database = SymbolsDatabase()
+        database[b] = {ConditionalValue(sympy.Integer(3), {})}
+        database[a] = {ConditionalValue(b - 1, {})}
+        assert {conditional.value for conditional in CombinationsSubstituter({a}, database).substitute()} == {2}
+
+        # (which symbols get forward solved in terms of which depends on the
+        # order symbols come out of sets, so these only check that recording
+        # works and that whatever was inferred was fully substituted)
+        for relations in (
+            [Relation(sympy.Integer(0), a - b), Relation(a, e), Relation(sympy.Integer(6), b + e**2 + 2)],
+            [Relation(d*e - 4, 18), Relation(sympy.Integer(-1), c), Relation(a + 4*d + 1, -a), Relation(a - e, c)],
+        ):
+            solver = AlgebraSolver()
+            for relation in relations:
+                solver.recordRelation(relation) # type: ignore
+            for symbol in (a, b, d, e):
+                values = solver.substituteKnownsFor(symbol)
+                assert values == {symbol} or all(len(value.free_symbols) == 0 for value in values), \
+                    "Solver did not substitute symbols inside forward solved values"
+
+    def testSubstitutesCombinationsVectorized(self):
+        if numpy is None:
+            pytest.skip("vectorized substitution needs NumPy")
+        (x, z) = sympy.symbols("x, z")
+        xs = createSymbol("{" + ",".join(str(num) for num in range(1, 101)) + "}")
+        ys = createSymbol("{" + ",".join(str(num) for num in range(1, 11)) + "}")
+
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(z**2, 4)) # type: ignore
+        assert solver.substituteKnownsFor(xs + ys) == set(range(2, 111))
+        database = solver._symbolValuesDatabase
+        tracer.enable()
+        try:
+            for expression in (xs + ys, xs*ys/7 + z, sympy.sqrt(xs - 50) + z, sympy.log(xs)*ys):
+                assert set(CombinationsSubstituter({expression}, database, vectorize = True).substitute()) \
+                    == set(CombinationsSubstituter({expression}, database).substitute()), \
+                    "Vectorized substitution did not give the same results as substituting each combination"
+        finally:
+            tracer.disable()
+        substituteSpans = [args for (name, duration, args) in tracer.getSpans() if name == "substitute"]
+        tracer.clear()
+        assert sum(1 for args in substituteSpans if "vectorizedRows" in args) == 4, \
+            "Substitution was not vectorized"
+
+        # (the floats of these results are all the same as `ys`'s)
+        database[x] = {ConditionalValue(sympy.Integer(1), {}), ConditionalValue(1 + sympy.Rational(1, 10**20), {})}
+        for expression in (x*ys, sympy.sqrt(x)*ys):
+            assert set(CombinationsSubstituter({expression}, database, vectorize = True).substitute()) \
+                == set(CombinationsSubstituter({expression}, database).substitute()), \
+                "Vectorized substitution merged results a float can't tell apart"
+
+    def testSubstitutesValuesWithSymbolsInThem(self):
+        (a, b, x, y) = sympy.symbols("a, b, x, y")
+        database = SymbolsDatabase()
+        database[x] = {ConditionalValue(sympy.Integer(1), {}), ConditionalValue(sympy.Integer(2), {})}
+        # (like values forward solved in terms of symbols solved after them)
+        database[a] = {ConditionalValue(b - x, {x: sympy.Integer(1)}), ConditionalValue(b + x, {x: sympy.Integer(2)})}
+        database[b] = {ConditionalValue(10*x, {x: sympy.Integer(1)}), ConditionalValue(10*x, {x: sympy.Integer(2)})}
+        database[y] = {ConditionalValue(sympy.Integer(num), {}) for num in range(5)}
+
+        assert {conditional.value for conditional in CombinationsSubstituter({a*b + y}, database).substitute()} \
+            == {90 + num for num in range(5)} | {440 + num for num in range(5)}
+        assert CombinationsSubstituter({a + b, x}, database).substituteForMapping() == {
+            a + b: {ConditionalValue(19, {a: b - x, b: 10*x}), ConditionalValue(42, {a: b + x, b: 10*x})}, # type: ignore
+            x: {ConditionalValue(1, {x: 1}), ConditionalValue(2, {x: 2})}, # type: ignore
+        }
+
+    def testRanksSymbolsIncrementally(self):
+        symbols = sympy.symbols("x0:300")
+        (a, w, z) = sympy.symbols("a, w, z")
+        undoLog = UndoLog()
+        database = SymbolsDatabase(undoLog)
+        # (a deep chain, set from the end back to the start)
+        for (symbol, nextSymbol) in reversed(list(zip(symbols, symbols[1:]))):
+            database[nextSymbol] = {ConditionalValue(sympy.Integer(1), {symbol: sympy.Integer(1)})}
+        database[symbols[0]] = {ConditionalValue(sympy.Integer(1), {})}
+        assert tuple(database) == symbols, "Symbols were not ordered after the symbols they depend on"
+
+        database[a] = {ConditionalValue(sympy.Integer(2), {})}
+        orderBefore = tuple(database)
+        undoLog.begin()
+        database[w] = {ConditionalValue(sympy.Integer(5), {})}
+        database[z] = LazyValues(lambda: {ConditionalValue(sympy.Integer(3), {w: sympy.Integer(5)})}, {w})
+        database[a] = {ConditionalValue(sympy.Integer(2), {z: sympy.Integer(3)})}
+        database[symbols[0]] = {ConditionalValue(sympy.Integer(1), {a: sympy.Integer(2)})}
+        order = tuple(database)
+        assert order.index(w) < order.index(z) < order.index(a) < order.index(symbols[0])
+        assert order[-len(symbols):] == symbols, "Symbols depending on a reranked symbol were not reranked"
+        database.discard(symbols[150])
+        assert symbols[150] not in tuple(database)
+        undoLog.rollback()
+        assert tuple(database) == orderBefore, "Resolution order was not restored by rolling back"
+        assert database.copy().subset(set(symbols[:3])).__iter__().__next__() == symbols[0]
+
+        # (a symbol's rank is one more than the highest rank it depends on, and
+        # symbols of the same rank stay in the order they were set)
+        (b, c, d, e) = sympy.symbols("b, c, d, e")
+        database = SymbolsDatabase()
+        database[a] = {ConditionalValue(sympy.Integer(2), {})}
+        database[b] = {ConditionalValue(sympy.Integer(3), {})}
+        database[c] = {ConditionalValue(sympy.Integer(5), {a: sympy.Integer(2), b: sympy.Integer(3)})}
+        database[d] = {ConditionalValue(sympy.Integer(1), {a: sympy.Integer(2)})}
+        database[e] = {ConditionalValue(sympy.Integer(6), {c: sympy.Integer(5), d: sympy.Integer(1)})}
+        assert tuple(database) == (a, b, c, d, e), "Symbols were not resolved in rank order"
+        database.discard(b)
+        database[b] = {ConditionalValue(sympy.Integer(3), {})}
+        assert tuple(database) == (a, b, c, d, e)
+
+    def testSolvesIndependentFamiliesInParallel(self):
+        (a, b, x, y, z) = sympy.symbols("a, b, x, y, z")
+        relations = [
+            Relation(a**2 + a*b, 12),
+            Relation(b**2, 4),
+            Relation(x**2 - x*y, 6),
+            Relation(y**2, 1),
+            Relation(z**2, 9),
+        ]
+
+        serialSolver = AlgebraSolver()
+        serialSolver.recordRelations(relations)
+        parallelSolver = AlgebraSolver(maxWorkers = 2)
+        parallelSolver.recordRelations(relations)
+        for symbol in (a, b, x, y, z):
+            assert parallelSolver.getSymbolConditionalValues(symbol) == serialSolver.getSymbolConditionalValues(symbol), \
+                "Solving families in parallel did not give the same values as solving them serially"
+
+        error = runForError(lambda: parallelSolver.recordRelations([
+            Relation(sympy.parse_expr("c**2"), 4), # type: ignore
+            Relation(1/sympy.parse_expr("d"), 0), # type: ignore
+        ]))
+        assert type(error) is NoSolutionException, "Solver did not raise an error from a family solved in parallel"
+        assert len(parallelSolver.getRelations()) == len(relations)
+        parallelSolver.shutdown()
+
+        # (workers solve with the same time limit as the solver)
+        timeLimitedSolver = AlgebraSolver(maxWorkers = 2, timeLimit = 60)
+        timeLimitedSolver.recordRelations(relations)
+        for symbol in (a, b, x, y, z):
+            assert timeLimitedSolver.getSymbolConditionalValues(symbol) == serialSolver.getSymbolConditionalValues(symbol)
+        timeLimitedSolver._timeLimitedPool.timeLimit = 0.001
+        numTimeouts = timeLimitedSolver._timeLimitedPool.numTimeouts
+        hangingRelation = Relation(sympy.parse_expr("sqrt(d) + d**(1/3) + d**(1/5)"), 7) # type: ignore
+        error = runForError(lambda: timeLimitedSolver.recordRelations([
+            Relation(sympy.parse_expr("c**2"), 4), # type: ignore
+            hangingRelation,
+        ]))
+        assert type(error) is SolveTimeLimitException and error.contradictingRelation == hangingRelation, \
+            "Solver did not give up on a family solved in parallel"
+        # (the family that timed out in a worker isn't solved again here)
+        assert timeLimitedSolver._timeLimitedPool.numTimeouts == numTimeouts
+        timeLimitedSolver.shutdown()
+
+    def testPlansAllFamiliesAtOnce(self):
+        (a, b, c, d, e, x) = sympy.symbols("a, b, c, d, e, x")
+        relations = [
+            Relation(x**2, 9),
+            Relation(a, 2*b),
+            Relation(a + b, 6),
+            Relation(d*e, 12),
+            Relation(c, a - b),
+        ]
+        orderSolver = InferenceOrderSolver(relations, SymbolsDatabase()) # type: ignore
+        familyGroups = orderSolver.findSolveOrders()
+        # (`c` needs `a` and `b` first, and `d*e = 12` has a hole)
+        assert [
+            [sorted(str(symbol) for (symbol, relation) in family) for family in familyGroup]
+            for familyGroup in familyGroups
+        ] == [[["x"], ["a", "b"]], [["c"]]]
+        assert familyGroups[1][0] == [(c, relations[4])]
+        assert InferenceOrderSolver(relations, SymbolsDatabase()).findSolveOrder() == familyGroups[0][0] # type: ignore
+        assert InferenceOrderSolver(relations[3:4], SymbolsDatabase()).findSolveOrders() == [] # type: ignore
+
+        solver = AlgebraSolver()
+        tracer.enable()
+        try:
+            solver.recordRelations([relations[1], relations[2], relations[4]])
+        finally:
+            tracer.disable()
+        planSpans = [args for (name, duration, args) in tracer.getSpans() if name == "findSolveOrder"]
+        tracer.clear()
+        # (one pass plans everything, and one more finds there's nothing left)
+        assert planSpans == [{"relations": 3, "families": 2, "symbols": 3}, {"relations": 3, "families": 0, "symbols": 0}]
+        assert solver.substituteKnownsFor(c) == {2}
+
+    def testPlansMergedFamiliesWaitingOnTheSameSymbol(self):
+        (a, b, c, d, e, f, g) = sympy.symbols("a, b, c, d, e, f, g")
+        relations = [
+            Relation(g, 403), Relation(a, 607), Relation(e + f, 205), Relation(b + d, 300), # type: ignore
+            Relation(b + c + e + f, 0), Relation(b + c + d + e, 109), Relation(a + b + d + g, 507), # type: ignore
+        ]
+
+        # (planning merges the families of the last three relations, which
+        # then all wait on `b`)
+        batchSolver = AlgebraSolver()
+        error = runForError(lambda: batchSolver.recordRelations(relations))
+        assert type(error) is NoSolutionException, "Solver did not find that `b + d` can't be both 300 and -503"
+        assert batchSolver.getRelations() == ()
+
+        batchSolver.recordRelations(relations[:-1])
+        oneByOneSolver = AlgebraSolver()
+        for relation in relations[:-1]:
+            oneByOneSolver.recordRelation(relation)
+        for symbol in (a, b, c, d, e, f, g):
+            assert batchSolver.substituteKnownsFor(symbol) == oneByOneSolver.substituteKnownsFor(symbol), \
+                "Recording relations in a batch did not infer the same values as recording them one at a time"
+
+    def testPlansFamiliesWithMatchings(self):
+        (a, b, c, d, e, x, y) = sympy.symbols("a, b, c, d, e, x, y")
+        # (the greedy pairing can take `b` for the second relation, leaving
+        # nothing for the third)
+        relations = [
+            Relation(c + d, 1),
+            Relation(b + c, 2),
+            Relation(b + d, 3),
+        ]
+        familyGroups = MatchingOrderSolver(relations, SymbolsDatabase()).findSolveOrders() # type: ignore
+        assert len(familyGroups) == 1 and len(familyGroups[0]) == 1
+        assert {symbol for (symbol, relation) in familyGroups[0][0]} == {b, c, d}
+        assert {relation for (symbol, relation) in familyGroups[0][0]} == set(relations)
+
+        relations = [
+            Relation(x, 1),
+            Relation(a*e, 12),
+            Relation(x + y, 3),
+            Relation(y - x, 1),
+        ]
+        familyGroups = MatchingOrderSolver(relations, SymbolsDatabase()).findSolveOrders() # type: ignore
+        # (`a*e = 12` can't be solved, and one of the last two is redundant)
+        assert [
+            [[symbol for (symbol, relation) in family] for family in familyGroup]
+            for familyGroup in familyGroups
+        ] == [[[x]], [[y]]]
+        assert MatchingOrderSolver(relations[1:2], SymbolsDatabase()).findSolveOrder() is None # type: ignore
+
+        solver = AlgebraSolver(useMatchingOrderSolver = True)
+        solver.recordRelations([
+            Relation(c + d, 1),
+            Relation(b + c, 2),
+            Relation(b + d, 3),
+            Relation(a, b*c*d + 1),
+        ])
+        assert solver.substituteKnownsFor(b) == {2}
+        assert solver.substituteKnownsFor(c) == {0}
+        assert solver.substituteKnownsFor(d) == {1}
+        assert solver.substituteKnownsFor(a) == {1}
+
+    def testEnforcesTimeLimits(self):
+        x = sympy.Symbol("x")
+        pool = TimeLimitedPool(5)
+        try:
+            error = runForError(lambda: pool.run(time.sleep, 60, timeLimit = 0.5))
+            assert type(error) is TimeLimitExceeded and pool.numTimeouts == 1
+            # (the worker that ran too long is replaced)
+            assert pool.run(sympy.simplify, x + x) == 2*x
+            assert type(runForError(lambda: pool.run(operator.truediv, 1, 0))) is ZeroDivisionError
+            # (jobs that can't be run by a worker are never run here instead,
+            # since they'd have no time limit)
+            assert type(runForError(lambda: pool.run(lambda: 1))) is WorkerFailure
+            assert type(runForError(lambda: pool.run(os._exit, 1))) is WorkerFailure
+            assert pool.numWorkerFailures == 2 and pool.run(operator.add, 1, 2) == 3
+        finally:
+            pool.shutdown()
+
+        y = sympy.Symbol("y")
+        # (the limit is far longer than these take, even on a slow machine)
+        solver = AlgebraSolver(timeLimit = 60)
+        solver.recordRelation(Relation(x + sympy.sqrt(x), 6)) # type: ignore
+        assert solver.substituteKnownsFor(x) == {4}
+        assert solver.simplify(sympy.sin(x)**2 + sympy.cos(x)**2) == 1
+        # (and then far shorter than either of these could ever take, since
+        # no result can even be sent back in that time)
+        solver._timeLimitedPool.timeLimit = 0.001
+        hangingRelation = Relation(sympy.sqrt(y) + y**sympy.Rational(1, 3) + y**sympy.Rational(1, 5), 7) # type: ignore
+        error = runForError(lambda: solver.recordRelation(hangingRelation))
+        assert type(error) is SolveTimeLimitException and error.contradictingRelation == hangingRelation
+        assert len(solver.getRelations()) == 1 and y not in solver._symbolValuesDatabase
+        slowExpression = sympy.expand((x + y + 1)**30) / sympy.expand((x + y + 1)**24)
+        assert type(runForError(lambda: solver.simplify(slowExpression))) is SimplifyTimeLimitException
+        solver._timeLimitedPool.shutdown()
+
+    def testCancelsSolving(self):
+        (a, b) = sympy.symbols("a, b")
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(a, 1)) # type: ignore
+        solver.cancel()
+        error = runForError(lambda: solver.recordRelation(Relation(b, a + 1))) # type: ignore
+        assert type(error) is CancelledException, "Solver did not stop after being cancelled"
+        assert solver.getRelations() == (Relation(a, 1),) and b not in solver._symbolValuesDatabase # type: ignore
+        # (the solver stays cancelled until it is reset)
+        assert type(runForError(lambda: solver.substituteKnownsFor(a + 1))) is CancelledException
+        solver.resetCancellation()
+        solver.recordRelation(Relation(b, a + 1)) # type: ignore
+        assert solver.substituteKnownsFor(b) == {2}
+
+    def testInternsExpressions(self):
+        (a, b, c, x) = sympy.symbols("a, b, c, x")
+        store = ExpressionStore()
+        expression = store.intern(sympy.Add(a, 2*b, evaluate = False))
+        assert store.intern(sympy.Add(a, 2*b, evaluate = False)) is expression, \
+            "Store did not give back the same object for equal expressions"
+        assert store.lookup(sympy.Add(a, 2*b, evaluate = False)) is expression
+        assert (store.hits, store.misses) == (2, 1) and store.hitRate == 2/3
+        assert store.intern(sympy.Float(1, 30)) is not store.intern(sympy.Float(1, 15))
+
+        # (looking up doesn't keep anything; only the expressions retained
+        # stay in the store)
+        assert store.lookup(a - b) == a - b and a - b not in store
+        store.retainOnly([sympy.Add(a, 2*b, evaluate = False), a - b])
+        assert expression in store and len(store) == 1 and store.evictions == 2
+        store.retainOnly([])
+        assert len(store) == 0
+
+        # (relations and database values are all interned in the solver's
+        # store, so equal values are shared...)
+        solver = AlgebraSolver()
+        relations = [
+            Relation(x**2, 5), # type: ignore
+            Relation(a, x + 1), # type: ignore
+            Relation(b, sympy.parse_expr("x + 1")),
+            Relation(c, a*b + sympy.Symbol("{1, 2, 3}")), # type: ignore
+        ]
+        for relation in relations:
+            solver.recordRelation(relation)
+        aValues = {conditional.value: conditional for conditional in solver.getSymbolConditionalValues(a)}
+        bValues = {conditional.value: conditional for conditional in solver.getSymbolConditionalValues(b)}
+        assert all(aValues[value].value is bValues[value].value for value in aValues)
+        assert len(solver._expressionStore) > 0
+        assert len(solver.substituteKnownsFor(c)) == 6
+
+        # (...and let go of once nothing in the solver keeps them anymore)
+        solver.popRelations(relations[1:])
+        assert a not in solver._symbolValuesDatabase and c not in solver._symbolValuesDatabase
+        assert all(
+            conditional.value in solver._expressionStore
+            for conditional in solver.getSymbolConditionalValues(x)
+        )
+        solver.popRelations(relations[:1])
+        assert len(solver._expressionStore) == 0, "Store kept expressions the solver let go of"
+        assert solver._expressionStore.evictions > 0
+
+    def testTracesSolverPhases(self):
+        (a, b, c) = sympy.symbols("a, b, c")
+        solver = AlgebraSolver()
+        solver.recordRelation(Relation(a*c/2, 9)) # type: ignore
+        solver.recordRelation(Relation(a + b, c + 6)) # type: ignore
+        assert tracer.getSpans() == (), "Tracer recorded spans while disabled"
+
+        tracer.enable()
+        try:
+            solver.recordRelation(Relation(c/2, a)) # type: ignore
+        finally:
+            tracer.disable()
+        spans: dict[str, dict] = dict()
+        for (name, duration, args) in tracer.getSpans():
+            # (the first span of each phase, since some run once per family)
+            spans.setdefault(name, args)
+        assert {"validateRelations", "inferSymbolValues", "findSolveOrder", "forwardSolveSymbols", "solveSet", "backSubstituteSymbols", "substitute", "checkForContradictions"} <= set(spans)
+        # (a and c are solved together first, then b on its own; both families
+        # are planned at once)
+        assert spans["findSolveOrder"] == {"relations": 3, "families": 2, "symbols": 3}
+        assert spans["inferSymbolValues"] == {"families": 2, "symbolsSolved": 3}
+        assert spans["forwardSolveSymbols"] == {"symbols": 2, "solutions": 3}
+        assert spans["backSubstituteSymbols"]["symbols"] == 2
+
+        # (spans nest by time, so the whole solve contains each of its phases)
+        events: dict[str, dict] = dict()
+        for event in tracer.exportChromeTrace()["traceEvents"]:
+            events.setdefault(event["name"], event)
+        assert all(event["ph"] == "X" for event in events.values())
+        inferEvent = events["inferSymbolValues"]
+        for name in ("findSolveOrder", "forwardSolveSymbols", "backSubstituteSymbols"):
+            assert inferEvent["ts"] <= events[name]["ts"] <= events[name]["ts"] + events[name]["dur"] <= inferEvent["ts"] + inferEvent["dur"]
+        tracer.clear()
+
+    def testTracksRelationComponents(self):
+        solver = AlgebraSolver()
+        (a, b, c, x, y) = sympy.symbols("a, b, c, x, y")
+
+        solver.recordRelation(Relation(a + b, 4)) # type: ignore
+        solver.recordRelation(Relation(x * y, 12)) # type: ignore
+        components = solver._relationComponents
+        assert components.componentOf(a) is components.componentOf(b)
+        assert components.componentOf(a) is not components.componentOf(x), \
+            "Solver joined components of relations that don't share symbols"
+        
+        solver.recordRelation(Relation(b - c, x)) # type: ignore
+        assert components.componentOf(a) is components.componentOf(y), \
+            "Solver did not merge components connected by a new relation"
+        
+        solver.recordRelation(Relation(x, 3)) # type: ignore
+        assert solver.substituteKnownsFor(y) == {4}
+        assert components.componentOf(a).isExhausted, \
+            "Solver did not mark a component with nothing left to infer as exhausted"
+        
+        solver.popRelation(Relation(b - c, x)) # type: ignore
+        assert components.componentOf(a) is not components.componentOf(x), \
+            "Solver did not split components after popping the relation connecting them"
+        assert solver.substituteKnownsFor(y) == {4}
+        
+        solver.recordRelation(Relation(a - b, 2)) # type: ignore
+        assert solver.substituteKnownsFor(a) == {3}
+        assert solver.substituteKnownsFor(b) == {1}
+
+    def testChecksContradictionsOfSolvedSymbols(self):
+        solver = AlgebraSolver()
+        (a, b, x, y) = sympy.symbols("a, b, x, y")
+        components = solver._relationComponents
+
+        solver.recordRelation(Relation(a * b, 6)) # type: ignore
+        solver.recordRelation(Relation(x - a, y)) # type: ignore
+        assert components.sortedRelationsWithSymbols([a]) == [Relation(a * b, 6), Relation(x - a, y)] # type: ignore
+        assert components.sortedRelationsWithSymbols([b, y]) == [Relation(a * b, 6), Relation(x - a, y)] # type: ignore
+
+        error = runForError(lambda: solver.recordRelations([
+            Relation(x + y, 7), # type: ignore
+            Relation(x - y, 1), # type: ignore
+            Relation(x * y, 13), # type: ignore
+        ]))
+        assert type(error) is ContradictionException and error.contradictingRelation == Relation(x * y, 13), \
+            "Solver did not check relations with symbols it just solved for contradictions"
+        assert components.sortedRelationsWithSymbols([x]) == [Relation(x - a, y)] # type: ignore
+
+        solver.recordRelations([Relation(x + y, 7), Relation(x - y, 1)]) # type: ignore
+        assert components.sortedRelationsWithSymbols([x]) == [Relation(x + y, 7), Relation(x - y, 1), Relation(x - a, y)] # type: ignore
+        solver.popRelation(Relation(x - a, y)) # type: ignore
+        assert components.sortedRelationsWithSymbols([a, x]) == [Relation(a * b, 6), Relation(x + y, 7), Relation(x - y, 1)] # type: ignore
+
     def testRelationPopping(self):
         solver = AlgebraSolver()
 
@@ -542,6 +1279,32 @@ class AlgebraSolverTester:
 
         # TODO: more cases...
 
+    def testForgetsChainsOfDependentVariables(self):
+        solver = AlgebraSolver()
+        (a, b, c, d, x) = sympy.symbols("a, b, c, d, x")
+
+        solver.recordRelation(Relation(a**2, 4)) # type: ignore
+        solver.recordRelation(Relation(b, a + 1))
+        solver.recordRelation(Relation(c, 2*b))
+        solver.recordRelation(Relation(d, c - a))
+        solver.recordRelation(Relation(x, 5)) # type: ignore
+
+        database = solver._symbolValuesDatabase
+        assert set(database.getDependentSymbols(a)) == {b, d}
+        assert set(database.getDependentSymbols(b)) == {c}
+        assert set(database.getDependentSymbols(x)) == set()
+        
+        solver.popRelation(Relation(a**2, 4)) # type: ignore
+
+        assert solver.substituteKnownsFor(d) == {d}, \
+            "Solver did not forget a symbol depending on a forgotten symbol through others"
+        assert solver.substituteKnownsFor(x) == {5}
+        assert set(database.getDependentSymbols(a)) == set(), \
+            "Solver did not clean up the dependency index for forgotten symbols"
+        
+        solver.recordRelation(Relation(a, 2)) # type: ignore
+        assert solver.substituteKnownsFor(d) == {4}
+
     def testKeepsVariablesWhenPoppingRedundancy(self):
         solver1 = AlgebraSolver()
 
@@ -1,8 +1,16 @@
+import os
+import tempfile
+import threading
+import time
+
 import sympy
 
 from src.common.functions import runForError
-from src.app.appDriver import AppDriver, ProcessResult, Command, UndefinedIdentifiersException, RecursiveTemplatesException
-from src.algebrasolver.solver import Relation
+from src.parsing.sreprParser import SreprParseError
+from src.app.sessionStore import SessionStore
+from src.app.appDriver import AppDriver, ProcessResult, Command, UndefinedIdentifiersException, RecursiveTemplatesException, NotARelationException
+from src.algebrasolver.solver import Relation, CancelledException, ContradictionException
+from src.algebrasolver.timeLimitedPool import TimeLimitedPool
 
 
 class AppDriverTester:
@@ -130,6 +138,58 @@ class AppDriverTester:
             ProcessResult(Command.SIMPLIFY_EXPRESSION, {sympy.parse_expr("x + x - y * y")}),
         )
 
+        # (drivers only have a time limit if they're given a pool to use)
+        assert driver._solver._timeLimitedPool is None
+        timeLimitedPool = TimeLimitedPool(AppDriver.defaultTimeLimit)
+        try:
+            timedDriver = AppDriver(timeLimitedPool = timeLimitedPool)
+            results2 = tuple(timedDriver.processCommandLines("simplify: (x^2 - 1)/(x - 1)"))
+            assert results2 == (
+                ProcessResult(Command.SIMPLIFY_EXPRESSION, {sympy.parse_expr("x + 1")}),
+            )
+            assert timedDriver._solver._timeLimitedPool is timeLimitedPool
+        finally:
+            timeLimitedPool.shutdown()
+
+    def testSolvesFamiliesInWorkers(self):
+        # (chained relations are recorded all at once, so these two
+        # independent families are solved at the same time)
+        commandStr = "a^3 - a = 6 = b^2 + b"
+        serialDriver = AppDriver()
+        tuple(serialDriver.processCommandLines(commandStr))
+        parallelDriver = AppDriver(maxWorkers = 2)
+        try:
+            tuple(parallelDriver.processCommandLines(commandStr))
+            assert parallelDriver._solver._familySolverPool is not None \
+                and parallelDriver._solver._familySolverPool._executor is not None, \
+                "Driver did not solve families in workers"
+            assert tuple(parallelDriver.processCommandLines("a + b")) == tuple(serialDriver.processCommandLines("a + b"))
+        finally:
+            parallelDriver.shutdown()
+
+    def testSolvesNumerically(self):
+        driver = AppDriver()
+
+        assert tuple(driver.processCommandLines("numeric: x*e^x = 3")) == (
+            ProcessResult(Command.RECORD_RELATIONS, [(Relation(sympy.parse_expr("x*exp(x)"), 3), False)]), # type: ignore
+        ), "Driver did not record a relation numerically"
+        assert tuple(driver.processCommandLines("x")) == (
+            ProcessResult(Command.EVALUATE_EXPRESSION, {sympy.Float("1.04990889496404", 15)}),
+        ), "Driver did not solve a relation numerically"
+
+        assert type(runForError(lambda: tuple(driver.processCommandLines("y*e^y = 1")))) is NotImplementedError, \
+            "Driver solved a relation numerically without numeric mode on"
+        assert tuple(driver.processCommandLines("numeric: on")) == (
+            ProcessResult(Command.SET_NUMERIC_MODE, True),
+        )
+        tuple(driver.processCommandLines("y*e^y = 1"))
+        assert tuple(driver.processCommandLines("y")) == (
+            ProcessResult(Command.EVALUATE_EXPRESSION, {sympy.Float("0.567143290409784", 15)}),
+        ), "Driver did not solve a relation numerically in numeric mode"
+        assert tuple(driver.processCommandLines("numeric: off")) == (
+            ProcessResult(Command.SET_NUMERIC_MODE, False),
+        )
+
     def testThrowsOnRecursiveDependencies(self):
         driver = AppDriver()
 
@@ -142,6 +202,136 @@ class AppDriverTester:
         assert type(error3) is RecursiveTemplatesException, \
             "Driver did not detect recursive templates"
         
+    def testReplacesRelations(self):
+        driver = AppDriver()
+
+        tuple(driver.processCommandLines("a + b = 10"))
+        tuple(driver.processCommandLines("a = 4"))
+        tuple(driver.processCommandLines("c = 1"))
+
+        driver.replaceRelation(Relation(sympy.parse_expr("a"), 4), "a = 7") # type: ignore
+        assert tuple(driver.processCommandLines("b")) == (
+            ProcessResult(Command.EVALUATE_EXPRESSION, {3}),
+        ), "Driver did not infer values from replaced relation"
+
+        def attemptBadReplace():
+            return driver.replaceRelation(Relation(sympy.parse_expr("a"), 7), "a + 1") # type: ignore
+        error = runForError(attemptBadReplace)
+        assert type(error) is NotARelationException
+        assert driver.getRelations() == (
+            Relation(sympy.parse_expr("a + b"), 10), # type: ignore
+            Relation(sympy.parse_expr("c"), 1), # type: ignore
+            Relation(sympy.parse_expr("a"), 7), # type: ignore
+        ), "Driver did not restore the original relation after a failed replacement"
+        assert tuple(driver.processCommandLines("b")) == (
+            ProcessResult(Command.EVALUATE_EXPRESSION, {3}),
+        ), "Driver did not restore inferred values after a failed replacement"
+
+    def testRestoresSessions(self):
+        with tempfile.TemporaryDirectory() as sessionDirectoryPath:
+            driver = AppDriver(SessionStore(sessionDirectoryPath))
+            tuple(driver.processCommandLines("a^2 = 16"))
+            tuple(driver.processCommandLines("b = a/2"))
+            tuple(driver.processCommandLines("double(n) := 2*(n)"))
+            tuple(driver.processCommandLines("numeric: x * e^x = 3"))
+            tuple(driver.processCommandLines("c = 1"))
+            driver.deleteRelation(Relation(sympy.parse_expr("c"), 1)) # type: ignore
+            driver.saveSession()
+
+            # (changes after the snapshot are replayed from the journal, but
+            # inputs that failed didn't change anything, so they aren't)
+            tuple(driver.processCommandLines("d = double(b)"))
+            assert runForError(lambda: tuple(driver.processCommandLines("b = 7"))) is not None
+            tuple(driver.processCommandLines("g = 2"))
+            driver.replaceRelation(Relation(sympy.parse_expr("g"), 2), "g = 3") # type: ignore
+            journalPath = os.path.join(sessionDirectoryPath, SessionStore.journalFileName)
+            with open(journalPath, "r") as journalFile:
+                assert "b = 7" not in journalFile.read(), "Driver journaled a failed input"
+            # (a crash while writing to the journal only loses that one change)
+            with open(journalPath, "a") as journalFile:
+                journalFile.write('{"input":"f = ')
+
+            restoredDriver = AppDriver(SessionStore(sessionDirectoryPath))
+            assert restoredDriver.getRelations() == driver.getRelations(), \
+                "Driver did not restore the same relations the session had"
+            assert restoredDriver.restoreErrors == []
+            assert restoredDriver.getInputHistory() == tuple(
+                commandStr
+                for commandStr in driver.getInputHistory()
+                if commandStr != "b = 7"
+            )
+            assert restoredDriver.getAllAliasNames() == driver.getAllAliasNames()
+            for symbolStr in ("a", "b", "d", "g", "x"):
+                symbol = sympy.Symbol(symbolStr)
+                assert restoredDriver._solver.getSymbolConditionalValues(symbol) == driver._solver.getSymbolConditionalValues(symbol), \
+                    "Driver did not restore the same values the session had"
+
+            # (the replayed journal was saved as a new snapshot, and snapshots
+            # are loaded without solving anything)
+            snapshotDriver = AppDriver(SessionStore(sessionDirectoryPath))
+            assert snapshotDriver._solver._solveSetCache.misses == 0, "Driver solved relations while restoring a snapshot"
+            assert tuple(snapshotDriver.processCommandLines("double(a + b + d)")) == tuple(driver.processCommandLines("double(a + b + d)"))
+            tuple(snapshotDriver.processCommandLines("f = g + 1"))
+            assert tuple(AppDriver(SessionStore(sessionDirectoryPath)).processCommandLines("f")) == (
+                ProcessResult(Command.EVALUATE_EXPRESSION, {4}),
+            )
+
+            # (entries that can't be replayed anymore are skipped, and reported)
+            with open(journalPath, "a") as journalFile:
+                journalFile.write('{"input":"f = 5"}\n{"input":"h = f + 1"}\n')
+            reportingDriver = AppDriver(SessionStore(sessionDirectoryPath))
+            assert [(commandStr, type(error)) for (commandStr, error) in reportingDriver.restoreErrors] == [
+                ("f = 5", ContradictionException),
+            ], "Driver did not report the entry it could not replay"
+            assert tuple(reportingDriver.processCommandLines("h")) == (
+                ProcessResult(Command.EVALUATE_EXPRESSION, {5}),
+            ), "Driver did not replay the entries after the one that failed"
+
+            # (quitting saves a snapshot, so nothing is left to replay)
+            reportingDriver.shutdown()
+            sessionStore = SessionStore(sessionDirectoryPath)
+            (snapshot, journalEntries) = sessionStore.load()
+            assert snapshot is not None and journalEntries == [], "Driver did not save a snapshot when shut down"
+
+            # (session files could have been written by anyone, so nothing in
+            # them is ever run as code)
+            markerPath = os.path.join(sessionDirectoryPath, "marker")
+            snapshot["solver"]["relations"][0][0] = f"__import__('os').mkdir({markerPath!r})"
+            sessionStore.saveSnapshot(snapshot)
+            assert type(runForError(lambda: AppDriver(SessionStore(sessionDirectoryPath)))) is SreprParseError
+            assert not os.path.exists(markerPath), "Driver ran code from a session file"
+
+    def testCancelsCommands(self):
+        with tempfile.TemporaryDirectory() as sessionDirectoryPath:
+            driver = AppDriver(SessionStore(sessionDirectoryPath))
+            tuple(driver.processCommandLines("a = 4"))
+            tuple(driver.processCommandLines(f"x = {{{', '.join(str(num) for num in range(1, 150))}}}"))
+            tuple(driver.processCommandLines(f"y = {{{', '.join(str(num) for num in range(1, 150))}}}"))
+            relations = driver.getRelations()
+
+            # (inferring z needs every combination of x and y, which takes far
+            # longer than it takes to cancel)
+            cancelTimer = threading.Timer(0.2, driver.cancelCommand)
+            cancelTimer.start()
+            startTime = time.perf_counter()
+            error = runForError(lambda: tuple(driver.processCommandLines("z = x*y + a")))
+            assert type(error) is CancelledException, "Driver did not cancel the command"
+            assert time.perf_counter() - startTime < 5, "Driver did not cancel the command quickly"
+            assert driver.getRelations() == relations, "Driver did not roll back the cancelled command"
+
+            # (commands run again once cancelling is reset)
+            driver.resetCancellation()
+            tuple(driver.processCommandLines("double(n) := 2*(n)"))
+            restoredDriver = AppDriver(SessionStore(sessionDirectoryPath))
+            assert restoredDriver.getRelations() == relations, "Driver journaled a cancelled command"
+            assert restoredDriver.getAllAliasNames() == driver.getAllAliasNames()
+
+            # (cancelling before a command gets started still cancels it)
+            driver.resetCancellation()
+            driver.cancelCommand()
+            error = runForError(lambda: tuple(driver.processCommandLines("z = x*y + a")))
+            assert type(error) is CancelledException, "Driver lost a cancellation from before the command started"
+
     # TODO: test popping relations
 
     # TODO: add tests for robustness (from old project)
@@ -729,6 +729,22 @@ class CommandParserTester:
             LexerToken("",          LexerTokenTypes.EOL,        10),
         ))) == [Command.simplifyExpression(sympy.parse_expr("x"))]
         
+        assert list(CommandParser.parseCommand((
+            LexerToken("numeric",   LexerTokenTypes.IDENTIFIER, 0),
+            LexerToken(":",         LexerTokenTypes.COLON,      7),
+            LexerToken("x",         LexerTokenTypes.IDENTIFIER, 9),
+            LexerToken("=",         LexerTokenTypes.EQUALS,     11),
+            LexerToken("2",         LexerTokenTypes.INTEGER,    13),
+            LexerToken("",          LexerTokenTypes.EOL,        14),
+        ))) == [Command.recordRelationsNumerically([sympy.parse_expr("x"), 2])]
+        
+        assert list(CommandParser.parseCommand((
+            LexerToken("numeric",   LexerTokenTypes.IDENTIFIER, 0),
+            LexerToken(":",         LexerTokenTypes.COLON,      7),
+            LexerToken("OFF",       LexerTokenTypes.IDENTIFIER, 9),
+            LexerToken("",          LexerTokenTypes.EOL,        12),
+        ))) == [Command.setNumericMode(False)]
+        
     def testEolExceptionsMakeEolVisible(self):
         def attempt():
             return list(CommandParser.parseCommand((